@@ -1,6 +1,6 @@
-from flask import Flask, request, jsonify, send_from_directory, redirect, url_for, send_file
+from flask import Flask, request, jsonify, send_from_directory, redirect, url_for, send_file, Response, after_this_request, g, has_app_context
 from flask_cors import CORS
-from models import db, User, Station, Task, InviteCode, Participant, Submission, GlobalSettings, VerificationCode, Feedback
+from models import db, User, Station, Task, InviteCode, Participant, Submission, GlobalSettings, VerificationCode, Feedback, StationStanding, DailyRollup, TaskRankingSnapshot, UploadObject, CacheVersion, TaskTombstone
 from dotenv import load_dotenv
 import os
 import bcrypt
@@ -10,8 +10,23 @@ from functools import wraps
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from werkzeug.utils import secure_filename
+from werkzeug.http import is_resource_modified
+from werkzeug.exceptions import RequestEntityTooLarge
 import uuid
-from sqlalchemy import func, distinct
+from collections import namedtuple
+from sqlalchemy import func, distinct, case, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from ranking import RankingEngine
+from cache import VersionedResponseCache, SingleFlight, TTLCache
+from compression import ResponseCompressor, CompressedPayload
+from live_push import LeaderboardHub
+from image_pipeline import ImageWorkerPool, process_submission_images
+from storage import LocalStorage, S3Storage, upload_url, migrate_local_uploads
+from multipart_ingest import ingest_multipart
+from werkzeug.security import safe_join
+import click
 import io
 import random
 import string
@@ -54,7 +69,7 @@ limiter = Limiter(
 )
 
 # 数据库配置
-db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weini.db')
+db_path = os.getenv('DATABASE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weini.db'))
 app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
@@ -71,10 +86,106 @@ UPLOAD_FOLDER = 'uploads'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 限制上传文件大小为16MB
 app.config['MAX_SUBMISSIONS'] = 5  # 每个任务最多5张图片
+app.config['MAX_IMAGE_SIZE'] = 5 * 1024 * 1024  # 单张图片最大5MB
+app.config['IMAGE_STAGING_FOLDER'] = os.path.join(UPLOAD_FOLDER, 'staging')  # 待后台处理的原始上传
+app.config['SUBMISSION_IMAGE_FIELDS'] = None  # 提交图片的表单字段名，None表示接收任意字段中的文件（如 uni.uploadFile 默认的 file）
+app.config['SUBMISSION_MAX_FIELD_SIZE'] = 64 * 1024  # 提交请求中文本字段合计最大64KB
 
 # 确保上传目录存在
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# 上传文件存储后端配置：local 为按哈希前缀分目录的本地存储，s3 为S3兼容对象存储（需安装boto3）
+app.config['UPLOAD_STORAGE'] = os.getenv('UPLOAD_STORAGE', 'local')
+app.config['UPLOAD_SHARD_DEPTH'] = int(os.getenv('UPLOAD_SHARD_DEPTH', 2))  # 分片目录层数
+app.config['UPLOAD_S3_BUCKET'] = os.getenv('UPLOAD_S3_BUCKET')
+app.config['UPLOAD_S3_PREFIX'] = os.getenv('UPLOAD_S3_PREFIX', '')
+app.config['UPLOAD_S3_ENDPOINT_URL'] = os.getenv('UPLOAD_S3_ENDPOINT_URL')  # 如本地MinIO: http://localhost:9000
+app.config['UPLOAD_S3_REGION'] = os.getenv('UPLOAD_S3_REGION')
+if app.config['UPLOAD_STORAGE'] == 's3':
+    upload_storage = S3Storage(
+        bucket=app.config['UPLOAD_S3_BUCKET'],
+        prefix=app.config['UPLOAD_S3_PREFIX'],
+        endpoint_url=app.config['UPLOAD_S3_ENDPOINT_URL'],
+        region_name=app.config['UPLOAD_S3_REGION']
+    )
+else:
+    upload_storage = LocalStorage(UPLOAD_FOLDER, shard_depth=app.config['UPLOAD_SHARD_DEPTH'])
+
+# 提交图片后台处理配置：请求内只暂存原始文件，校验、规范化和归档由进程池完成
+app.config['IMAGE_WORKERS'] = int(os.getenv('IMAGE_WORKERS', 2))  # 0表示在请求线程内同步处理
+app.config['IMAGE_QUEUE_MAX'] = int(os.getenv('IMAGE_QUEUE_MAX', 32))  # 积压超过该数量时改为同步处理
+app.config['IMAGE_THUMBNAIL_SIZES'] = tuple(  # WebP缩略图尺寸（最长边像素），需安装Pillow
+    int(size) for size in os.getenv('IMAGE_THUMBNAIL_SIZES', '128,512').split(',') if size.strip()
+)
+app.config['IMAGE_REQUEUE_INTERVAL'] = int(os.getenv('IMAGE_REQUEUE_INTERVAL', 300))  # 启动时重新排队的最短间隔（秒），多进程中只有一个进程执行
+image_workers = ImageWorkerPool(
+    workers=app.config['IMAGE_WORKERS'],
+    max_pending=app.config['IMAGE_QUEUE_MAX']
+)
+
+# 任务排行榜排名引擎配置
+app.config['RANKING_MAX_AGE'] = int(os.getenv('RANKING_MAX_AGE', 60))  # 进程内排行榜最长保留秒数
+app.config['LEADERBOARD_MAX_RADIUS'] = 100  # around查询的最大窗口半径
+app.config['LEADERBOARD_MAX_PAGE_SIZE'] = 500  # 排行榜分页每页最大条数
+ranking_engine = RankingEngine(max_age=app.config['RANKING_MAX_AGE'])
+
+# 排行榜响应缓存配置（按站点版本号失效，版本号保存在数据库中，多进程共享）
+app.config['LEADERBOARD_CACHE_SIZE'] = int(os.getenv('LEADERBOARD_CACHE_SIZE', 2048))
+leaderboard_cache = VersionedResponseCache(
+    max_entries=app.config['LEADERBOARD_CACHE_SIZE'],
+    load_version=lambda scope: load_scope_version(scope),
+    bump_version=lambda scope: bump_scope_version(scope)
+)
+
+# 邀请码解析缓存配置（粉丝端每个请求都需要校验邀请码）
+app.config['INVITE_CODE_CACHE_SIZE'] = int(os.getenv('INVITE_CODE_CACHE_SIZE', 1024))
+app.config['INVITE_CODE_CACHE_TTL'] = int(os.getenv('INVITE_CODE_CACHE_TTL', 30))  # 条目过期秒数
+invite_code_cache = TTLCache(
+    max_entries=app.config['INVITE_CODE_CACHE_SIZE'],
+    ttl=app.config['INVITE_CODE_CACHE_TTL']
+)
+
+# 全局设置缓存配置：启动时加载，更新后刷新；过期时间使多进程部署时其他进程的修改最终可见
+app.config['GLOBAL_SETTINGS_CACHE_TTL'] = int(os.getenv('GLOBAL_SETTINGS_CACHE_TTL', 300))
+settings_cache = TTLCache(max_entries=1, ttl=app.config['GLOBAL_SETTINGS_CACHE_TTL'])
+
+# 增量同步配置：游标回退秒数，覆盖写入时间早于提交时间的事务
+app.config['SYNC_CURSOR_OVERLAP'] = int(os.getenv('SYNC_CURSOR_OVERLAP', 5))
+
+GLOBAL_SETTINGS_SCOPE = 'global_settings'  # 全局设置在响应缓存中的版本号作用域
+
+# 焦点任务变更冷却时间
+FOCUS_CHANGE_COOLDOWN = timedelta(hours=24)
+
+# 热点读接口的并发请求合并（相同键同时只执行一次查询）
+request_coalescer = SingleFlight()
+
+# 响应压缩配置：超过阈值的JSON响应按 Accept-Encoding 使用 br（需安装brotli）或 gzip 压缩
+app.config['COMPRESSION_MIN_SIZE'] = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))  # 默认压缩阈值（字节）
+app.config['COMPRESSION_GZIP_LEVEL'] = int(os.getenv('COMPRESSION_GZIP_LEVEL', 6))
+app.config['COMPRESSION_BROTLI_QUALITY'] = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 5))
+app.config['COMPRESSION_ENDPOINT_MIN_SIZE'] = {  # 按端点调整阈值，排行榜等大列表更早开始压缩
+    'get_fan_leaderboard': 512,
+    'get_task_leaderboard': 512,
+    'get_fan_tasks': 512,
+    'get_fan_bootstrap': 512,
+    'get_fan_progress': 512,
+    'station_get_task_submissions': 512,
+    'station_get_rankings': 512,
+    'station_get_task_ranking': 512
+}
+response_compressor = ResponseCompressor(
+    min_size=app.config['COMPRESSION_MIN_SIZE'],
+    gzip_level=app.config['COMPRESSION_GZIP_LEVEL'],
+    brotli_quality=app.config['COMPRESSION_BROTLI_QUALITY'],
+    endpoint_min_size=app.config['COMPRESSION_ENDPOINT_MIN_SIZE']
+)
+
+# 排行榜实时推送配置（SSE）
+app.config['LIVE_PUSH_HEARTBEAT'] = int(os.getenv('LIVE_PUSH_HEARTBEAT', 15))  # 心跳间隔（秒）
+app.config['LIVE_PUSH_QUEUE_SIZE'] = 100  # 每个订阅者最多积压的消息数
+leaderboard_hub = LeaderboardHub(max_queue=app.config['LIVE_PUSH_QUEUE_SIZE'])
+
 # 邮件发送配置
 app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.example.com')
 app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 587))
@@ -541,21 +652,22 @@ def station_create_new_task(current_user_id):
         is_focus_task=data.get('is_focus_task', False)
     )
     
-    # 如果是焦点任务，取消该站点下其他焦点任务
-    if new_task.is_focus_task:
-        other_focus_tasks = Task.query.filter(
-            Task.station_id == station.id,
-            Task.is_focus_task == True,
-            Task.status == 'active'
-        ).all()
-        
-        for task in other_focus_tasks:
-            task.is_focus_task = False
-    
     # 保存任务
     try:
         db.session.add(new_task)
+        db.session.flush()
+        
+        # 如果是焦点任务，取消该站点下其他焦点任务并更新邀请码的焦点指针
+        if new_task.is_focus_task:
+            unset_count = unset_other_focus_tasks(station.id, new_task.id)
+            sync_focus_pointer(new_task)
+            # 焦点任务变更会影响焦点榜，重建站点排行榜汇总
+            if unset_count:
+                rebuild_station_standings(station.id)
         db.session.commit()
+        bump_cache_versions(station.id)
+        if new_task.is_focus_task:
+            invite_code_cache.invalidate()
         print(f"任务创建成功 - ID: {new_task.id}, 标题: {new_task.title}, 站点ID: {new_task.station_id}")
         return jsonify(new_task.to_dict()), 201
     except Exception as e:
@@ -664,6 +776,10 @@ def station_update_task(current_user_id, task_id):
         
         if invite_code.status != 'active':
             return jsonify({'error': '邀请码已禁用，无法使用'}), 400
+        
+        # 任务离开原邀请码时留下记录，原邀请码的增量同步据此通知粉丝端移除该任务
+        if task.invite_code_id and task.invite_code_id != invite_code.id:
+            db.session.add(TaskTombstone(task_id=task.id, invite_code_id=task.invite_code_id))
             
         task.invite_code_id = data['invite_code_id']
     
@@ -694,10 +810,17 @@ def station_update_task(current_user_id, task_id):
         task.time_config = data['time_config']
     
     if 'status' in data:
+        previous_status = task.status
         task.status = data['status']
         # 如果任务状态变为已完成，记录完成时间
         if data['status'] == 'completed' and not task.completed_at:
             task.completed_at = datetime.utcnow()
+        
+        # 结算时冻结最终排名，重新开启时丢弃旧快照
+        if data['status'] == 'completed' and previous_status != 'completed':
+            freeze_task_ranking(task)
+        elif data['status'] != 'completed' and previous_status == 'completed':
+            TaskRankingSnapshot.query.filter_by(task_id=task.id).delete(synchronize_session=False)
     
     if 'is_focus_task' in data:
         new_focus_status = bool(data['is_focus_task'])
@@ -706,8 +829,8 @@ def station_update_task(current_user_id, task_id):
         if task.is_focus_task and not new_focus_status:
             # 查询邀请码
             invite_code = InviteCode.query.get(task.invite_code_id)
-            if invite_code and invite_code.last_focus_change:
-                cooldown_until = invite_code.last_focus_change + timedelta(hours=24)
+            cooldown_until = focus_cooldown_deadline(invite_code) if invite_code else None
+            if cooldown_until:
                 now = datetime.utcnow()
                 
                 if now < cooldown_until:
@@ -724,32 +847,40 @@ def station_update_task(current_user_id, task_id):
             station = Station.query.get(task.station_id)
             last_change = InviteCode.query.filter_by(station_id=task.station_id, is_focus_enabled=True).first()
             
-            if last_change and last_change.last_focus_change:
-                cooldown_until = last_change.last_focus_change + timedelta(hours=24)
+            cooldown_until = focus_cooldown_deadline(last_change) if last_change else None
+            if cooldown_until:
                 now = datetime.utcnow()
                 
                 if now < cooldown_until:
                     return jsonify({'error': f'焦点任务状态在24小时内只能修改一次。上次修改时间：{last_change.last_focus_change.strftime("%Y-%m-%d %H:%M:%S UTC")}'}), 403
             
-            # 取消其他焦点任务
-            other_focus_tasks = Task.query.filter(
-                Task.station_id == task.station_id,
-                Task.is_focus_task == True,
-                Task.id != task.id,
-                Task.status == 'active'
-            ).all()
-            
-            for other_task in other_focus_tasks:
-                other_task.is_focus_task = False
+            # 一条UPDATE取消其他焦点任务
+            unset_other_focus_tasks(task.station_id, task.id)
             
             # 更新站点焦点任务变更时间
             if last_change:
                 last_change.last_focus_change = datetime.utcnow()
+                last_change.focus_cooldown_until = last_change.last_focus_change + FOCUS_CHANGE_COOLDOWN
         
+        focus_changed = task.is_focus_task != new_focus_status
         task.is_focus_task = new_focus_status
+        
+        # 焦点任务变更会影响焦点榜，重建站点排行榜汇总
+        if focus_changed:
+            rebuild_station_standings(task.station_id)
+    
+    # 焦点标记、状态或所属邀请码变化时同步邀请码的焦点指针
+    focus_pointer_changed = any(key in data for key in ('is_focus_task', 'status', 'invite_code_id'))
+    if focus_pointer_changed:
+        sync_focus_pointer(task)
     
     # 保存更改
     db.session.commit()
+    ranking_engine.invalidate(task.id)
+    bump_cache_versions(task.station_id, task_cache_scope(task.id))
+    if focus_pointer_changed:
+        # 焦点变更是低频操作，直接清空邀请码缓存
+        invite_code_cache.invalidate()
     
     return jsonify(task.to_dict()), 200
 
@@ -814,6 +945,7 @@ def station_create_invite_code(current_user_id):
     # 保存邀请码
     db.session.add(new_invite_code)
     db.session.commit()
+    invite_code_cache.invalidate(new_invite_code.code)
     
     return jsonify(new_invite_code.to_dict()), 201
 
@@ -884,6 +1016,7 @@ def station_update_invite_code(current_user_id, invite_code_id):
     
     # 保存更改
     db.session.commit()
+    invite_code_cache.invalidate(invite_code.code)
     
     return jsonify(invite_code.to_dict()), 200
 
@@ -977,53 +1110,20 @@ def station_create_station(current_user_id):
 def get_invite_code_focus_status(invite_code):
     try:
         # 查找邀请码
-        invite_code_obj = InviteCode.query.filter_by(code=invite_code, status='active').first()
+        invite_code_obj = resolve_invite_code(invite_code)
         if not invite_code_obj:
             return jsonify({"error": "邀请码不存在或未激活"}), 404
         
-        # 检查该邀请码是否有焦点任务
-        focus_tasks = Task.query.filter_by(
-            invite_code_id=invite_code_obj.id, 
-            is_focus_task=True,
-            status='active'
-        ).all()
+        # 焦点任务由邀请码上的指针确定，任务信息按站点版本号缓存
+        focus_task_info = None
+        if invite_code_obj.focus_task_id:
+            focus_task_info = app.json.loads(get_cached_leaderboard(
+                invite_code_obj.station_id,
+                ('focus_task', invite_code_obj.focus_task_id),
+                lambda: build_focus_task_info(invite_code_obj.focus_task_id)
+            ))
         
-        has_focus_task = len(focus_tasks) > 0
-        focus_task_info = focus_tasks[0] if has_focus_task else None
-        
-        # 检查冷却状态
-        now_utc = datetime.utcnow()
-        last_change = invite_code_obj.last_focus_change
-        
-        # 计算冷却截止时间点
-        cooldown_until_dt = last_change + timedelta(hours=24) if last_change else datetime(1970, 1, 1)
-        
-        # 判断是否在冷却期
-        is_in_cooldown = last_change and now_utc < cooldown_until_dt
-        
-        # 计算剩余冷却时间
-        cooldown_remaining_seconds = 0
-        if is_in_cooldown:
-            cooldown_remaining_seconds = int((cooldown_until_dt - now_utc).total_seconds())
-        
-        # 构建响应
-        response = {
-            "invite_code": invite_code,
-            "has_focus_task": has_focus_task,
-            "is_in_cooldown": is_in_cooldown,
-            "cooldown_remaining_seconds": cooldown_remaining_seconds,
-            "last_change_time": last_change.isoformat() if last_change else None,
-            "cooldown_until_time": cooldown_until_dt.isoformat() if is_in_cooldown else None,
-            "current_time": now_utc.isoformat()
-        }
-        
-        # 如果有焦点任务，添加基本信息
-        if has_focus_task:
-            response["focus_task"] = {
-                "id": focus_task_info.id,
-                "title": focus_task_info.title,
-                "created_at": focus_task_info.created_at.isoformat()
-            }
+        response = build_focus_status(invite_code_obj, focus_task_info)
         
         return jsonify(response)
     except Exception as e:
@@ -1035,6 +1135,11 @@ def get_invite_code_focus_status(invite_code):
 # 粉丝根据邀请码查询任务
 @app.route('/api/fan/tasks', methods=['GET'])
 def get_fan_tasks():
+    """获取邀请码下的活跃任务列表
+    
+    提供 since=<游标> 时返回增量数据 {tasks, cursor, participation}，
+    since=0 表示全量同步并获取初始游标。
+    """
     invite_code = request.args.get('invite_code')
     
     print(f"获取粉丝任务列表 - 邀请码: {invite_code}")
@@ -1044,48 +1149,42 @@ def get_fan_tasks():
     
     try:
         # 查找邀请码
-        invite_code_obj = InviteCode.query.filter_by(code=invite_code, status='active').first()
+        invite_code_obj = resolve_invite_code(invite_code)
         if not invite_code_obj:
             print(f"邀请码不存在或已失效: {invite_code}")
             return jsonify({"error": "邀请码不存在或已失效"}), 404
         
         print(f"邀请码已找到 - ID: {invite_code_obj.id}, 站点ID: {invite_code_obj.station_id}")
         
-        # 获取该邀请码下所有活跃任务
-        tasks = Task.query.filter_by(
-            invite_code_id=invite_code_obj.id,
-            status='active'
-        ).all()
-        
-        print(f"查询到 {len(tasks)} 个活跃任务")
-        
-        # 转换为JSON
-        tasks_data = []
-        for task in tasks:
+        # 增量同步模式：只返回游标之后有变化的任务和参与记录
+        cursor = request.args.get('since')
+        if cursor:
             try:
-                # 查询任务的总提交次数
-                submission_count = db.session.query(func.sum(Participant.submission_count)).filter(
-                    Participant.task_id == task.id
-                ).scalar() or 0
-                
-                task_dict = {
-                    'id': task.id,
-                    'title': task.title,
-                    'description': task.description,
-                    'points': task.points,
-                    'due_date': task.due_date.isoformat() if task.due_date else None,
-                    'is_focus_task': task.is_focus_task,
-                    'flame_mode_enabled': task.flame_mode_enabled,
-                    'created_at': task.created_at.isoformat() if task.created_at else None,
-                    'bonus_points': task.bonus_points,
-                    'submission_count': submission_count  # 添加提交次数
-                }
-                tasks_data.append(task_dict)
-            except Exception as e:
-                print(f"处理任务数据时出错 - 任务ID: {task.id}, 错误: {str(e)}")
+                since = parse_sync_cursor(cursor)
+            except ValueError:
+                return jsonify({"error": "无效的同步游标"}), 400
+            
+            next_cursor = new_sync_cursor()
+            if since is None:
+                tasks = app.json.loads(get_cached_fan_tasks(invite_code_obj))
+            else:
+                tasks = build_fan_tasks(invite_code_obj, since)
+            
+            response = {
+                'tasks': tasks,
+                'cursor': next_cursor,
+                'full': since is None
+            }
+            nickname = request.args.get('nickname', '').strip()
+            if nickname:
+                response['participation'] = build_fan_participation(invite_code_obj, nickname, since=since)
+            return jsonify(response)
         
-        print(f"成功处理 {len(tasks_data)} 个任务数据")
-        return jsonify(tasks_data), 200
+        # 站点版本号未变时直接返回304
+        return conditional_response(
+            [invite_code_obj.station_id],
+            lambda: json_payload_response(get_cached_fan_tasks(invite_code_obj))
+        )
     
     except Exception as e:
         print(f"获取任务列表失败 - 邀请码: {invite_code}, 错误: {str(e)}")
@@ -1093,6 +1192,93 @@ def get_fan_tasks():
         traceback.print_exc()
         return jsonify({"error": f"获取任务失败: {str(e)}"}), 500
 
+# 粉丝端启动数据
+@app.route('/api/fan/bootstrap', methods=['GET'])
+def get_fan_bootstrap():
+    """小程序启动时一次性获取任务列表、焦点状态、默认鼓励内容和当前粉丝的参与情况
+    
+    代替依次调用任务列表、焦点状态、全局鼓励设置和逐个任务详情，
+    无论任务数多少最多只执行固定的几次查询。
+    """
+    invite_code = request.args.get('invite_code')
+    nickname = request.args.get('nickname', '').strip()
+    
+    if not invite_code:
+        return jsonify({"error": "请提供邀请码"}), 400
+    
+    try:
+        # 查找邀请码
+        invite_code_obj = resolve_invite_code(invite_code)
+        if not invite_code_obj:
+            return jsonify({"error": "邀请码不存在或已失效"}), 404
+        
+        # 后续可用此游标调用 /api/fan/tasks?since= 增量同步
+        cursor = new_sync_cursor()
+        
+        # 任务列表（站点级缓存），焦点任务直接从列表中取得
+        tasks = app.json.loads(get_cached_fan_tasks(invite_code_obj))
+        focus_task = next((task for task in tasks if task['is_focus_task']), None)
+        
+        # 一次查询当前粉丝在所有任务中的参与记录
+        participation = {}
+        if nickname and tasks:
+            participation = build_fan_participation(
+                invite_code_obj,
+                nickname,
+                task_ids=[task['id'] for task in tasks]
+            )
+        
+        return jsonify({
+            'invite_code': {
+                'code': invite_code_obj.code,
+                'station_id': invite_code_obj.station_id,
+                'is_focus_enabled': invite_code_obj.is_focus_enabled
+            },
+            'tasks': tasks,
+            'focus_status': build_focus_status(invite_code_obj, focus_task),
+            'encouragement': build_global_encouragement_settings(),
+            'participation': participation,
+            'cursor': cursor
+        })
+    
+    except Exception as e:
+        print(f"获取启动数据失败 - 邀请码: {invite_code}, 错误: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": f"获取启动数据失败: {str(e)}"}), 500
+
+# 粉丝个人进度
+@app.route('/api/fan/me', methods=['GET'])
+def get_fan_progress():
+    """获取粉丝在站点所有任务中的参与情况、积分、提交次数和总榜排名
+    
+    代替对每个任务调用任务详情接口，结果按站点版本号缓存并支持条件请求。
+    """
+    invite_code = request.args.get('invite_code')
+    nickname = request.args.get('nickname', '').strip()
+    
+    if not invite_code or not nickname:
+        return jsonify({"error": "请提供邀请码和昵称"}), 400
+    
+    try:
+        # 查找邀请码
+        invite_code_obj = resolve_invite_code(invite_code)
+        if not invite_code_obj:
+            return jsonify({"error": "邀请码不存在或已失效"}), 404
+        
+        station_id = invite_code_obj.station_id
+        # 个人进度只对单个粉丝有用，不写入共享缓存；站点版本号未变时返回304
+        return conditional_response(
+            [station_id],
+            lambda: jsonify(build_fan_progress(station_id, nickname))
+        )
+    
+    except Exception as e:
+        print(f"获取粉丝进度失败 - 邀请码: {invite_code}, 昵称: {nickname}, 错误: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": f"获取粉丝进度失败: {str(e)}"}), 500
+
 # 添加单个任务详情的API路由
 @app.route('/api/fan/tasks/<string:task_id>', methods=['GET'])
 def get_fan_task_detail(task_id):
@@ -1107,58 +1293,62 @@ def get_fan_task_detail(task_id):
     
     try:
         # 验证邀请码
-        invite_code_obj = InviteCode.query.filter_by(code=invite_code, status='active').first()
+        invite_code_obj = resolve_invite_code(invite_code)
         if not invite_code_obj:
             print(f"邀请码无效: {invite_code}")
             return jsonify({'error': '无效的邀请码'}), 403
         
         print(f"邀请码已验证 - ID: {invite_code_obj.id}, 站点ID: {invite_code_obj.station_id}")
         
-        # 查询任务详情
-        task = Task.query.get(task_id)
-        if not task:
-            print(f"任务不存在: {task_id}")
-            return jsonify({'error': '任务不存在'}), 404
-        
-        print(f"任务已找到 - 标题: {task.title}, 站点ID: {task.station_id}")
-        
-        # 检查任务对应的站点是否匹配邀请码
-        if task.station_id != invite_code_obj.station_id:
-            print(f"任务站点不匹配 - 任务站点ID: {task.station_id}, 邀请码站点ID: {invite_code_obj.station_id}")
-            return jsonify({'error': '无权访问此任务'}), 403
-        
-        # 查询用户参与记录
-        participation = None
-        if nickname:
-            participation = Participant.query.filter_by(
-                name=nickname,
-                task_id=task_id
-            ).first()
-            if participation:
-                print(f"找到参与记录 - 提交次数: {participation.submission_count}, 积分: {participation.points_earned}")
-            else:
-                print(f"未找到参与记录 - 昵称: {nickname}")
-        
-        # 构建响应
-        response_data = {
-            'id': task.id,
-            'title': task.title,
-            'description': task.description,
-            'points': task.points,
-            'bonus_points': task.bonus_points,
-            'created_at': task.created_at.isoformat() if task.created_at else None,
-            'due_date': task.due_date.isoformat() if task.due_date else None,
-            'is_focus_task': task.is_focus_task,
-            'display_focus_icon': '🌟' if task.is_focus_task else None,
-            'status': task.status,
-            'time_limit_mode': task.due_date is not None,
-            'flame_mode_enabled': task.flame_mode_enabled,
-            'has_participated': participation is not None,
-            'submission_count': participation.submission_count if participation else 0
-        }
+        def build_task_detail():
+            # 查询任务详情
+            task = Task.query.get(task_id)
+            if not task:
+                print(f"任务不存在: {task_id}")
+                return jsonify({'error': '任务不存在'}), 404
+            
+            print(f"任务已找到 - 标题: {task.title}, 站点ID: {task.station_id}")
+            
+            # 检查任务对应的站点是否匹配邀请码
+            if task.station_id != invite_code_obj.station_id:
+                print(f"任务站点不匹配 - 任务站点ID: {task.station_id}, 邀请码站点ID: {invite_code_obj.station_id}")
+                return jsonify({'error': '无权访问此任务'}), 403
+            
+            # 查询用户参与记录
+            participation = None
+            if nickname:
+                participation = Participant.query.filter_by(
+                    name=nickname,
+                    task_id=task_id
+                ).first()
+                if participation:
+                    print(f"找到参与记录 - 提交次数: {participation.submission_count}, 积分: {participation.points_earned}")
+                else:
+                    print(f"未找到参与记录 - 昵称: {nickname}")
+            
+            # 构建响应
+            response_data = {
+                'id': task.id,
+                'title': task.title,
+                'description': task.description,
+                'points': task.points,
+                'bonus_points': task.bonus_points,
+                'created_at': task.created_at.isoformat() if task.created_at else None,
+                'due_date': task.due_date.isoformat() if task.due_date else None,
+                'is_focus_task': task.is_focus_task,
+                'display_focus_icon': '🌟' if task.is_focus_task else None,
+                'status': task.status,
+                'time_limit_mode': task.due_date is not None,
+                'flame_mode_enabled': task.flame_mode_enabled,
+                'has_participated': participation is not None,
+                'submission_count': participation.submission_count if participation else 0
+            }
+            
+            print(f"任务详情返回成功 - 任务ID: {task_id}")
+            return jsonify(response_data)
         
-        print(f"任务详情返回成功 - 任务ID: {task_id}")
-        return jsonify(response_data)
+        # 任务和参与记录的变化都会递增站点版本号，版本号未变时无需查询任务
+        return conditional_response([invite_code_obj.station_id], build_task_detail)
         
     except Exception as e:
         print(f"获取任务详情失败 - 任务ID: {task_id}, 邀请码: {invite_code}, 错误: {str(e)}")
@@ -1174,16 +1364,59 @@ def submit_task_for_task_id(task_id):
         print("="*50)
         print(f"开始处理任务提交 - 任务ID: {task_id}")
         
-        # 获取必要参数
-        nickname = request.form.get('nickname')
-        comment = request.form.get('comment', '')
-        invite_code = request.form.get('invite_code')
-        
         # 详细的请求信息
         print(f"请求方法: {request.method}")
         print(f"Content-Type: {request.headers.get('Content-Type')}")
-        print(f"请求表单数据: {request.form}")
-        print(f"请求文件: {list(request.files.keys())}")
+        print(f"Content-Length: {request.content_length}")
+        
+        if request.mimetype != 'multipart/form-data':
+            return jsonify({'error': '请使用multipart/form-data上传图片'}), 400
+        
+        # 请求体声明的大小超过限制时不读取直接拒绝
+        max_request_size = app.config['MAX_CONTENT_LENGTH']
+        if request.content_length and request.content_length > max_request_size:
+            print(f"请求体过大: {request.content_length} 字节")
+            return jsonify({'error': '上传内容超过大小限制'}), 413
+        
+        boundary = request.mimetype_params.get('boundary')
+        if not boundary:
+            return jsonify({'error': '请求体格式错误'}), 400
+        
+        # 流式解析请求体：图片按块直接写入暂存目录，超过大小或不是图片的文件在读取时即被丢弃；
+        # 暂存期间不占用数据库连接
+        try:
+            upload = ingest_multipart(
+                request.stream,
+                boundary.encode('latin-1'),
+                app.config['IMAGE_STAGING_FOLDER'],
+                file_fields=app.config['SUBMISSION_IMAGE_FIELDS'],
+                max_file_size=app.config['MAX_IMAGE_SIZE'],
+                max_request_size=max_request_size,
+                max_files=app.config['MAX_SUBMISSIONS'],
+                max_field_size=app.config['SUBMISSION_MAX_FIELD_SIZE']
+            )
+        except RequestEntityTooLarge:
+            print("请求体超过大小限制，已停止读取")
+            return jsonify({'error': '上传内容超过大小限制'}), 413
+        except ValueError as e:
+            print(f"请求体解析失败: {str(e)}")
+            return jsonify({'error': '请求体格式错误'}), 400
+        
+        # 未交给后台处理池的暂存文件在请求结束时删除
+        @after_this_request
+        def discard_unclaimed_uploads(response):
+            upload.discard()
+            return response
+        
+        print(f"请求表单字段: {list(upload.form.keys())}")
+        print(f"读取请求体: {upload.bytes_read} 字节")
+        for filename, reason in upload.rejected:
+            print(f"图片被拒绝 - 文件: {filename}, 原因: {reason}")
+        
+        # 获取必要参数
+        nickname = upload.form.get('nickname')
+        comment = upload.form.get('comment', '')
+        invite_code = upload.form.get('invite_code')
         
         # 参数验证
         if not nickname or not nickname.strip():
@@ -1193,7 +1426,7 @@ def submit_task_for_task_id(task_id):
             return jsonify({'error': '请提供邀请码'}), 400
         
         # 验证邀请码
-        invite_code_obj = InviteCode.query.filter_by(code=invite_code, status='active').first()
+        invite_code_obj = resolve_invite_code(invite_code)
         if not invite_code_obj:
             print(f"邀请码无效: {invite_code}")
             return jsonify({'error': '无效的邀请码'}), 403
@@ -1217,112 +1450,32 @@ def submit_task_for_task_id(task_id):
         if task.due_date and task.due_date < datetime.utcnow() and not task.flame_mode_enabled:
             print(f"任务已截止 - 截止时间: {task.due_date.isoformat()}")
             return jsonify({'error': '任务已截止'}), 400
-            
-        # 检查是否有文件上传
-        uploaded_images = []
-        
-        # 处理图片上传 - 尝试多种可能的字段名称
-        possible_fields = ['images', 'image', 'files', 'file']
-        
-        for field in possible_fields:
-            if field in request.files:
-                field_files = request.files.getlist(field)
-                if field_files and field_files[0].filename:
-                    uploaded_images.extend(field_files)
-                    print(f"从字段'{field}'获取到{len(field_files)}个文件")
-        
-        # 如果没有找到文件，尝试遍历所有文件字段
-        if not uploaded_images:
-            for key in request.files:
-                files = request.files.getlist(key)
-                if files and files[0].filename:
-                    uploaded_images.extend(files)
-                    print(f"从额外字段'{key}'获取到{len(files)}个文件")
-        
-        # 最终检查是否有图片
-        if not uploaded_images:
-            print("没有找到有效的图片文件")
-            return jsonify({'error': '请至少上传一张图片'}), 400
-        
-        print(f"共获取到{len(uploaded_images)}张图片")
         
-        # 处理图片保存
-        image_paths = []
-        max_file_size = 5 * 1024 * 1024  # 5MB最大文件大小
-        
-        for image in uploaded_images:
-            try:
-                print(f"处理图片: {image.filename}")
-                
-                # 检查文件名
-                if not image.filename or not image.filename.strip():
-                    print("文件名为空，跳过")
-                    continue
-                
-                # 检查文件类型
-                if not allowed_file(image.filename):
-                    print(f"文件类型不支持: {image.filename}")
-                    continue
-                
-                # 检查文件大小
-                image.seek(0, os.SEEK_END)
-                file_size = image.tell()
-                image.seek(0)
-                if file_size > max_file_size:
-                    print(f"文件大小超过限制: {file_size} 字节")
-                    continue
-                
-                # 生成安全的文件名
-                filename = secure_filename(image.filename)
-                # 添加时间戳和随机字符串，确保文件名唯一
-                timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-                unique_id = str(uuid.uuid4())[:8]
-                new_filename = f"{timestamp}_{unique_id}_{filename}"
-                
-                # 确保目录存在
-                upload_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'task_submissions')
-                os.makedirs(upload_dir, exist_ok=True)
-                
-                # 保存文件
-                filepath = os.path.join(upload_dir, new_filename)
-                print(f"保存文件到: {filepath}")
-                image.save(filepath)
-                image_paths.append(filepath)
-                print(f"图片保存成功: {filepath}")
-            except Exception as e:
-                print(f"处理图片时出错: {str(e)}")
-                continue
-                
+        # 处理完成前提交记录中的图片地址指向暂存文件；
+        # 归档文件名由后台处理时按内容哈希确定，相同内容只保存一份
+        image_paths = [path.replace('\\', '/') for path in upload.staged_files]
         if not image_paths:
-            return jsonify({'error': '未能成功保存任何图片，请检查图片格式和大小'}), 400
+            if upload.rejected:
+                return jsonify({'error': '未能成功保存任何图片，请检查图片格式和大小'}), 400
+            print("没有找到有效的图片文件")
+            return jsonify({'error': '请至少上传一张图片'}), 400
         
-        print(f"成功保存了{len(image_paths)}张图片")
+        print(f"成功暂存了{len(image_paths)}张图片")
         
         # 查找或创建参与记录
-        participant = Participant.query.filter_by(
-            name=nickname,
-            task_id=task_id
-        ).first()
-        
-        if not participant:
+        participant, joined_task = get_or_create_participant(task_id, nickname)
+        if joined_task:
             print(f"创建新的参与者记录: {nickname}")
-            participant = Participant(
-                name=nickname,
-                task_id=task_id,
-                submission_count=0,
-                points_earned=0,
-                total_points_for_task=0
-            )
-            db.session.add(participant)
-            db.session.flush()  # Flush to get the participant.id before creating Submission
         else:
             print(f"找到现有参与者: {nickname}, 提交次数: {participant.submission_count}")
             
         # 创建提交记录
         submission = Submission(
             participant_id=participant.id,
+            submitted_at=datetime.utcnow(),
             comment=comment,
             image_urls=image_paths,
+            image_status='pending',
             is_abnormal=False,  # 默认不是异常提交
             points_earned=0     # 初始分数为0
         )
@@ -1358,17 +1511,47 @@ def submit_task_for_task_id(task_id):
             # 更新参与者积分
             participant.points_earned += points_earned
             participant.total_points_for_task += points_earned
+            if points_earned:
+                participant.last_scored_at = submission.submitted_at
             print(f"积分更新: +{points_earned}分, 总计: {participant.points_earned}分")
+        
+        # 在同一事务中更新站点排行榜汇总
+        apply_standing_delta(
+            task.station_id,
+            nickname,
+            points_delta=points_earned,
+            joined_task=joined_task,
+            is_focus_task=task.is_focus_task,
+            completed_focus_task=task.is_focus_task
+        )
+        
+        # 在同一事务中更新每日排行榜汇总
+        apply_daily_rollup_delta(
+            task.station_id,
+            submission.submitted_at.date(),
+            nickname,
+            points_delta=points_earned,
+            submission_delta=1
+        )
             
         db.session.commit()
         print(f"提交完成 - 任务ID: {task_id}, 参与者: {nickname}, 获得积分: {points_earned}")
         
+        # 提交已保存，之后的缓存同步和推送失败不影响响应
+        sync_rankings_after_commit(task, participant, points_earned)
+        
+        # 提交记录已保存，图片交给后台处理池
+        submission_id = submission.id
+        total_points = participant.points_earned
+        images_pending = schedule_submission_images(submission_id, upload.claim())
+        
         return jsonify({
             'success': True,
             'message': '任务提交成功',
             'points': points_earned,
-            'submission_id': submission.id,
-            'total_points': participant.points_earned
+            'submission_id': submission_id,
+            'total_points': total_points,
+            'images_pending': images_pending
         })
         
     except Exception as e:
@@ -1378,6 +1561,120 @@ def submit_task_for_task_id(task_id):
         traceback.print_exc()
         return jsonify({'error': f'提交任务失败: {str(e)}'}), 500
 
+# 后台处理提交图片
+def schedule_submission_images(submission_id, staged_files):
+    """将暂存的图片交给处理池，处理完成后更新提交记录；返回是否在后台处理"""
+    def on_done(result):
+        with app.app_context():
+            try:
+                finalize_submission_images(submission_id, result)
+            except Exception as e:
+                # 写入失败时不能让提交一直停留在pending，标记为处理失败
+                db.session.rollback()
+                print(f"更新提交图片失败 - 提交ID: {submission_id}, 错误: {str(e)}")
+                import traceback
+                traceback.print_exc()
+                Submission.query.filter_by(id=submission_id).update({'image_status': 'failed'})
+                db.session.commit()
+    
+    return image_workers.submit(
+        process_submission_images,
+        (staged_files, upload_storage, app.config['MAX_IMAGE_SIZE'], app.config['IMAGE_THUMBNAIL_SIZES']),
+        on_done
+    )
+
+# 更新处理完成的提交图片
+def finalize_submission_images(submission_id, result):
+    """用归档后的图片路径替换暂存路径；处理失败时保留暂存文件供人工查看"""
+    submission = Submission.query.get(submission_id)
+    if not submission or submission.image_status != 'pending':
+        # 重启后重新排队等情况下可能收到重复的处理结果，只处理第一次
+        return
+    
+    if result is None:
+        submission.image_status = 'failed'
+    else:
+        for staged_path, reason in result['rejected']:
+            print(f"图片未通过校验 - 提交ID: {submission_id}, 文件: {staged_path}, 原因: {reason}")
+        submission.image_urls = result['images']
+        submission.image_thumbnails = result['thumbnails']
+        submission.image_status = 'ready' if result['images'] else 'failed'
+        record_upload_objects(result['objects'])
+    db.session.commit()
+    print(f"提交图片处理完成 - 提交ID: {submission_id}, 状态: {submission.image_status}")
+
+# 重新处理未完成的提交图片
+def requeue_pending_submission_images():
+    """处理池中的任务只保存在进程内存中，重启后按暂存路径重新提交仍为pending的提交；
+    暂存文件已不存在的提交标记为处理失败。返回重新排队的提交数
+    """
+    requeued = []
+    for submission in Submission.query.filter(Submission.image_status == 'pending').all():
+        staged_files = [path for path in submission.image_urls or [] if os.path.isfile(path)]
+        if staged_files:
+            requeued.append((submission.id, staged_files))
+        else:
+            submission.image_status = 'failed'
+            print(f"暂存图片已丢失，标记为处理失败 - 提交ID: {submission.id}")
+    db.session.commit()
+    
+    for submission_id, staged_files in requeued:
+        schedule_submission_images(submission_id, staged_files)
+    return len(requeued)
+
+# 记录上传对象引用
+def record_upload_objects(objects):
+    """按内容哈希累加上传对象的引用计数，首次出现时登记文件（不提交）"""
+    now = datetime.utcnow()
+    for sha256, path, size, reused in objects:
+        stmt = sqlite_insert(UploadObject).values(
+            sha256=sha256,
+            path=path,
+            size=size,
+            ref_count=1,
+            created_at=now,
+            last_referenced_at=now
+        ).on_conflict_do_update(
+            index_elements=['sha256'],
+            set_={
+                'ref_count': UploadObject.ref_count + 1,
+                'last_referenced_at': now
+            }
+        )
+        db.session.execute(stmt)
+
+# 上传对象存储统计
+def upload_store_stats():
+    """统计去重存储的对象数、引用数、实际占用字节数和节省的字节数"""
+    objects, references, stored_bytes, referenced_bytes = db.session.query(
+        func.count(UploadObject.sha256),
+        func.coalesce(func.sum(UploadObject.ref_count), 0),
+        func.coalesce(func.sum(UploadObject.size), 0),
+        func.coalesce(func.sum(UploadObject.size * UploadObject.ref_count), 0)
+    ).one()
+    return {
+        'objects': objects,
+        'references': references,
+        'stored_bytes': stored_bytes,
+        'referenced_bytes': referenced_bytes,
+        'bytes_saved': referenced_bytes - stored_bytes
+    }
+
+# 提交图片的各尺寸地址
+def submission_image_variants(submission, index=0):
+    """返回第index张图片的原图、预览图（最大缩略图）和缩略图（最小缩略图）地址，缺少缩略图时使用原图"""
+    image_urls = submission.image_urls or []
+    if index >= len(image_urls):
+        return None
+    original = image_urls[index]
+    thumbnails = (submission.image_thumbnails or [])[index:index + 1]
+    sizes = sorted(thumbnails[0].items(), key=lambda item: int(item[0])) if thumbnails and thumbnails[0] else []
+    return {
+        'original': original,
+        'preview': sizes[-1][1] if sizes else original,
+        'thumbnail': sizes[0][1] if sizes else original
+    }
+
 # 验证文件扩展名是否合法
 def allowed_file(filename):
     """验证文件扩展名是否在允许的列表中"""
@@ -1391,6 +1688,996 @@ def secure_filename(filename):
     from werkzeug.utils import secure_filename as _secure_filename
     return _secure_filename(filename)
 
+# 增量更新每日排行榜汇总
+def apply_daily_rollup_delta(station_id, day, nickname, points_delta=0, submission_delta=0):
+    """在调用方的事务中增量更新某日的粉丝积分汇总（不提交）"""
+    now = datetime.utcnow()
+    update_values = {
+        'points': DailyRollup.points + points_delta,
+        'submission_count': DailyRollup.submission_count + submission_delta,
+        'updated_at': now
+    }
+    if points_delta:
+        update_values['last_scored_at'] = now
+    
+    stmt = sqlite_insert(DailyRollup).values(
+        station_id=station_id,
+        day=day,
+        nickname=nickname,
+        points=points_delta,
+        submission_count=submission_delta,
+        last_scored_at=now if points_delta else None,
+        updated_at=now
+    ).on_conflict_do_update(
+        index_elements=['station_id', 'day', 'nickname'],
+        set_=update_values
+    )
+    db.session.execute(stmt)
+
+# 重建每日排行榜汇总
+def rebuild_daily_rollups(station_id):
+    """根据提交记录重建站点的每日排行榜汇总（不提交）"""
+    DailyRollup.query.filter_by(station_id=station_id).delete(synchronize_session=False)
+    
+    submission_day = func.date(Submission.submitted_at)
+    rows = db.session.query(
+        submission_day,
+        Participant.name,
+        func.sum(Submission.points_earned),
+        func.count(Submission.id),
+        func.max(case((Submission.points_earned > 0, Submission.submitted_at)))
+    ).join(
+        Participant, Participant.id == Submission.participant_id
+    ).join(
+        Task, Task.id == Participant.task_id
+    ).filter(
+        Task.station_id == station_id
+    ).group_by(
+        submission_day,
+        Participant.name
+    ).all()
+    
+    now = datetime.utcnow()
+    rollups = [{
+        'station_id': station_id,
+        'day': datetime.strptime(day, '%Y-%m-%d').date(),
+        'nickname': name,
+        'points': points or 0,
+        'submission_count': submission_count or 0,
+        'last_scored_at': parse_db_datetime(last_scored_at),
+        'updated_at': now
+    } for day, name, points, submission_count, last_scored_at in rows if day]
+    
+    if rollups:
+        db.session.execute(DailyRollup.__table__.insert(), rollups)
+    
+    print(f"重建每日排行榜汇总 - 站点ID: {station_id}, 汇总条数: {len(rollups)}")
+
+# 缓存的邀请码信息
+ResolvedInviteCode = namedtuple(
+    'ResolvedInviteCode',
+    ['id', 'code', 'station_id', 'status', 'is_focus_enabled', 'last_focus_change',
+     'focus_task_id', 'focus_cooldown_until']
+)
+
+# 粉丝端任务列表
+def build_fan_tasks(invite_code_obj, since=None):
+    """查询邀请码下所有活跃任务及其总提交次数
+    
+    提供since时改为增量模式：返回任务本身或其提交在since之后有变化的任务（包括已结算、取消焦点的任务），
+    以及since之后被改到其他邀请码的任务（只有id和status='removed'），
+    粉丝端按任务ID合并，status不为active的任务从列表中移除。
+    """
+    if since is None:
+        task_filter = Task.status == 'active'
+    else:
+        changed = aliased(Participant)
+        participants_changed = db.session.query(changed.id).filter(
+            changed.task_id == Task.id,
+            changed.updated_at > since
+        ).exists()
+        task_filter = or_(Task.updated_at > since, participants_changed)
+    
+    # 一次分组查询获取该邀请码下的任务及其总提交次数
+    tasks = db.session.query(
+        Task,
+        func.coalesce(func.sum(Participant.submission_count), 0)
+    ).outerjoin(
+        Participant, Participant.task_id == Task.id
+    ).filter(
+        Task.invite_code_id == invite_code_obj.id,
+        task_filter
+    ).group_by(
+        Task.id
+    ).order_by(
+        Task.created_at
+    ).all()
+    
+    print(f"查询到 {len(tasks)} 个任务")
+    
+    # 转换为JSON
+    tasks_data = []
+    for task, submission_count in tasks:
+        try:
+            task_dict = {
+                'id': task.id,
+                'title': task.title,
+                'description': task.description,
+                'points': task.points,
+                'status': task.status,
+                'due_date': task.due_date.isoformat() if task.due_date else None,
+                'is_focus_task': task.is_focus_task,
+                'flame_mode_enabled': task.flame_mode_enabled,
+                'created_at': task.created_at.isoformat() if task.created_at else None,
+                'bonus_points': task.bonus_points,
+                'submission_count': submission_count  # 添加提交次数
+            }
+            tasks_data.append(task_dict)
+        except Exception as e:
+            print(f"处理任务数据时出错 - 任务ID: {task.id}, 错误: {str(e)}")
+    
+    # 增量模式下，since之后被改到其他邀请码的任务以 status='removed' 返回
+    if since is not None:
+        removed_task_ids = db.session.query(distinct(TaskTombstone.task_id)).join(
+            Task, Task.id == TaskTombstone.task_id
+        ).filter(
+            TaskTombstone.invite_code_id == invite_code_obj.id,
+            TaskTombstone.removed_at > since,
+            or_(Task.invite_code_id.is_(None), Task.invite_code_id != invite_code_obj.id)
+        ).all()
+        tasks_data.extend({'id': task_id, 'status': 'removed'} for task_id, in removed_task_ids)
+    
+    print(f"成功处理 {len(tasks_data)} 个任务数据")
+    return tasks_data
+
+# 增量同步游标
+def new_sync_cursor():
+    """在查询之前生成游标，查询期间写入的数据会在下一次同步中返回"""
+    return datetime.utcnow().isoformat()
+
+def parse_sync_cursor(cursor):
+    """解析客户端传回的游标并回退重叠窗口，格式无效时抛出ValueError；'0'表示全量同步"""
+    if cursor == '0':
+        return None
+    since = datetime.fromisoformat(cursor)
+    return since - timedelta(seconds=app.config['SYNC_CURSOR_OVERLAP'])
+
+# 粉丝的任务参与记录
+def build_fan_participation(invite_code_obj, nickname, task_ids=None, since=None):
+    """一次查询粉丝在邀请码下各任务的参与记录，返回 {任务ID: 参与情况}
+    
+    提供since时只返回参与记录或任务本身在since之后有变化的记录；
+    任务被改到其他邀请码（status='removed'）时，粉丝端同时删除该任务的参与记录。
+    """
+    query = db.session.query(
+        Participant.task_id,
+        Participant.submission_count,
+        Participant.points_earned
+    ).filter(
+        Participant.name == nickname
+    )
+    if task_ids is not None:
+        query = query.filter(Participant.task_id.in_(task_ids))
+    else:
+        query = query.join(Task, Task.id == Participant.task_id).filter(
+            Task.invite_code_id == invite_code_obj.id
+        )
+    if since is not None:
+        changed = Participant.updated_at > since
+        if task_ids is None:
+            # 任务移回本邀请码时参与记录本身没有变化，随任务一起重新返回
+            changed = or_(changed, Task.updated_at > since)
+        query = query.filter(changed)
+    
+    participation = {}
+    for task_id, submission_count, points_earned in query.all():
+        participation[task_id] = {
+            'has_participated': True,
+            'submission_count': submission_count,
+            'points_earned': points_earned
+        }
+    return participation
+
+# 粉丝个人进度
+def build_fan_progress(station_id, nickname):
+    """汇总粉丝在站点所有任务中的参与情况、积分和总榜排名
+    
+    总积分和排名读取站点排行榜汇总表，各任务明细由一次联表查询取得。
+    """
+    rows = db.session.query(
+        Participant.task_id,
+        Task.title,
+        Task.status,
+        Task.is_focus_task,
+        Participant.submission_count,
+        Participant.points_earned,
+        Participant.last_scored_at
+    ).join(
+        Task, Task.id == Participant.task_id
+    ).filter(
+        Task.station_id == station_id,
+        Participant.name == nickname
+    ).order_by(
+        Task.created_at
+    ).all()
+    
+    tasks = [{
+        'task_id': row.task_id,
+        'title': row.title,
+        'status': row.status,
+        'is_focus_task': bool(row.is_focus_task),
+        'submission_count': row.submission_count or 0,
+        'points_earned': row.points_earned or 0,
+        'last_scored_at': row.last_scored_at.isoformat() if row.last_scored_at else None
+    } for row in rows]
+    
+    overall_query = overall_standings_query(station_id)
+    standing = find_ranked_row(overall_query, nickname)
+    if standing:
+        totals = {
+            'total_points': standing.points,
+            'completed_tasks': standing.completed_tasks,
+            'focus_points': standing.focus_points,
+            'focus_task_count': standing.focus_task_count,
+            'has_focus_task_completed': bool(standing.has_focus_task_completed),
+            'rank': standing.rank
+        }
+    else:
+        # 未上榜时与排行榜一致，排在所有已上榜粉丝之后
+        totals = {
+            'total_points': sum(task['points_earned'] for task in tasks),
+            'completed_tasks': len(tasks),
+            'focus_points': sum(task['points_earned'] for task in tasks if task['is_focus_task']),
+            'focus_task_count': sum(1 for task in tasks if task['is_focus_task']),
+            'has_focus_task_completed': any(task['is_focus_task'] and task['submission_count'] for task in tasks),
+            'rank': overall_query.order_by(None).count() + 1
+        }
+    
+    return {
+        'nickname': nickname,
+        'station_id': station_id,
+        **totals,
+        'total_submissions': sum(task['submission_count'] for task in tasks),
+        'tasks': tasks
+    }
+
+# 读取或生成粉丝端任务列表缓存
+def get_cached_fan_tasks(invite_code_obj):
+    """任务或提交变化时站点版本号递增，缓存随之失效"""
+    return get_cached_leaderboard(
+        invite_code_obj.station_id,
+        ('fan_tasks', invite_code_obj.id),
+        lambda: build_fan_tasks(invite_code_obj)
+    )
+
+# 焦点任务状态
+def build_focus_status(invite_code_obj, focus_task=None):
+    """根据邀请码的焦点变更时间计算冷却状态，focus_task为当前焦点任务的字典"""
+    has_focus_task = focus_task is not None
+    
+    # 检查冷却状态
+    now_utc = datetime.utcnow()
+    last_change = invite_code_obj.last_focus_change
+    
+    # 计算冷却截止时间点
+    cooldown_until_dt = focus_cooldown_deadline(invite_code_obj) or datetime(1970, 1, 1)
+    
+    # 判断是否在冷却期
+    is_in_cooldown = last_change and now_utc < cooldown_until_dt
+    
+    # 计算剩余冷却时间
+    cooldown_remaining_seconds = 0
+    if is_in_cooldown:
+        cooldown_remaining_seconds = int((cooldown_until_dt - now_utc).total_seconds())
+    
+    # 构建响应
+    response = {
+        "invite_code": invite_code_obj.code,
+        "has_focus_task": has_focus_task,
+        "is_in_cooldown": is_in_cooldown,
+        "cooldown_remaining_seconds": cooldown_remaining_seconds,
+        "last_change_time": last_change.isoformat() if last_change else None,
+        "cooldown_until_time": cooldown_until_dt.isoformat() if is_in_cooldown else None,
+        "current_time": now_utc.isoformat()
+    }
+    
+    # 如果有焦点任务，添加基本信息
+    if has_focus_task:
+        response["focus_task"] = {
+            "id": focus_task['id'],
+            "title": focus_task['title'],
+            "created_at": focus_task['created_at']
+        }
+    
+    return response
+
+# 焦点变更冷却截止时间
+def focus_cooldown_deadline(invite_code_obj):
+    """优先读取邀请码上保存的冷却截止时间，旧数据按上次变更时间推算"""
+    if invite_code_obj.focus_cooldown_until:
+        return invite_code_obj.focus_cooldown_until
+    if invite_code_obj.last_focus_change:
+        return invite_code_obj.last_focus_change + FOCUS_CHANGE_COOLDOWN
+    return None
+
+# 焦点任务基本信息
+def build_focus_task_info(task_id):
+    """按主键读取焦点任务的基本信息，任务不存在时返回None"""
+    task = Task.query.get(task_id)
+    if not task:
+        return None
+    return {
+        'id': task.id,
+        'title': task.title,
+        'created_at': task.created_at.isoformat()
+    }
+
+# 取消站点下的其他焦点任务
+def unset_other_focus_tasks(station_id, focus_task_id):
+    """用一条UPDATE取消站点下其他活跃的焦点任务，并清除指向它们的邀请码焦点指针（不提交），返回取消的任务数"""
+    unset_count = Task.query.filter(
+        Task.station_id == station_id,
+        Task.is_focus_task == True,
+        Task.status == 'active',
+        Task.id != focus_task_id
+    ).update({Task.is_focus_task: False}, synchronize_session=False)
+    
+    InviteCode.query.filter(
+        InviteCode.station_id == station_id,
+        InviteCode.focus_task_id != focus_task_id
+    ).update({InviteCode.focus_task_id: None}, synchronize_session=False)
+    return unset_count
+
+# 同步邀请码的焦点指针
+def sync_focus_pointer(task):
+    """按任务当前的焦点标记、状态和所属邀请码更新焦点指针（不提交）"""
+    InviteCode.query.filter(
+        InviteCode.focus_task_id == task.id
+    ).update({InviteCode.focus_task_id: None}, synchronize_session=False)
+    
+    if task.is_focus_task and task.status == 'active' and task.invite_code_id:
+        InviteCode.query.filter(
+            InviteCode.id == task.invite_code_id
+        ).update({InviteCode.focus_task_id: task.id}, synchronize_session=False)
+
+# 缓存的全局设置
+GlobalSettingsSnapshot = namedtuple(
+    'GlobalSettingsSnapshot',
+    ['exists', 'default_encouragement_message', 'default_encouragement_image_url']
+)
+
+DEFAULT_ENCOURAGEMENT_MESSAGE = '恭喜你成功完成任务！感谢你的付出和努力~'
+
+# 读取全局设置
+def get_global_settings():
+    """从进程内缓存读取全局设置，缓存缺失时查询数据库"""
+    def load():
+        global_settings = GlobalSettings.query.first()
+        if not global_settings:
+            return GlobalSettingsSnapshot(False, None, None)
+        return GlobalSettingsSnapshot(
+            True,
+            global_settings.default_encouragement_message,
+            global_settings.default_encouragement_image_url
+        )
+    
+    return settings_cache.get_or_load('global', load)
+
+# 刷新全局设置缓存
+def refresh_global_settings():
+    """全局设置写入后重新加载，并使依赖全局设置的响应缓存失效"""
+    settings_cache.invalidate()
+    bump_cache_versions(GLOBAL_SETTINGS_SCOPE)
+    return get_global_settings()
+
+# 全局鼓励设置
+def build_global_encouragement_settings():
+    """读取全局默认鼓励内容，未设置时返回内置默认值"""
+    settings = get_global_settings()
+    return {
+        'default_encouragement_message': settings.default_encouragement_message or DEFAULT_ENCOURAGEMENT_MESSAGE,
+        'default_encouragement_image_url': settings.default_encouragement_image_url
+    }
+
+# 任务鼓励内容
+def build_task_encouragement(task):
+    """合并任务自身与全局设置的鼓励内容，任务内容优先"""
+    settings = get_global_settings()
+    
+    # 构建响应
+    response = {
+        'title': '任务完成！',
+        'message': DEFAULT_ENCOURAGEMENT_MESSAGE,
+        'image_url': None
+    }
+    
+    # 如果有特定任务的鼓励内容，优先使用
+    if task.encouragement_message:
+        response['message'] = task.encouragement_message
+    
+    if task.encouragement_image_url:
+        response['image_url'] = task.encouragement_image_url
+    
+    # 如果任务没有鼓励内容，使用全局设置
+    elif settings.exists:
+        if not task.encouragement_message and settings.default_encouragement_message:
+            response['message'] = settings.default_encouragement_message
+        
+        if not task.encouragement_image_url and settings.default_encouragement_image_url:
+            response['image_url'] = settings.default_encouragement_image_url
+    
+    return response
+
+# 解析邀请码
+def resolve_invite_code(code):
+    """通过进程内缓存解析邀请码，只返回有效（active）的邀请码，否则返回None"""
+    if not code:
+        return None
+    
+    def load():
+        invite_code_obj = InviteCode.query.filter_by(code=code).first()
+        if not invite_code_obj:
+            return None
+        return ResolvedInviteCode(
+            id=invite_code_obj.id,
+            code=invite_code_obj.code,
+            station_id=invite_code_obj.station_id,
+            status=invite_code_obj.status,
+            is_focus_enabled=invite_code_obj.is_focus_enabled,
+            last_focus_change=invite_code_obj.last_focus_change,
+            focus_task_id=invite_code_obj.focus_task_id,
+            focus_cooldown_until=invite_code_obj.focus_cooldown_until
+        )
+    
+    resolved = invite_code_cache.get_or_load(code, load)
+    if resolved is None or resolved.status != 'active':
+        return None
+    return resolved
+
+# 读取响应缓存作用域的版本号
+def load_scope_version(scope):
+    """返回作用域的 (版本号, 修改时间戳)，从未变更过时为 (0, None)
+    
+    版本号保存在数据库中，任一进程的写入对所有进程可见；同一请求内只查询一次，
+    使缓存读取、写入和ETag使用同一版本号。
+    """
+    versions = g.setdefault('scope_versions', {}) if has_app_context() else {}
+    if scope not in versions:
+        row = db.session.get(CacheVersion, scope)
+        if row is None:
+            versions[scope] = (0, None)
+        else:
+            versions[scope] = (row.version, row.updated_at.replace(tzinfo=timezone.utc).timestamp())
+    return versions[scope]
+
+# 递增响应缓存作用域的版本号
+def bump_scope_version(scope):
+    """写操作提交后调用：原子递增数据库中的版本号并提交"""
+    now = datetime.utcnow()
+    stmt = sqlite_insert(CacheVersion).values(
+        scope=scope,
+        version=1,
+        updated_at=now
+    ).on_conflict_do_update(
+        index_elements=['scope'],
+        set_={'version': CacheVersion.version + 1, 'updated_at': now}
+    )
+    db.session.execute(stmt)
+    db.session.commit()
+    if has_app_context():
+        g.pop('scope_versions', None)
+
+# 写入提交后使缓存失效
+def bump_cache_versions(*scopes):
+    """写入提交后递增各作用域的缓存版本号；写入已经保存，失败只记录日志，不向客户端返回错误"""
+    for scope in scopes:
+        try:
+            leaderboard_cache.bump(scope)
+        except Exception as e:
+            db.session.rollback()
+            print(f"更新缓存版本号失败 - 作用域: {scope}, 错误: {str(e)}")
+            import traceback
+            traceback.print_exc()
+
+# 任务级缓存作用域
+def task_cache_scope(task_id):
+    """任务自身内容（如鼓励内容）的版本号作用域，只在编辑任务时递增"""
+    return f"task:{task_id}"
+
+# 读取或生成排行榜缓存
+def get_cached_leaderboard(station_id, cache_key, builder):
+    """按站点版本号读取已序列化的排行榜（及任务列表等站点级数据），未命中时合并并发请求并调用builder()生成"""
+    return leaderboard_cache.get_or_build(
+        station_id,
+        cache_key,
+        lambda: coalesce_json(station_id, cache_key, builder)
+    )
+
+# 合并并发的相同查询
+def coalesce_json(station_id, key, builder):
+    """相同站点版本下的相同键只执行一次builder()，其余并发请求复用序列化结果"""
+    flight_key = (station_id, key, leaderboard_cache.version(station_id))
+    return request_coalescer.do(
+        flight_key,
+        lambda: response_compressor.precompress(app.json.dumps(builder()))
+    )
+
+# 返回已序列化的JSON响应
+def json_payload_response(payload, status=200):
+    """直接使用已序列化的JSON字符串构建响应，缓存中预压缩的内容随响应传给压缩钩子"""
+    response = app.response_class(payload, status=status, mimetype=app.json.mimetype)
+    if isinstance(payload, CompressedPayload):
+        response.precompressed = payload.encoded
+    return response
+
+# 压缩响应
+@app.after_request
+def compress_response(response):
+    """按 Accept-Encoding 压缩超过阈值的响应，优先复用缓存中预压缩的内容"""
+    return response_compressor.process(
+        response,
+        request.accept_encodings,
+        endpoint=request.endpoint,
+        precompressed=getattr(response, 'precompressed', None)
+    )
+
+# 条件请求（ETag / Last-Modified）
+def conditional_response(scopes, build_response, extra=None):
+    """根据作用域版本号生成ETag，客户端缓存仍有效时直接返回304而不调用build_response()
+    
+    站点下的任务、提交、结算等写操作都会递增站点版本号，因此版本号不变时响应内容不变。
+    版本号和修改时间保存在数据库中，各进程对同一内容给出相同的ETag和Last-Modified。
+    extra用于区分随时间变化的内容（如日榜的日期）。
+    """
+    etag = '-'.join(str(leaderboard_cache.version(scope)) for scope in scopes)
+    if extra:
+        etag = f"{etag}-{extra}"
+    # 压缩后的响应体不同，ETag按协商出的编码区分
+    encoding = response_compressor.negotiate(request.accept_encodings)
+    if encoding:
+        etag = f"{etag}-{encoding}"
+    last_modified = datetime.fromtimestamp(
+        max(leaderboard_cache.last_modified(scope) for scope in scopes),
+        timezone.utc
+    )
+    
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = app.response_class(status=304)
+    else:
+        response = app.make_response(build_response())
+        if response.status_code != 200:
+            return response
+    
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+# 解析数据库返回的时间
+def parse_db_datetime(value):
+    """SQLite聚合函数返回的时间为字符串，转换为datetime"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+# 排名引擎的同分排序值
+def scored_at_tie_break(scored_at):
+    """将达到积分的时间转换为排名引擎的同分排序值，时间未知的排在同分者最后"""
+    return scored_at.timestamp() if scored_at else float('inf')
+
+# 排行榜排名列
+def rank_column(points_column):
+    """由数据库窗口函数计算的排名：同分同名次，并列后的名次顺延（RANK）"""
+    return func.rank().over(order_by=points_column.desc()).label('rank')
+
+# 排行榜展示顺序
+def ranking_order(points_column, scored_at_column, nickname_column):
+    """积分降序；同分时先达到该积分者在前，最后按昵称保证顺序稳定"""
+    return points_column.desc(), scored_at_column.asc().nulls_last(), nickname_column
+
+# 站点总榜查询
+def overall_standings_query(station_id):
+    """站点汇总表上带排名的总榜查询，总榜和粉丝个人进度共用"""
+    return db.session.query(
+        StationStanding.nickname,
+        StationStanding.total_points.label('points'),
+        StationStanding.task_count.label('completed_tasks'),
+        StationStanding.focus_points,
+        StationStanding.focus_task_count,
+        StationStanding.has_focus_task_completed,
+        rank_column(StationStanding.total_points)
+    ).filter(
+        StationStanding.station_id == station_id
+    ).order_by(
+        *ranking_order(StationStanding.total_points, StationStanding.last_scored_at, StationStanding.nickname)
+    )
+
+# 解析排行榜分页参数
+def get_page_args():
+    """读取 limit/offset 分页参数，未指定limit时返回全部"""
+    limit = request.args.get('limit', type=int)
+    offset = max(0, request.args.get('offset', 0, type=int))
+    if limit is not None:
+        limit = max(0, min(limit, app.config['LEADERBOARD_MAX_PAGE_SIZE']))
+    return limit, offset
+
+# 读取一页带排名的排行榜
+def fetch_ranked_page(query, limit=None, offset=0):
+    """排名已在数据库中计算，分页时只读取需要的行"""
+    if offset:
+        query = query.offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+# 查询指定粉丝的排名
+def find_ranked_row(query, nickname):
+    """在带排名的查询外层按昵称过滤，排名仍基于全部数据计算，只返回一行"""
+    ranked = query.order_by(None).subquery()
+    return db.session.query(ranked).filter(ranked.c.nickname == nickname).first()
+
+# 列式排行榜中需要转换类型的字段，与逐行格式的取值类型保持一致
+COMPACT_FIELD_TYPES = {'has_focus_task_completed': bool}
+
+# 构建列式排行榜
+def build_compact_columns(names, rows, offset, fields):
+    """将 (…, rank) 结果行直接转置为并列数组（format=compact），不逐行构建字典
+    
+    名次不单独返回：第一行为 rank_start，之后与前一行同分时名次相同，
+    否则为 offset + 行序号 + 1，与 RANK() 的同分同名次规则一致。
+    """
+    columns = dict(zip(names, zip(*rows))) if rows else {}
+    payload = {
+        'format': 'compact',
+        'offset': offset,
+        'rank_start': columns['rank'][0] if rows else offset + 1
+    }
+    for field in fields:
+        convert = COMPACT_FIELD_TYPES.get(field)
+        values = columns.get(field, ())
+        payload[field] = [convert(value) for value in values] if convert else list(values)
+    return payload
+
+# 构建带排名的排行榜响应
+def build_ranked_leaderboard(query, to_entry, limit=None, offset=0, compact_fields=None):
+    """按分页读取排行榜（所有粉丝共享的部分）；指定 compact_fields 时返回列式排行榜"""
+    rows = fetch_ranked_page(query, limit, offset)
+    if compact_fields:
+        return build_compact_columns(rows[0]._fields if rows else (), rows, offset, compact_fields)
+    return [to_entry(row) for row in rows]
+
+# 查询粉丝自己的排名
+def build_ranked_user_info(query, to_entry, fan_nickname):
+    """返回粉丝在带排名查询中的条目，未上榜时排在所有已上榜粉丝之后"""
+    row = find_ranked_row(query, fan_nickname)
+    if row:
+        return to_entry(row)
+    return {
+        'nickname': fan_nickname,
+        'points': 0,
+        'completed_tasks': 0,
+        'rank': query.order_by(None).count() + 1
+    }
+
+# 附加粉丝自己的排名
+def attach_user_info(payload, user_info, compact=False):
+    """在已序列化的共享排行榜后拼接粉丝自己的排名，无需重新解析整个排行榜
+    
+    与任务排行榜一致：普通格式返回 leaderboard 和 user_info，列式格式将 user_info 附在同一对象中。
+    """
+    user_info_json = app.json.dumps(user_info)
+    if compact:
+        return f'{payload[:-1]},"user_info":{user_info_json}}}'
+    return f'{{"leaderboard":{payload},"user_info":{user_info_json}}}'
+
+# 粉丝端带排名的排行榜响应
+def ranked_leaderboard_response(station_id, cache_key, build_query, to_entry, limit, offset,
+                                fan_nickname='', compact_fields=None):
+    """共享的排行榜分页按站点版本号缓存；粉丝自己的排名每次单独查询，不进入缓存"""
+    payload = get_cached_leaderboard(
+        station_id,
+        cache_key,
+        lambda: build_ranked_leaderboard(build_query(), to_entry, limit, offset, compact_fields)
+    )
+    if not fan_nickname:
+        return json_payload_response(payload)
+    user_info = build_ranked_user_info(build_query(), to_entry, fan_nickname)
+    return json_payload_response(attach_user_info(payload, user_info, compact_fields is not None))
+
+# 积分变化提交后同步排行榜
+def sync_rankings_after_commit(task, participant, points_delta):
+    """写入提交后更新进程内的任务排行榜（已结算任务以快照为准）、使站点缓存失效并推送排名变化
+    
+    写入已经保存，这里的失败只记录日志：向客户端返回错误会导致重试时重复提交和重复计分。
+    """
+    try:
+        leaderboard_cache.bump(task.station_id)
+        if task.status != 'completed':
+            # 排行榜只在构建于上一个版本时增量更新，期间有其他进程写入时会被丢弃并重建
+            ranking_engine.record(task.id, participant.name, participant.points_earned, participant.submission_count,
+                                  scored_at_tie_break(participant.last_scored_at),
+                                  version=leaderboard_cache.version(task.station_id))
+        publish_rank_delta(task, participant.name, points_delta)
+    except Exception as e:
+        db.session.rollback()
+        ranking_engine.invalidate(task.id)
+        print(f"同步排行榜失败 - 任务ID: {task.id}, 粉丝: {participant.name}, 错误: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+# 推送排行榜变化
+def publish_rank_delta(task, nickname, points_delta):
+    """提交或扣分后向站点和任务频道推送该粉丝的最新排名，无订阅者时不做任何查询"""
+    task_channel = f"task:{task.id}"
+    station_channel = f"station:{task.station_id}"
+    
+    if leaderboard_hub.has_subscribers(task_channel):
+        board = get_task_board(task.id, task.station_id)
+        ranked = board.rank_of(nickname)
+        if ranked:
+            rank, points, completed_tasks = ranked
+            leaderboard_hub.publish(task_channel, 'rank', {
+                'task_id': task.id,
+                'nickname': nickname,
+                'points': points,
+                'points_delta': points_delta,
+                'completed_tasks': completed_tasks,
+                'rank': rank
+            })
+    
+    if leaderboard_hub.has_subscribers(station_channel):
+        standing = StationStanding.query.get((task.station_id, nickname))
+        if standing:
+            rank = StationStanding.query.filter(
+                StationStanding.station_id == task.station_id,
+                StationStanding.total_points > standing.total_points
+            ).count() + 1
+            leaderboard_hub.publish(station_channel, 'rank', {
+                'task_id': task.id,
+                'nickname': nickname,
+                'points': standing.total_points,
+                'points_delta': points_delta,
+                'completed_tasks': standing.task_count,
+                'rank': rank,
+                'has_focus_task_completed': bool(standing.has_focus_task_completed)
+            })
+
+# 获取任务排行榜
+def get_task_board(task_id, station_id):
+    """从排名引擎获取任务的有序排行榜，站点版本号变化后（包括其他进程的写入）重新加载"""
+    return ranking_engine.get(task_id, lambda: load_task_ranking_rows(task_id), leaderboard_cache.version(station_id))
+
+# 加载任务排行榜数据
+def load_task_ranking_rows(task_id):
+    """查询任务参与者的 (昵称, 积分, 提交次数, 同分排序值)，供排名引擎重建排行榜
+    
+    已结算的任务直接读取结算快照，快照中的顺序即为同分者的先后顺序，保证历史排名稳定。
+    """
+    task = Task.query.get(task_id)
+    if task and task.status == 'completed':
+        snapshot = get_task_ranking_snapshot(task)
+        return [
+            (name, points, submission_count, index)
+            for index, (name, points, submission_count) in enumerate(snapshot.entries or [])
+        ]
+    
+    rows = db.session.query(
+        Participant.name,
+        Participant.points_earned,
+        Participant.submission_count,
+        Participant.last_scored_at
+    ).filter(
+        Participant.task_id == task_id
+    ).all()
+    return [
+        (name, points, submission_count, scored_at_tie_break(last_scored_at))
+        for name, points, submission_count, last_scored_at in rows
+    ]
+
+# 冻结任务排行榜
+def freeze_task_ranking(task):
+    """在调用方的事务中写入任务的最终排名快照（不提交），已存在时直接返回"""
+    snapshot = TaskRankingSnapshot.query.get(task.id)
+    if snapshot:
+        return snapshot
+    
+    rows = db.session.query(
+        Participant.name,
+        Participant.points_earned,
+        Participant.submission_count
+    ).filter(
+        Participant.task_id == task.id
+    ).order_by(
+        *ranking_order(Participant.points_earned, Participant.last_scored_at, Participant.name)
+    ).all()
+    
+    snapshot = TaskRankingSnapshot(
+        task_id=task.id,
+        station_id=task.station_id,
+        participant_count=len(rows),
+        entries=[[name, points or 0, submission_count or 0] for name, points, submission_count in rows]
+    )
+    db.session.add(snapshot)
+    print(f"冻结任务排行榜 - 任务ID: {task.id}, 参与人数: {len(rows)}")
+    return snapshot
+
+# 获取已结算任务的排名快照
+def get_task_ranking_snapshot(task):
+    """读取任务的排名快照；结算早于快照功能的任务在首次读取时补写快照"""
+    snapshot = TaskRankingSnapshot.query.get(task.id)
+    if snapshot:
+        return snapshot
+    
+    try:
+        snapshot = freeze_task_ranking(task)
+        db.session.commit()
+        return snapshot
+    except IntegrityError:
+        # 并发请求已写入快照
+        db.session.rollback()
+        return TaskRankingSnapshot.query.get(task.id)
+
+# 构建任务排行榜条目
+def build_task_leaderboard_entry(task, rank, nickname, points, completed_tasks):
+    """将排名引擎中的一条记录转换为排行榜响应格式"""
+    return {
+        'nickname': nickname,
+        'points': points,
+        'completed_tasks': completed_tasks,
+        'rank': rank,
+        'has_focus_task_completed': task.is_focus_task and completed_tasks > 0
+    }
+
+# 查找或创建参与记录
+def get_or_create_participant(task_id, nickname):
+    """按 (task_id, name) 唯一索引查找参与记录，不存在时创建（不提交），返回 (参与记录, 是否新建)
+    
+    同一粉丝的并发首次提交可能同时走到创建分支，插入使用 ON CONFLICT DO NOTHING，
+    由唯一索引裁决，未插入成功的一方直接读取对方创建的记录。
+    """
+    participant = Participant.query.filter_by(task_id=task_id, name=nickname).first()
+    if participant is not None:
+        return participant, False
+    
+    now = datetime.utcnow()
+    stmt = sqlite_insert(Participant).values(
+        id=str(uuid.uuid4()),
+        task_id=task_id,
+        name=nickname,
+        joined_at=now,
+        submission_count=0,
+        points_earned=0,
+        total_points_for_task=0,
+        updated_at=now
+    ).on_conflict_do_nothing(
+        index_elements=['task_id', 'name']
+    )
+    created = db.session.execute(stmt).rowcount == 1
+    participant = Participant.query.filter_by(task_id=task_id, name=nickname).one()
+    return participant, created
+
+# 合并重复的参与记录
+def merge_duplicate_participants():
+    """合并同一任务下昵称重复的参与记录，提交记录改挂到保留的记录上（建立唯一索引前调用，不提交），返回删除的记录数"""
+    duplicates = db.session.query(
+        Participant.task_id,
+        Participant.name
+    ).group_by(
+        Participant.task_id,
+        Participant.name
+    ).having(
+        func.count(Participant.id) > 1
+    ).all()
+    
+    removed = 0
+    for task_id, name in duplicates:
+        rows = Participant.query.filter_by(
+            task_id=task_id,
+            name=name
+        ).order_by(
+            Participant.joined_at,
+            Participant.id
+        ).all()
+        keeper, extras = rows[0], rows[1:]
+        for extra in extras:
+            keeper.submission_count = (keeper.submission_count or 0) + (extra.submission_count or 0)
+            keeper.points_earned = (keeper.points_earned or 0) + (extra.points_earned or 0)
+            keeper.total_points_for_task = (keeper.total_points_for_task or 0) + (extra.total_points_for_task or 0)
+            keeper.fan_id = keeper.fan_id or extra.fan_id
+            if extra.last_scored_at and (keeper.last_scored_at is None or extra.last_scored_at > keeper.last_scored_at):
+                keeper.last_scored_at = extra.last_scored_at
+        
+        extra_ids = [extra.id for extra in extras]
+        Submission.query.filter(
+            Submission.participant_id.in_(extra_ids)
+        ).update({Submission.participant_id: keeper.id}, synchronize_session=False)
+        Participant.query.filter(
+            Participant.id.in_(extra_ids)
+        ).delete(synchronize_session=False)
+        removed += len(extra_ids)
+        print(f"合并重复参与记录 - 任务: {task_id}, 昵称: {name}, 合并数: {len(extra_ids)}")
+    
+    return removed
+
+# 增量更新站点排行榜汇总
+def apply_standing_delta(station_id, nickname, points_delta=0, joined_task=False,
+                         is_focus_task=False, completed_focus_task=False):
+    """在调用方的事务中增量更新站点排行榜汇总（不提交）"""
+    focus_points_delta = points_delta if is_focus_task else 0
+    task_delta = 1 if joined_task else 0
+    focus_task_delta = 1 if joined_task and is_focus_task else 0
+    now = datetime.utcnow()
+    
+    update_values = {
+        'total_points': StationStanding.total_points + points_delta,
+        'task_count': StationStanding.task_count + task_delta,
+        'focus_points': StationStanding.focus_points + focus_points_delta,
+        'focus_task_count': StationStanding.focus_task_count + focus_task_delta,
+        'updated_at': now
+    }
+    if completed_focus_task:
+        update_values['has_focus_task_completed'] = True
+    if points_delta:
+        update_values['last_scored_at'] = now
+    
+    # 使用UPSERT保证并发提交时的原子累加
+    stmt = sqlite_insert(StationStanding).values(
+        station_id=station_id,
+        nickname=nickname,
+        total_points=points_delta,
+        task_count=task_delta,
+        focus_points=focus_points_delta,
+        focus_task_count=focus_task_delta,
+        has_focus_task_completed=completed_focus_task,
+        last_scored_at=now if points_delta else None,
+        updated_at=now
+    ).on_conflict_do_update(
+        index_elements=['station_id', 'nickname'],
+        set_=update_values
+    )
+    db.session.execute(stmt)
+
+# 重建站点排行榜汇总
+def rebuild_station_standings(station_id):
+    """根据参与记录重建站点排行榜汇总（焦点任务变更等低频操作时调用，不提交）"""
+    StationStanding.query.filter_by(station_id=station_id).delete(synchronize_session=False)
+    
+    is_focus = Task.is_focus_task == True
+    rows = db.session.query(
+        Participant.name,
+        func.sum(Participant.points_earned),
+        func.count(Participant.id),
+        func.sum(case((is_focus, Participant.points_earned), else_=0)),
+        func.sum(case((is_focus, 1), else_=0)),
+        func.max(case((is_focus & (Participant.submission_count > 0), 1), else_=0)),
+        func.max(Participant.last_scored_at)
+    ).join(
+        Task, Task.id == Participant.task_id
+    ).filter(
+        Task.station_id == station_id
+    ).group_by(
+        Participant.name
+    ).all()
+    
+    now = datetime.utcnow()
+    standings = [{
+        'station_id': station_id,
+        'nickname': name,
+        'total_points': total_points or 0,
+        'task_count': task_count or 0,
+        'focus_points': focus_points or 0,
+        'focus_task_count': focus_task_count or 0,
+        'has_focus_task_completed': bool(focus_completed),
+        'last_scored_at': parse_db_datetime(last_scored_at),
+        'updated_at': now
+    } for name, total_points, task_count, focus_points, focus_task_count, focus_completed, last_scored_at in rows]
+    
+    if standings:
+        db.session.execute(StationStanding.__table__.insert(), standings)
+    
+    print(f"重建站点排行榜汇总 - 站点ID: {station_id}, 粉丝数: {len(standings)}")
+
 # 任务鼓励内容
 @app.route('/api/fan/encouragement', methods=['GET'])
 def get_fan_encouragement():
@@ -1403,45 +2690,27 @@ def get_fan_encouragement():
             return jsonify({'error': '缺少必要参数'}), 400
         
         # 验证邀请码
-        invite_code_obj = InviteCode.query.filter_by(code=invite_code, status='active').first()
+        invite_code_obj = resolve_invite_code(invite_code)
         if not invite_code_obj:
             return jsonify({'error': '无效的邀请码'}), 403
         
-        # 获取任务信息
-        task = Task.query.get(task_id)
-        if not task:
-            return jsonify({'error': '任务不存在'}), 404
+        def build_encouragement():
+            # 获取任务信息
+            task = Task.query.get(task_id)
+            if not task:
+                return jsonify({'error': '任务不存在'}), 404
             
-        # 检查任务是否属于邀请码对应的站点
-        if task.station_id != invite_code_obj.station_id:
-            return jsonify({'error': '无权访问此任务'}), 403
-        
-        # 获取全局鼓励设置
-        global_settings = GlobalSettings.query.first()
-        
-        # 构建响应
-        response = {
-            'title': '任务完成！',
-            'message': '恭喜你成功完成任务！感谢你的付出和努力~',
-            'image_url': None
-        }
-        
-        # 如果有特定任务的鼓励内容，优先使用
-        if task.encouragement_message:
-            response['message'] = task.encouragement_message
+            # 检查任务是否属于邀请码对应的站点
+            if task.station_id != invite_code_obj.station_id:
+                return jsonify({'error': '无权访问此任务'}), 403
             
-        if task.encouragement_image_url:
-            response['image_url'] = task.encouragement_image_url
-            
-        # 如果任务没有鼓励内容，使用全局设置
-        elif global_settings:
-            if not task.encouragement_message and global_settings.default_encouragement_message:
-                response['message'] = global_settings.default_encouragement_message
-                
-            if not task.encouragement_image_url and global_settings.default_encouragement_image_url:
-                response['image_url'] = global_settings.default_encouragement_image_url
-                
-        return jsonify(response)
+            # 鼓励内容只随任务编辑和全局设置变化，按任务版本号缓存，粉丝提交不会使其失效
+            cache_key = ('encouragement', leaderboard_cache.version(GLOBAL_SETTINGS_SCOPE))
+            payload = get_cached_leaderboard(task_cache_scope(task.id), cache_key, lambda: build_task_encouragement(task))
+            return json_payload_response(payload)
+        
+        # 任务与全局设置均未变化时直接返回304
+        return conditional_response([task_cache_scope(task_id), GLOBAL_SETTINGS_SCOPE], build_encouragement)
         
     except Exception as e:
         print(f"获取鼓励内容失败: {str(e)}")
@@ -1456,45 +2725,17 @@ def get_fan_global_encouragement_settings():
     try:
         invite_code = request.args.get('invite_code')
         
-        if not invite_code:
-            # 如果没有提供邀请码，尝试获取默认设置
-            global_settings = GlobalSettings.query.first()
-            
-            if not global_settings:
-                return jsonify({
-                    'default_encouragement_message': '恭喜你成功完成任务！感谢你的付出和努力~',
-                    'default_encouragement_image_url': None
-                })
-                
-            # 构建响应
-            response = {
-                'default_encouragement_message': global_settings.default_encouragement_message or '恭喜你成功完成任务！感谢你的付出和努力~',
-                'default_encouragement_image_url': global_settings.default_encouragement_image_url
-            }
-            
-            return jsonify(response)
-        
-        # 验证邀请码
-        invite_code_obj = InviteCode.query.filter_by(code=invite_code, status='active').first()
-        if not invite_code_obj:
-            return jsonify({'error': '无效的邀请码'}), 403
-            
-        # 获取站点全局设置
-        global_settings = GlobalSettings.query.first()
+        if invite_code:
+            # 验证邀请码
+            invite_code_obj = resolve_invite_code(invite_code)
+            if not invite_code_obj:
+                return jsonify({'error': '无效的邀请码'}), 403
         
-        if not global_settings:
-            return jsonify({
-                'default_encouragement_message': '恭喜你成功完成任务！感谢你的付出和努力~',
-                'default_encouragement_image_url': None
-            })
-            
-        # 构建响应
-        response = {
-            'default_encouragement_message': global_settings.default_encouragement_message or '恭喜你成功完成任务！感谢你的付出和努力~',
-            'default_encouragement_image_url': global_settings.default_encouragement_image_url
-        }
-        
-        return jsonify(response)
+        # 没有提供邀请码时同样返回默认设置
+        return conditional_response(
+            [GLOBAL_SETTINGS_SCOPE],
+            lambda: jsonify(build_global_encouragement_settings())
+        )
         
     except Exception as e:
         print(f"获取全局鼓励设置失败: {str(e)}")
@@ -1505,7 +2746,12 @@ def get_fan_global_encouragement_settings():
 # 任务排行榜
 @app.route('/api/fan/leaderboard/<string:task_id>', methods=['GET'])
 def get_task_leaderboard(task_id):
-    """获取指定任务的排行榜数据"""
+    """获取指定任务的排行榜数据
+    
+    支持 top=N（或 limit=N&offset=M）分页返回，around=昵称&radius=K 返回该粉丝前后K名，
+    排名由进程内排名引擎通过二分查找得出，同分同名次。
+    format=compact 时返回列式排行榜（见 build_compact_columns）。
+    """
     try:
         invite_code = request.args.get('invite_code')
         fan_nickname = request.args.get('fan_nickname', '')
@@ -1514,65 +2760,85 @@ def get_task_leaderboard(task_id):
             return jsonify({'error': '缺少必要参数：邀请码'}), 400
             
         # 验证邀请码
-        invite_code_obj = InviteCode.query.filter_by(code=invite_code, status='active').first()
+        invite_code_obj = resolve_invite_code(invite_code)
         if not invite_code_obj:
             return jsonify({'error': '无效的邀请码'}), 403
             
-        # 查询任务
-        task = Task.query.get(task_id)
-        if not task:
-            return jsonify({'error': '任务不存在'}), 404
+        def build_response():
+            # 查询任务
+            task = Task.query.get(task_id)
+            if not task:
+                return jsonify({'error': '任务不存在'}), 404
             
-        # 检查任务是否属于邀请码对应的站点
-        if task.station_id != invite_code_obj.station_id:
-            return jsonify({'error': '无权访问此任务排行榜'}), 403
-        
-        # 确保任何待处理的数据库事务都已提交    
-        db.session.commit()
+            # 检查任务是否属于邀请码对应的站点
+            if task.station_id != invite_code_obj.station_id:
+                return jsonify({'error': '无权访问此任务排行榜'}), 403
             
-        # 查询任务参与者
-        participants = Participant.query.filter_by(
-            task_id=task_id
-        ).order_by(Participant.points_earned.desc()).all()
-        
-        # 构建排行榜数据
-        leaderboard_data = []
-        self_info = None
-        
-        for index, participant in enumerate(participants):
-            # 基本信息
-            participant_data = {
-                'nickname': participant.name,
-                'points': participant.points_earned,
-                'completed_tasks': participant.submission_count,
-                'rank': index + 1,
-                'has_focus_task_completed': task.is_focus_task and participant.submission_count > 0
-            }
+            # 排行榜查询参数：top=N 返回前N名，around=昵称&radius=K 返回该粉丝前后K名
+            top = request.args.get('top', type=int)
+            limit, offset = get_page_args()
+            if top is None:
+                top = limit
+            around = request.args.get('around')
+            radius = request.args.get('radius', 10, type=int)
+            radius = max(0, min(radius, app.config['LEADERBOARD_MAX_RADIUS']))
+            compact = request.args.get('format') == 'compact'
             
-            leaderboard_data.append(participant_data)
+            # 从排名引擎获取有序排行榜（首次访问或站点版本号变化时从数据库重建）
+            board = get_task_board(task_id, task.station_id)
             
-            # 如果是当前用户，记录自己的信息
-            if participant.name == fan_nickname:
-                self_info = participant_data
+            def build_task_leaderboard():
+                if around:
+                    start, end = board.around_window(around, radius)
+                elif top is not None:
+                    start, end = offset, offset + max(0, top)
+                else:
+                    start, end = offset, len(board)
+                entries = board.slice(start, end)
                 
-        # 如果没找到自己的信息，但提供了昵称
-        if not self_info and fan_nickname:
-            self_info = {
-                'nickname': fan_nickname,
-                'points': 0,
-                'completed_tasks': 0,
-                'rank': len(participants) + 1,
-                'has_focus_task_completed': False
-            }
-        
-        # 如果请求中包含用户昵称参数，直接返回该用户的排名信息
-        if fan_nickname:
-            return jsonify({
-                "leaderboard": leaderboard_data,
-                "user_info": self_info
-            })
+                # 构建排行榜数据；列式格式直接转置排名引擎返回的元组
+                if compact:
+                    leaderboard_data = build_compact_columns(
+                        ('rank', 'nickname', 'points', 'completed_tasks'),
+                        entries,
+                        max(0, start),
+                        ('nickname', 'points', 'completed_tasks')
+                    )
+                    leaderboard_data['is_focus_task'] = bool(task.is_focus_task)
+                    return leaderboard_data
+                return [
+                    build_task_leaderboard_entry(task, rank, nickname, points, completed_tasks)
+                    for rank, nickname, points, completed_tasks in entries
+                ]
+            
+            # 共享的排行榜分页按站点版本号缓存；around窗口因粉丝而异，直接由排名引擎计算
+            if around:
+                payload = app.json.dumps(build_task_leaderboard())
+            else:
+                cache_key = ('task', task_id, top, offset, compact)
+                payload = get_cached_leaderboard(task.station_id, cache_key, build_task_leaderboard)
+            
+            if not fan_nickname:
+                return json_payload_response(payload)
             
-        return jsonify(leaderboard_data)
+            # 通过二分查找获取当前用户的排名，附加到响应中而不进入共享缓存
+            ranked = board.rank_of(fan_nickname)
+            if ranked:
+                rank, points, completed_tasks = ranked
+                self_info = build_task_leaderboard_entry(task, rank, fan_nickname, points, completed_tasks)
+            else:
+                # 如果没找到自己的信息，但提供了昵称
+                self_info = {
+                    'nickname': fan_nickname,
+                    'points': 0,
+                    'completed_tasks': 0,
+                    'rank': len(board) + 1,
+                    'has_focus_task_completed': False
+                }
+            return json_payload_response(attach_user_info(payload, self_info, compact))
+        
+        # 站点版本号未变时直接返回304，无需查询任务和排名
+        return conditional_response([invite_code_obj.station_id], build_response)
         
     except Exception as e:
         print(f"获取任务排行榜失败: {str(e)}")
@@ -1589,26 +2855,29 @@ def get_fan_leaderboard():
     - 总榜: 显示所有历史累计积分
     - 日榜: 仅显示当日提交任务获得的积分
     - 焦点榜: 仅统计焦点任务获得的积分
+    
+    排名由数据库窗口函数计算，同分同名次；支持 limit/offset 分页，
+    提供 fan_nickname 时附带该粉丝的排名信息；format=compact 时返回列式排行榜。
     """
     try:
         invite_code = request.args.get('invite_code')
         leaderboard_type = request.args.get('type', 'overall')
         task_id = request.args.get('task_id')
+        fan_nickname = request.args.get('fan_nickname', '')
+        limit, offset = get_page_args()
+        compact = request.args.get('format') == 'compact'
         
         if not invite_code:
             return jsonify({'error': '缺少必要参数：邀请码'}), 400
             
         # 验证邀请码
-        invite_code_obj = InviteCode.query.filter_by(code=invite_code, status='active').first()
+        invite_code_obj = resolve_invite_code(invite_code)
         if not invite_code_obj:
             return jsonify({'error': '无效的邀请码'}), 403
             
         # 获取站点ID
         station_id = invite_code_obj.station_id
         
-        # 确保任何待处理的数据库事务都已提交
-        db.session.commit()
-        
         # 根据类型查询不同的排行榜
         if leaderboard_type == 'task' and task_id:
             # 如果是任务排行榜，重定向到任务特定的排行榜API
@@ -1624,117 +2893,92 @@ def get_fan_leaderboard():
             return redirect(url_for('get_task_leaderboard', task_id=task_id, **query_params))
         
         elif leaderboard_type == 'daily':
-            # 日榜 - 今日参与的任务积分
+            # 日榜 - 从每日排行榜汇总中读取今日积分
             today = datetime.now().date()
-            tomorrow = today + timedelta(days=1)
-            
-            # 获取今日0点到明日0点的时间范围
-            today_start = datetime.combine(today, datetime.min.time()).replace(tzinfo=timezone.utc)
-            today_end = datetime.combine(tomorrow, datetime.min.time()).replace(tzinfo=timezone.utc)
-            
-            # 使用Submission表直接统计今日提交的积分
-            # 这样可以确保只统计今日提交所获得的积分
-            daily_participants = db.session.query(
-                Participant.name,
-                func.sum(Submission.points_earned).label('total_points'),
-                func.count(distinct(Submission.id)).label('submission_count')
-            ).join(
-                Submission, Submission.participant_id == Participant.id
-            ).join(
-                Task, Task.id == Participant.task_id
-            ).filter(
-                Submission.submitted_at >= today_start,
-                Submission.submitted_at < today_end,
-                Task.station_id == station_id
-            ).group_by(
-                Participant.name
-            ).order_by(
-                func.sum(Submission.points_earned).desc()
-            ).all()
+            
+            def build_daily_query():
+                return db.session.query(
+                    DailyRollup.nickname,
+                    DailyRollup.points,
+                    DailyRollup.submission_count.label('completed_tasks'),
+                    rank_column(DailyRollup.points)
+                ).filter(
+                    DailyRollup.station_id == station_id,
+                    DailyRollup.day == today
+                ).order_by(
+                    *ranking_order(DailyRollup.points, DailyRollup.last_scored_at, DailyRollup.nickname)
+                )
             
             # 构建响应数据
-            daily_leaderboard = []
-            for idx, (name, points, submission_count) in enumerate(daily_participants):
-                daily_leaderboard.append({
-                    'nickname': name,
-                    'points': points,
-                    'completed_tasks': submission_count,
-                    'rank': idx + 1
-                })
-                
-            return jsonify(daily_leaderboard)
+            def to_entry(row):
+                return {
+                    'nickname': row.nickname,
+                    'points': row.points,
+                    'completed_tasks': row.completed_tasks,
+                    'rank': row.rank
+                }
+            compact_fields = ('nickname', 'points', 'completed_tasks') if compact else None
+            
+            cache_key = ('daily', today.isoformat(), limit, offset, compact)
+            return conditional_response(
+                [station_id],
+                lambda: ranked_leaderboard_response(station_id, cache_key, build_daily_query, to_entry,
+                                                    limit, offset, fan_nickname, compact_fields),
+                extra=today.isoformat()
+            )
             
         elif leaderboard_type == 'focus':
-            # 焦点榜 - 焦点任务积分
-            focus_participants = db.session.query(
-                Participant.name,
-                func.sum(Participant.points_earned).label('total_points'),
-                func.count(Participant.id).label('completed_task_count')
-            ).join(
-                Task, Task.id == Participant.task_id
-            ).filter(
-                Task.is_focus_task == True,
-                Task.station_id == station_id
-            ).group_by(
-                Participant.name
-            ).order_by(
-                func.sum(Participant.points_earned).desc()
-            ).all()
+            # 焦点榜 - 从站点排行榜汇总中读取焦点任务积分
+            def build_focus_query():
+                return db.session.query(
+                    StationStanding.nickname,
+                    StationStanding.focus_points.label('points'),
+                    StationStanding.focus_task_count.label('completed_tasks'),
+                    rank_column(StationStanding.focus_points)
+                ).filter(
+                    StationStanding.station_id == station_id,
+                    StationStanding.focus_task_count > 0
+                ).order_by(
+                    *ranking_order(StationStanding.focus_points, StationStanding.last_scored_at, StationStanding.nickname)
+                )
             
             # 构建响应数据
-            focus_leaderboard = []
-            for idx, (name, points, task_count) in enumerate(focus_participants):
-                focus_leaderboard.append({
-                    'nickname': name,
-                    'points': points,
-                    'completed_tasks': task_count,
-                    'rank': idx + 1,
+            def to_entry(row):
+                return {
+                    'nickname': row.nickname,
+                    'points': row.points,
+                    'completed_tasks': row.completed_tasks,
+                    'rank': row.rank,
                     'has_focus_task_completed': True
-                })
-                
-            return jsonify(focus_leaderboard)
+                }
+            compact_fields = ('nickname', 'points', 'completed_tasks') if compact else None
             
-        else:
-            # 总榜 - 所有任务总积分
-            overall_participants = db.session.query(
-                Participant.name,
-                func.sum(Participant.points_earned).label('total_points'),
-                func.count(Participant.id).label('completed_task_count')
-            ).join(
-                Task, Task.id == Participant.task_id
-            ).filter(
-                Task.station_id == station_id
-            ).group_by(
-                Participant.name
-            ).order_by(
-                func.sum(Participant.points_earned).desc()
-            ).all()
-            
-            # 查询已完成焦点任务的用户
-            focus_task_completers = db.session.query(
-                distinct(Participant.name)
-            ).join(
-                Task, Task.id == Participant.task_id
-            ).filter(
-                Task.is_focus_task == True,
-                Task.station_id == station_id,
-                Participant.submission_count > 0
-            ).all()
-            
-            focus_completers = set([name[0] for name in focus_task_completers])
+            cache_key = ('focus', limit, offset, compact)
+            return conditional_response(
+                [station_id],
+                lambda: ranked_leaderboard_response(station_id, cache_key, build_focus_query, to_entry,
+                                                    limit, offset, fan_nickname, compact_fields)
+            )
             
+        else:
+            # 总榜 - 从站点排行榜汇总中读取所有任务总积分
             # 构建响应数据
-            overall_leaderboard = []
-            for idx, (name, points, task_count) in enumerate(overall_participants):
-                overall_leaderboard.append({
-                    'nickname': name,
-                    'points': points,
-                    'completed_tasks': task_count,
-                    'rank': idx + 1,
-                    'has_focus_task_completed': name in focus_completers
-                })
-                
-            return jsonify(overall_leaderboard)
+            def to_entry(row):
+                return {
+                    'nickname': row.nickname,
+                    'points': row.points,
+                    'completed_tasks': row.completed_tasks,
+                    'rank': row.rank,
+                    'has_focus_task_completed': bool(row.has_focus_task_completed)
+                }
+            compact_fields = ('nickname', 'points', 'completed_tasks', 'has_focus_task_completed') if compact else None
+            
+            cache_key = ('overall', limit, offset, compact)
+            return conditional_response(
+                [station_id],
+                lambda: ranked_leaderboard_response(station_id, cache_key, lambda: overall_standings_query(station_id),
+                                                    to_entry, limit, offset, fan_nickname, compact_fields)
+            )
                 
     except Exception as e:
         print(f"获取排行榜失败: {str(e)}")
@@ -1742,6 +2986,46 @@ def get_fan_leaderboard():
         traceback.print_exc()
         return jsonify({'error': f'获取排行榜失败: {str(e)}'}), 500
 
+# 排行榜实时推送（SSE）
+@app.route('/api/fan/leaderboard/stream', methods=['GET'])
+def stream_fan_leaderboard():
+    """订阅站点或任务排行榜的实时变化
+    
+    不带task_id时订阅站点总榜变化，带task_id时订阅该任务排行榜变化。
+    每条消息为 event: rank，data 为变化粉丝的最新积分与排名。
+    """
+    invite_code = request.args.get('invite_code')
+    task_id = request.args.get('task_id')
+    
+    if not invite_code:
+        return jsonify({'error': '缺少必要参数：邀请码'}), 400
+    
+    # 验证邀请码
+    invite_code_obj = resolve_invite_code(invite_code)
+    if not invite_code_obj:
+        return jsonify({'error': '无效的邀请码'}), 403
+    
+    if task_id:
+        task = Task.query.get(task_id)
+        if not task:
+            return jsonify({'error': '任务不存在'}), 404
+        if task.station_id != invite_code_obj.station_id:
+            return jsonify({'error': '无权访问此任务排行榜'}), 403
+        channel = f"task:{task_id}"
+    else:
+        channel = f"station:{invite_code_obj.station_id}"
+    
+    # 订阅后不再访问数据库，流式响应期间不占用数据库会话
+    subscriber = leaderboard_hub.subscribe(channel)
+    return Response(
+        leaderboard_hub.stream(channel, subscriber, heartbeat=app.config['LIVE_PUSH_HEARTBEAT']),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
 # 测试用的API路由
 @app.route('/api/fan/tasks/test-task-id/submit', methods=['POST'])
 def test_upload():
@@ -1849,6 +3133,8 @@ def station_get_task_submissions(current_user_id, task_id):
     for participant in participants:
         submissions = Submission.query.filter_by(participant_id=participant.id).all()
         for submission in submissions:
+            # 列表只返回缩略图地址，原图在详情中查看
+            first_image = submission_image_variants(submission) or {}
             submissions_data.append({
                 'id': submission.id,
                 'participant_id': participant.id,
@@ -1857,7 +3143,10 @@ def station_get_task_submissions(current_user_id, task_id):
                 'points_earned': submission.points_earned,
                 'is_abnormal': submission.is_abnormal,
                 'abnormal_reason': submission.abnormal_reason if submission.is_abnormal else None,
-                'image_preview': submission.image_urls[0] if submission.image_urls else None,
+                'image_preview': first_image.get('preview'),
+                'image_thumbnail': first_image.get('thumbnail'),
+                'image_original': first_image.get('original'),
+                'image_status': submission.image_status or 'ready',
                 'submission_count': len(submission.image_urls) if submission.image_urls else 0
             })
     
@@ -1925,7 +3214,9 @@ def station_get_submission_detail(current_user_id, submission_id):
         'abnormal_reason': submission.abnormal_reason,
         'marked_at': submission.marked_at.isoformat() if submission.marked_at else None,
         'marked_by': marker_info,
-        'image_urls': submission.image_urls
+        'image_urls': submission.image_urls,
+        'image_thumbnails': submission.image_thumbnails or [],
+        'image_status': submission.image_status or 'ready'
     }
     
     return jsonify(submission_detail), 200
@@ -1982,15 +3273,36 @@ def station_mark_abnormal_submission(current_user_id, submission_id):
         # 如果有积分则扣除
         if points_to_deduct > 0:
             # 从参与者总积分中扣除
+            previous_points = participant.points_earned
             participant.points_earned = max(0, participant.points_earned - points_to_deduct)
             participant.total_points_for_task = max(0, participant.total_points_for_task - points_to_deduct)
+            participant.last_scored_at = submission.marked_at
             
             # 将提交的积分设为0
             submission.points_earned = 0
+            
+            # 在同一事务中同步扣减站点排行榜汇总
+            apply_standing_delta(
+                task.station_id,
+                participant.name,
+                points_delta=participant.points_earned - previous_points,
+                is_focus_task=task.is_focus_task
+            )
+            
+            # 从提交当日的每日排行榜汇总中扣除
+            apply_daily_rollup_delta(
+                task.station_id,
+                submission.submitted_at.date(),
+                participant.name,
+                points_delta=-points_to_deduct
+            )
         
         # 保存更改
         db.session.commit()
         
+        # 标记已保存，之后的缓存同步和推送失败不影响响应
+        sync_rankings_after_commit(task, participant, -points_to_deduct)
+        
         return jsonify({
             'message': '已成功标记为异常提交',
             'points_deducted': points_to_deduct,
@@ -2017,8 +3329,14 @@ def station_mark_abnormal_submission(current_user_id, submission_id):
 # 添加静态文件服务路由
 @app.route('/uploads/<path:filename>')
 def serve_upload(filename):
-    """提供上传文件的访问"""
-    return send_from_directory('uploads', filename)
+    """提供上传文件的访问
+    
+    暂存中的图片和尚未迁移的旧文件仍按原路径保存在上传目录中，其余文件由存储后端提供。
+    """
+    legacy_path = safe_join(app.config['UPLOAD_FOLDER'], filename)
+    if legacy_path and os.path.isfile(legacy_path):
+        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    return upload_storage.send(filename)
 
 # 上传鼓励图片
 @app.route('/api/admin/upload-encouragement-image', methods=['POST'])
@@ -2035,10 +3353,6 @@ def upload_encouragement_image(current_user_id):
             return jsonify({'error': '未选择文件'}), 400
             
         if file and allowed_file(file.filename):
-            # 创建上传目录
-            upload_folder = os.path.join('uploads', 'encouragement')
-            os.makedirs(upload_folder, exist_ok=True)
-            
             # 生成安全的文件名
             filename = secure_filename(file.filename)
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -2046,17 +3360,14 @@ def upload_encouragement_image(current_user_id):
             
             # 格式：日期_时间_随机ID_原文件名
             new_filename = f"{timestamp}_{unique_id}_{filename}"
-            file_path = os.path.join(upload_folder, new_filename)
-            
-            # 保存文件
-            file.save(file_path)
+            key = f"encouragement/{new_filename}"
             
-            # 返回相对路径
-            relative_path = os.path.join('uploads', 'encouragement', new_filename).replace('\\', '/')
+            # 保存到存储后端
+            upload_storage.save_stream(key, file.stream)
             
             return jsonify({
                 'success': True,
-                'image_url': f'/{relative_path}'
+                'image_url': f'/{upload_url(key)}'
             })
         else:
             return jsonify({'error': '不支持的文件类型'}), 400
@@ -2090,8 +3401,9 @@ def update_global_encouragement_settings(current_user_id):
         global_settings.default_encouragement_message = data.get('default_encouragement_message', '')
         global_settings.default_encouragement_image_url = data.get('default_encouragement_image_url')
         
-        # 提交到数据库
+        # 提交到数据库，并刷新进程内的全局设置缓存
         db.session.commit()
+        refresh_global_settings()
         
         return jsonify({
             'success': True,
@@ -2257,7 +3569,16 @@ def station_settle_task(current_user_id, task_id):
         # 更新任务状态为已完成
         task.status = 'completed'
         task.completed_at = datetime.utcnow()
+        
+        # 在同一事务中冻结最终排名，并清除指向该任务的邀请码焦点指针
+        freeze_task_ranking(task)
+        sync_focus_pointer(task)
         db.session.commit()
+        ranking_engine.invalidate(task.id)
+        bump_cache_versions(task.station_id)
+        if task.is_focus_task:
+            invite_code_cache.invalidate()
+        leaderboard_hub.publish(f"task:{task.id}", 'settled', {'task_id': task.id})
         
         # 获取参与人数
         participant_count = Participant.query.filter_by(task_id=task.id).count()
@@ -2282,6 +3603,7 @@ def station_get_rankings(current_user_id):
     invite_code = request.args.get('invite_code')
     start_date = request.args.get('startDate')
     end_date = request.args.get('endDate')
+    limit, offset = get_page_args()
     
     if not invite_code:
         return jsonify({
@@ -2315,44 +3637,47 @@ def station_get_rankings(current_user_id):
         if ranking_type == 'custom_range' and start_date and end_date:
             # 自定义日期范围排行榜
             try:
-                start_datetime = datetime.strptime(start_date, '%Y-%m-%d')
-                end_datetime = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1) # 包含结束日期
-                
-                # 获取日期范围内的参与数据
-                rankings = db.session.query(
-                    Participant.name.label('nickname'),
-                    func.sum(Participant.points_earned).label('score'),
-                    func.count(distinct(Participant.id)).label('completed_tasks')
-                ).join(
-                    Submission, Submission.participant_id == Participant.id
-                ).join(
-                    Task, Task.id == Participant.task_id
-                ).filter(
-                    Task.station_id == station_id,
-                    Submission.submitted_at >= start_datetime,
-                    Submission.submitted_at < end_datetime
-                ).group_by(
-                    Participant.name
-                ).order_by(
-                    func.sum(Participant.points_earned).desc()
-                ).all()
+                start_day = datetime.strptime(start_date, '%Y-%m-%d').date()
+                end_day = datetime.strptime(end_date, '%Y-%m-%d').date()  # 包含结束日期
                 
-                # 构建排行榜数据
-                leaderboard_data = []
-                for rank, (nickname, score, completed_tasks) in enumerate(rankings, 1):
-                    leaderboard_data.append({
-                        'rank': rank,
-                        'nickname': nickname,
-                        'score': score,
-                        'completed_tasks': completed_tasks
-                    })
+                def build_range_rankings():
+                    # 汇总日期范围内的每日排行榜数据，排名由窗口函数计算
+                    score = func.sum(DailyRollup.points)
+                    rankings = fetch_ranked_page(db.session.query(
+                        DailyRollup.nickname,
+                        score.label('score'),
+                        func.sum(DailyRollup.submission_count).label('completed_tasks'),
+                        rank_column(score)
+                    ).filter(
+                        DailyRollup.station_id == station_id,
+                        DailyRollup.day >= start_day,
+                        DailyRollup.day <= end_day
+                    ).group_by(
+                        DailyRollup.nickname
+                    ).order_by(
+                        *ranking_order(score, func.max(DailyRollup.last_scored_at), DailyRollup.nickname)
+                    ), limit, offset)
+                    
+                    # 构建排行榜数据
+                    leaderboard_data = []
+                    for nickname, score, completed_tasks, rank in rankings:
+                        leaderboard_data.append({
+                            'rank': rank,
+                            'nickname': nickname,
+                            'score': score,
+                            'completed_tasks': completed_tasks
+                        })
+                    
+                    # 构建响应
+                    return {
+                        "success": True,
+                        "data": leaderboard_data,
+                        "leaderboard_title": f"{start_date} 至 {end_date} 排行榜"
+                    }
                 
-                # 构建响应
-                return jsonify({
-                    "success": True,
-                    "data": leaderboard_data,
-                    "leaderboard_title": f"{start_date} 至 {end_date} 排行榜"
-                })
+                cache_key = ('custom_range', start_day.isoformat(), end_day.isoformat(), limit, offset)
+                payload = get_cached_leaderboard(station_id, cache_key, build_range_rankings)
+                return json_payload_response(payload)
                 
             except ValueError as e:
                 return jsonify({
@@ -2377,7 +3702,9 @@ def station_get_rankings(current_user_id):
 @app.route('/api/station/tasks/<string:task_id>/ranking', methods=['GET'])
 @station_admin_required
 def station_get_task_ranking(current_user_id, task_id):
-    """获取指定任务的排行榜"""
+    """获取指定任务的排行榜，支持 limit/offset 分页"""
+    limit, offset = get_page_args()
+    
     # 获取任务
     task = Task.query.filter_by(id=task_id).first()
     if not task:
@@ -2397,33 +3724,48 @@ def station_get_task_ranking(current_user_id, task_id):
         }), 403
     
     try:
-        # 获取任务的参与者排行榜
-        rankings = db.session.query(
-            Participant.name.label('nickname'),
-            Participant.points_earned.label('score'),
-            Participant.submission_count.label('completed_tasks')
-        ).filter(
-            Participant.task_id == task_id
-        ).order_by(
-            Participant.points_earned.desc()
-        ).all()
-        
-        # 构建排行榜数据
-        leaderboard_data = []
-        for rank, (nickname, score, completed_tasks) in enumerate(rankings, 1):
-            leaderboard_data.append({
-                'rank': rank,
-                'nickname': nickname,
-                'score': score,
-                'completed_tasks': completed_tasks
-            })
+        def build_task_rankings():
+            if task.status == 'completed':
+                # 已结算任务直接读取结算时冻结的排名
+                board = get_task_board(task_id, task.station_id)
+                end = len(board) if limit is None else offset + limit
+                rankings = [
+                    (nickname, score, completed_tasks, rank)
+                    for rank, nickname, score, completed_tasks in board.slice(offset, end)
+                ]
+            else:
+                # 获取任务的参与者排行榜，排名由窗口函数计算
+                rankings = fetch_ranked_page(db.session.query(
+                    Participant.name.label('nickname'),
+                    Participant.points_earned.label('score'),
+                    Participant.submission_count.label('completed_tasks'),
+                    rank_column(Participant.points_earned)
+                ).filter(
+                    Participant.task_id == task_id
+                ).order_by(
+                    *ranking_order(Participant.points_earned, Participant.last_scored_at, Participant.name)
+                ), limit, offset)
+            
+            # 构建排行榜数据
+            leaderboard_data = []
+            for nickname, score, completed_tasks, rank in rankings:
+                leaderboard_data.append({
+                    'rank': rank,
+                    'nickname': nickname,
+                    'score': score,
+                    'completed_tasks': completed_tasks
+                })
+            
+            # 构建响应
+            return {
+                "success": True,
+                "data": leaderboard_data,
+                "leaderboard_title": f"{task.title} 活动排行榜"
+            }
         
-        # 构建响应
-        return jsonify({
-            "success": True,
-            "data": leaderboard_data,
-            "leaderboard_title": f"{task.title} 活动排行榜"
-        })
+        cache_key = ('station_task', task_id, limit, offset)
+        payload = get_cached_leaderboard(task.station_id, cache_key, build_task_rankings)
+        return json_payload_response(payload)
         
     except Exception as e:
         import traceback
@@ -2449,6 +3791,22 @@ def station_generate_word_report(current_user_id):
             "details": str(e)
         }), 500
 
+# 站子端获取缓存与运行指标
+@app.route('/api/station/metrics', methods=['GET'])
+@station_admin_required
+def station_get_metrics(current_user_id):
+    """获取排行榜缓存、邀请码缓存命中率等运行指标"""
+    return jsonify({
+        'leaderboard_cache': leaderboard_cache.stats(),
+        'request_coalescing': request_coalescer.stats(),
+        'invite_code_cache': invite_code_cache.stats(),
+        'compression': response_compressor.stats(),
+        'image_workers': image_workers.stats(),
+        'upload_store': upload_store_stats(),
+        'upload_storage': upload_storage.stats(),
+        'live_push': leaderboard_hub.stats()
+    }), 200
+
 # 管理员端反馈提交接口
 @app.route('/api/feedback', methods=['POST'])
 @station_admin_required
@@ -2640,5 +3998,150 @@ def admin_get_feedback_detail(current_user_id, feedback_id):
         print(f"获取反馈详情异常: {str(e)}")
         return jsonify({'error': '获取反馈详情时发生错误，请稍后重试'}), 500
 
+# 为已有数据表补充新增列
+def ensure_column(table_name, column_name, column_type):
+    """db.create_all() 不会修改已存在的表，缺少列时通过 ALTER TABLE 补充，返回是否新增"""
+    columns = [row[1] for row in db.session.execute(db.text(f"PRAGMA table_info({table_name})"))]
+    if column_name in columns:
+        return False
+    db.session.execute(db.text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}"))
+    print(f"数据表新增列 - {table_name}.{column_name}")
+    return True
+
+# 迁移上传文件到当前存储后端
+@app.cli.command('migrate-uploads')
+@click.option('--dry-run', is_flag=True, help='只统计需要迁移的文件数，不移动文件')
+@click.option('--keep-local', is_flag=True, help='保留上传目录中的原文件（复制而不是移动）')
+def migrate_uploads_command(dry_run, keep_local):
+    """将上传目录中的旧文件迁移到当前存储后端（分片目录或S3），上传地址保持不变
+    
+    用法：flask --app app_db migrate-uploads [--dry-run] [--keep-local]
+    """
+    migrated, skipped = migrate_local_uploads(
+        app.config['UPLOAD_FOLDER'],
+        upload_storage,
+        keep_local=keep_local,
+        dry_run=dry_run
+    )
+    action = '需要迁移' if dry_run else '已迁移'
+    print(f"上传文件迁移 - 存储后端: {upload_storage.backend}, {action}: {migrated}, 已在目标位置: {skipped}")
+
+# 重新处理未完成的提交图片
+@app.cli.command('requeue-images')
+def requeue_images_command():
+    """将仍为pending的提交图片重新交给处理池（不检查启动租约）
+    
+    用法：flask --app app_db requeue-images
+    """
+    requeued_count = requeue_pending_submission_images()
+    image_workers.shutdown()
+    print(f"重新处理未完成的提交图片: {requeued_count}条")
+
+# 多进程启动时只执行一次的任务
+def claim_startup_lease(name, interval):
+    """以共享版本号表中的 lock:<name> 行作为租约，interval秒内只有一个进程能取得，返回是否取得
+    
+    SQLite串行执行写操作，带条件的UPDATE只会有一个进程更新成功。
+    """
+    scope = f"lock:{name}"
+    now = datetime.utcnow()
+    db.session.execute(sqlite_insert(CacheVersion).values(
+        scope=scope,
+        version=0,
+        updated_at=datetime(1970, 1, 1)
+    ).on_conflict_do_nothing(index_elements=['scope']))
+    claimed = CacheVersion.query.filter(
+        CacheVersion.scope == scope,
+        CacheVersion.updated_at < now - timedelta(seconds=interval)
+    ).update({'version': CacheVersion.version + 1, 'updated_at': now}, synchronize_session=False)
+    db.session.commit()
+    return claimed == 1
+
+# 初始化数据库表并回填排行榜汇总
+def init_database():
+    """创建缺失的数据表，补充新增列，为已有数据回填排行榜汇总，并预加载全局设置"""
+    db.create_all()
+    
+    # 同分排序所需的达到积分时间
+    participant_column_added = ensure_column('participants', 'last_scored_at', 'DATETIME')
+    standing_column_added = ensure_column('station_standings', 'last_scored_at', 'DATETIME')
+    rollup_column_added = ensure_column('daily_rollups', 'last_scored_at', 'DATETIME')
+    if participant_column_added:
+        # 以最后一次得分的提交时间作为达到当前积分的时间
+        db.session.execute(db.text(
+            "UPDATE participants SET last_scored_at = ("
+            "SELECT MAX(submitted_at) FROM submissions "
+            "WHERE submissions.participant_id = participants.id AND submissions.points_earned > 0"
+            ") WHERE last_scored_at IS NULL"
+        ))
+    
+    # 增量同步所需的更新时间
+    if ensure_column('tasks', 'updated_at', 'DATETIME'):
+        db.session.execute(db.text(
+            "UPDATE tasks SET updated_at = COALESCE(completed_at, created_at) WHERE updated_at IS NULL"
+        ))
+    if ensure_column('participants', 'updated_at', 'DATETIME'):
+        db.session.execute(db.text(
+            "UPDATE participants SET updated_at = COALESCE(last_scored_at, joined_at) WHERE updated_at IS NULL"
+        ))
+    
+    # 邀请码上的焦点任务指针和冷却截止时间
+    if ensure_column('invite_codes', 'focus_task_id', 'VARCHAR(36)'):
+        db.session.execute(db.text(
+            "UPDATE invite_codes SET focus_task_id = ("
+            "SELECT id FROM tasks WHERE tasks.invite_code_id = invite_codes.id "
+            "AND tasks.is_focus_task = 1 AND tasks.status = 'active' "
+            "ORDER BY tasks.created_at DESC LIMIT 1)"
+        ))
+    if ensure_column('invite_codes', 'focus_cooldown_until', 'DATETIME'):
+        db.session.execute(db.text(
+            "UPDATE invite_codes SET focus_cooldown_until = datetime(last_focus_change, '+24 hours') "
+            "WHERE last_focus_change IS NOT NULL"
+        ))
+    
+    # 提交图片的后台处理状态，已有提交均已处理完成
+    if ensure_column('submissions', 'image_status', 'VARCHAR(20)'):
+        db.session.execute(db.text("UPDATE submissions SET image_status = 'ready' WHERE image_status IS NULL"))
+    ensure_column('submissions', 'image_thumbnails', 'JSON')
+    db.session.commit()
+    
+    # 参与记录 (task_id, name) 唯一索引：旧数据库建立索引前先合并历史重复记录
+    participants_merged = 0
+    unique_index_exists = db.session.execute(db.text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'ux_participants_task_name'"
+    )).first() is not None
+    if not unique_index_exists:
+        participants_merged = merge_duplicate_participants()
+        db.session.commit()
+    
+    # 为已有数据表补充模型中新增的索引
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    
+    if standing_column_added or participants_merged or (StationStanding.query.first() is None and Participant.query.first() is not None):
+        station_ids = [row[0] for row in db.session.query(distinct(Task.station_id)).all()]
+        for station_id in station_ids:
+            rebuild_station_standings(station_id)
+        db.session.commit()
+    
+    if rollup_column_added or (DailyRollup.query.first() is None and Submission.query.first() is not None):
+        station_ids = [row[0] for row in db.session.query(distinct(Task.station_id)).all()]
+        for station_id in station_ids:
+            rebuild_daily_rollups(station_id)
+        db.session.commit()
+    
+    # 重新处理上次运行时未完成的提交图片；每个进程启动时都会执行这里，只由取得租约的一个进程重新排队
+    if claim_startup_lease('image_requeue', app.config['IMAGE_REQUEUE_INTERVAL']):
+        requeued_count = requeue_pending_submission_images()
+        if requeued_count:
+            print(f"重新处理未完成的提交图片: {requeued_count}条")
+    
+    # 预加载全局设置
+    get_global_settings()
+
+with app.app_context():
+    init_database()
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True) 
@@ -0,0 +1,199 @@
+"""排行榜性能基准测试
+
+对 synthetic_data.py 生成的数据库，依次请求各类排行榜接口并统计耗时分位数。
+cold 模式在每次请求前清空进程内缓存，用于衡量查询本身的开销；
+warm 模式保留缓存，用于衡量稳定状态下的读取开销。
+
+用法：
+    python benchmarks/run_benchmarks.py --db /tmp/weini_bench.db
+    python benchmarks/run_benchmarks.py --db /tmp/weini_bench.db --save-baseline /tmp/leaderboard_baseline.json
+    python benchmarks/run_benchmarks.py --db /tmp/weini_bench.db --baseline /tmp/leaderboard_baseline.json --max-regression 0.2
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_data import BENCH_ADMIN_EMAIL, BENCH_INVITE_CODE, load_app
+
+
+def percentile(sorted_values, fraction):
+    """最近秩法计算分位数"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def build_context(app_db):
+    """定位基准站点，选出最热门的任务和一个中游粉丝"""
+    from models import db, User, InviteCode, Participant
+    import jwt
+
+    with app_db.app.app_context():
+        invite_code = InviteCode.query.filter_by(code=BENCH_INVITE_CODE).first()
+        admin = User.query.filter_by(email=BENCH_ADMIN_EMAIL).first()
+        if not invite_code or not admin:
+            raise SystemExit('未找到基准数据，请先运行 synthetic_data.py')
+
+        busiest_task_id, participant_count = db.session.query(
+            Participant.task_id,
+            db.func.count(Participant.id)
+        ).group_by(
+            Participant.task_id
+        ).order_by(
+            db.func.count(Participant.id).desc()
+        ).first()
+
+        middle_fan = db.session.query(Participant.name).filter(
+            Participant.task_id == busiest_task_id
+        ).order_by(
+            Participant.points_earned.desc()
+        ).offset(participant_count // 2).limit(1).scalar()
+
+        station_id = invite_code.station_id
+        admin_id, admin_email = admin.id, admin.email
+
+    now = datetime.now(timezone.utc)
+    token = jwt.encode({
+        'user_id': admin_id,
+        'email': admin_email,
+        'role': 'station_admin',
+        'exp': (now + timedelta(hours=1)).timestamp(),
+        'iat': now.timestamp()
+    }, app_db.app.config['SECRET_KEY'], algorithm='HS256')
+
+    today = datetime.now().date()
+    return {
+        'station_id': station_id,
+        'task_id': busiest_task_id,
+        'nickname': middle_fan,
+        'headers': {'Authorization': f'Bearer {token}'},
+        'range_start': (today - timedelta(days=29)).isoformat(),
+        'range_end': today.isoformat()
+    }
+
+
+def benchmark_cases(ctx):
+    """返回 (名称, URL, 是否需要站子管理员token) 列表"""
+    code = BENCH_INVITE_CODE
+    task_id = ctx['task_id']
+    return [
+        ('fan_overall', f'/api/fan/leaderboard?invite_code={code}&type=overall', False),
+        ('fan_daily', f'/api/fan/leaderboard?invite_code={code}&type=daily', False),
+        ('fan_focus', f'/api/fan/leaderboard?invite_code={code}&type=focus', False),
+        ('task_full', f'/api/fan/leaderboard/{task_id}?invite_code={code}&fan_nickname={ctx["nickname"]}', False),
+        ('task_top50', f'/api/fan/leaderboard/{task_id}?invite_code={code}&top=50', False),
+        ('task_around', f'/api/fan/leaderboard/{task_id}?invite_code={code}&fan_nickname={ctx["nickname"]}'
+                        f'&around={ctx["nickname"]}&radius=10', False),
+        ('station_custom_range', f'/api/station/rankings?type=custom_range&invite_code={code}'
+                                 f'&startDate={ctx["range_start"]}&endDate={ctx["range_end"]}', True),
+        ('station_task_ranking', f'/api/station/tasks/{task_id}/ranking', True),
+    ]
+
+
+def reset_caches(app_db, station_id):
+    """清空进程内缓存，使下一次请求重新执行查询"""
+    with app_db.app.app_context():
+        app_db.leaderboard_cache.bump(station_id)
+    app_db.ranking_engine.invalidate()
+    app_db.invite_code_cache.invalidate()
+    app_db.settings_cache.invalidate()
+
+
+def run_case(app_db, client, url, headers, iterations, warmup, cold, station_id):
+    """重复请求同一接口并返回耗时统计（毫秒）"""
+    for _ in range(warmup):
+        client.get(url, headers=headers)
+
+    timings = []
+    for _ in range(iterations):
+        if cold:
+            reset_caches(app_db, station_id)
+        started = time.perf_counter()
+        response = client.get(url, headers=headers)
+        elapsed = (time.perf_counter() - started) * 1000
+        if response.status_code != 200:
+            raise SystemExit(f'请求失败 {response.status_code}: {url}\n{response.get_data(as_text=True)[:500]}')
+        timings.append(elapsed)
+
+    timings.sort()
+    return {
+        'p50': round(percentile(timings, 0.50), 3),
+        'p99': round(percentile(timings, 0.99), 3),
+        'mean': round(sum(timings) / len(timings), 3),
+        'max': round(timings[-1], 3),
+        'bytes': len(response.get_data())
+    }
+
+
+def compare(results, baseline, max_regression):
+    """与基线对比p50，返回是否存在超过阈值的退化"""
+    regressed = False
+    print(f"\n{'用例':<36}{'基线p50':>12}{'当前p50':>12}{'变化':>10}")
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if not base:
+            print(f"{name:<36}{'-':>12}{stats['p50']:>12.3f}{'新增':>10}")
+            continue
+        change = (stats['p50'] - base['p50']) / base['p50'] if base['p50'] else 0.0
+        flag = ''
+        if max_regression is not None and change > max_regression:
+            regressed = True
+            flag = ' !'
+        print(f"{name:<36}{base['p50']:>12.3f}{stats['p50']:>12.3f}{change:>+9.1%}{flag}")
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='排行榜接口性能基准测试')
+    parser.add_argument('--db', required=True, help='synthetic_data.py 生成的数据库路径')
+    parser.add_argument('--iterations', type=int, default=30, help='每个用例的计时请求次数')
+    parser.add_argument('--warmup', type=int, default=3, help='每个用例的预热请求次数')
+    parser.add_argument('--mode', choices=['cold', 'warm', 'both'], default='both', help='缓存模式')
+    parser.add_argument('--only', help='只运行名称包含该字符串的用例')
+    parser.add_argument('--save-baseline', help='将结果保存为基线JSON文件')
+    parser.add_argument('--baseline', help='与指定的基线JSON文件对比')
+    parser.add_argument('--max-regression', type=float, help='p50允许的最大退化比例，超过时以非零状态退出')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        parser.error(f'数据库文件不存在: {args.db}')
+
+    app_db = load_app(args.db)
+    app_db.limiter.enabled = False
+    ctx = build_context(app_db)
+    client = app_db.app.test_client()
+
+    modes = ['cold', 'warm'] if args.mode == 'both' else [args.mode]
+    results = {}
+    print(f"{'用例':<36}{'p50(ms)':>10}{'p99(ms)':>10}{'mean(ms)':>10}{'bytes':>12}")
+    for name, url, needs_auth in benchmark_cases(ctx):
+        if args.only and args.only not in name:
+            continue
+        headers = ctx['headers'] if needs_auth else {}
+        for mode in modes:
+            stats = run_case(app_db, client, url, headers, args.iterations, args.warmup,
+                             mode == 'cold', ctx['station_id'])
+            key = f'{name}/{mode}'
+            results[key] = stats
+            print(f"{key:<36}{stats['p50']:>10.3f}{stats['p99']:>10.3f}{stats['mean']:>10.3f}{stats['bytes']:>12}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2, sort_keys=True)
+        print(f"\n基线已保存: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""合成站点数据生成器
+
+按固定随机种子生成包含 Station/Task/Participant/Submission 的SQLite数据库，
+供排行榜基准测试使用。粉丝活跃度和任务热度按长尾分布抽样，接近真实站点。
+
+用法：
+    python benchmarks/synthetic_data.py --db /tmp/weini_bench.db
+    python benchmarks/synthetic_data.py --db /tmp/weini_bench.db --tasks 50 --fans 20000 --submissions 200000 --force
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 生成数据中的固定标识，基准测试据此定位站点
+BENCH_ADMIN_EMAIL = 'bench-admin@weini.local'
+BENCH_INVITE_CODE = 'BENCH001'
+
+INSERT_CHUNK_SIZE = 10000
+
+
+def load_app(db_path):
+    """指定数据库路径后导入后端应用"""
+    os.environ['DATABASE_PATH'] = os.path.abspath(db_path)
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    import app_db
+    return app_db
+
+
+def seeded_uuid(rng):
+    """由随机数生成器产生可复现的UUID字符串"""
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def long_tail_weights(count, exponent):
+    """生成长尾分布的累计权重，排在前面的元素被抽中的概率更高"""
+    cumulative = []
+    total = 0.0
+    for index in range(count):
+        total += 1.0 / (index + 1) ** exponent
+        cumulative.append(total)
+    return cumulative
+
+
+def insert_in_chunks(db, table, rows):
+    """分批插入，避免单条语句过大"""
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        db.session.execute(table.insert(), rows[start:start + INSERT_CHUNK_SIZE])
+
+
+def generate(db_path, tasks=50, fans=20000, submissions=200000, days=30, focus_tasks=1, seed=42):
+    """生成合成数据并回填排行榜汇总表，返回各表行数"""
+    app_db = load_app(db_path)
+    from models import db, User, Station, InviteCode, Task, Participant, Submission
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    started = time.perf_counter()
+
+    with app_db.app.app_context():
+        user_id = seeded_uuid(rng)
+        station_id = seeded_uuid(rng)
+        invite_code_id = seeded_uuid(rng)
+
+        db.session.execute(User.__table__.insert(), [{
+            'id': user_id,
+            'email': BENCH_ADMIN_EMAIL,
+            'password_hash': 'benchmark',
+            'role': 'station_admin',
+            'username': 'bench',
+            'status': 'active',
+            'created_at': now
+        }])
+        db.session.execute(Station.__table__.insert(), [{
+            'id': station_id,
+            'name': '基准测试站点',
+            'owner_id': user_id,
+            'status': 'active',
+            'created_at': now,
+            'updated_at': now
+        }])
+        db.session.execute(InviteCode.__table__.insert(), [{
+            'id': invite_code_id,
+            'code': BENCH_INVITE_CODE,
+            'station_id': station_id,
+            'description': '基准测试邀请码',
+            'status': 'active',
+            'usage_limit': 'unlimited',
+            'is_focus_enabled': True,
+            'created_at': now
+        }])
+
+        # 任务
+        task_rows = []
+        for index in range(tasks):
+            task_rows.append({
+                'id': seeded_uuid(rng),
+                'station_id': station_id,
+                'invite_code_id': invite_code_id,
+                'title': f'基准任务 {index + 1}',
+                'description': '合成数据',
+                'points': rng.choice([5, 10, 20]),
+                'status': 'active',
+                'is_focus_task': index < focus_tasks,
+                'time_limit_mode': False,
+                'flame_mode_enabled': True,
+                'bonus_points': 0,
+                'created_at': now - timedelta(days=days)
+            })
+        insert_in_chunks(db, Task.__table__, task_rows)
+
+        # 按长尾分布抽样提交：热门任务和活跃粉丝占大多数提交
+        task_choices = rng.choices(range(tasks), cum_weights=long_tail_weights(tasks, 0.6), k=submissions)
+        fan_choices = rng.choices(range(fans), cum_weights=long_tail_weights(fans, 0.8), k=submissions)
+
+        participants = {}
+        submission_rows = []
+        window_seconds = days * 24 * 3600
+        for task_index, fan_index in zip(task_choices, fan_choices):
+            task = task_rows[task_index]
+            key = (task_index, fan_index)
+            participant = participants.get(key)
+            if participant is None:
+                participant = {
+                    'id': seeded_uuid(rng),
+                    'task_id': task['id'],
+                    'name': f'fan{fan_index:06d}',
+                    'joined_at': now,
+                    'submission_count': 0,
+                    'points_earned': 0,
+                    'total_points_for_task': 0
+                }
+                participants[key] = participant
+
+            points = task['points'] * 2 if task['is_focus_task'] else task['points']
+            submitted_at = now - timedelta(seconds=rng.randrange(window_seconds))
+            participant['submission_count'] += 1
+            participant['points_earned'] += points
+            participant['total_points_for_task'] += points
+            participant['joined_at'] = min(participant['joined_at'], submitted_at)
+
+            submission_rows.append({
+                'id': seeded_uuid(rng),
+                'participant_id': participant['id'],
+                'submitted_at': submitted_at,
+                'points_earned': points,
+                'comment': '',
+                'is_abnormal': False,
+                'image_urls': []
+            })
+
+        insert_in_chunks(db, Participant.__table__, list(participants.values()))
+        insert_in_chunks(db, Submission.__table__, submission_rows)
+        db.session.commit()
+
+        # 回填排行榜汇总表
+        app_db.rebuild_station_standings(station_id)
+        app_db.rebuild_daily_rollups(station_id)
+        db.session.commit()
+
+    counts = {
+        'tasks': len(task_rows),
+        'participants': len(participants),
+        'submissions': len(submission_rows),
+        'seconds': round(time.perf_counter() - started, 2)
+    }
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='生成排行榜基准测试用的合成站点数据库')
+    parser.add_argument('--db', required=True, help='输出的SQLite数据库路径')
+    parser.add_argument('--tasks', type=int, default=50, help='任务数')
+    parser.add_argument('--fans', type=int, default=20000, help='粉丝昵称数')
+    parser.add_argument('--submissions', type=int, default=200000, help='提交记录数')
+    parser.add_argument('--days', type=int, default=30, help='提交时间分布的天数（截止到今天）')
+    parser.add_argument('--focus-tasks', type=int, default=1, help='焦点任务数')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    parser.add_argument('--force', action='store_true', help='覆盖已存在的数据库文件')
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.db):
+        if not args.force:
+            parser.error(f'数据库文件已存在: {args.db}（使用 --force 覆盖）')
+        os.remove(args.db)
+
+    counts = generate(
+        args.db,
+        tasks=args.tasks,
+        fans=args.fans,
+        submissions=args.submissions,
+        days=args.days,
+        focus_tasks=args.focus_tasks,
+        seed=args.seed
+    )
+    print(f"生成完成 - 任务: {counts['tasks']}, 参与记录: {counts['participants']}, "
+          f"提交: {counts['submissions']}, 耗时: {counts['seconds']}秒")
+
+
+if __name__ == '__main__':
+    main()
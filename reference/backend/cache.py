@@ -0,0 +1,242 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class VersionedResponseCache:
+    """按版本号失效的响应缓存
+
+    每个作用域（如站点ID）维护一个版本号，写操作提交后调用 bump() 使版本号加一，
+    读操作只返回与当前版本号一致的缓存内容，旧版本的条目会被自然淘汰。
+
+    提供 load_version(scope) -> (版本号, 修改时间戳或None) 和 bump_version(scope) 时，
+    版本号保存在进程外（如数据库），多进程部署时任一进程的写入对所有进程立即可见；
+    否则版本号只保存在本进程内。
+    """
+
+    def __init__(self, max_entries=2048, load_version=None, bump_version=None):
+        self.max_entries = max_entries
+        self.load_version = load_version
+        self.bump_version = bump_version
+        self.started_at = time.time()
+        self._versions = {}
+        self._modified = {}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def version(self, scope):
+        """获取作用域的当前版本号"""
+        if self.load_version is not None:
+            return self.load_version(scope)[0]
+        with self._lock:
+            return self._versions.get(scope, 0)
+
+    def bump(self, scope):
+        """使作用域下的所有缓存失效"""
+        if self.bump_version is not None:
+            self.bump_version(scope)
+            with self._lock:
+                self.invalidations += 1
+            return
+        with self._lock:
+            self._versions[scope] = self._versions.get(scope, 0) + 1
+            self._modified[scope] = time.time()
+            self.invalidations += 1
+
+    def last_modified(self, scope):
+        """作用域最后一次失效的时间戳
+
+        从未失效过时：共享版本号下为固定的 0（各进程一致），进程内版本号下为进程启动时间。
+        """
+        if self.load_version is not None:
+            modified = self.load_version(scope)[1]
+            return 0 if modified is None else modified
+        with self._lock:
+            return self._modified.get(scope, self.started_at)
+
+    def get(self, scope, key):
+        """读取当前版本的缓存内容，未命中返回None"""
+        current = self.version(scope)
+        with self._lock:
+            entry = self._entries.get((scope, key))
+            if entry is not None and entry[0] == current:
+                self._entries.move_to_end((scope, key))
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def set(self, scope, key, version, payload):
+        """写入缓存；若版本号在计算期间已变化则丢弃"""
+        current = self.version(scope)
+        with self._lock:
+            if version != current:
+                return
+            self._entries[(scope, key)] = (version, payload)
+            self._entries.move_to_end((scope, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_build(self, scope, key, builder):
+        """读取缓存，未命中时调用builder()生成并写入"""
+        # 先记录版本号再计算，避免把旧数据写入新版本
+        version = self.version(scope)
+        payload = self.get(scope, key)
+        if payload is None:
+            payload = builder()
+            self.set(scope, key, version, payload)
+        return payload
+
+    def stats(self):
+        """返回缓存命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries
+            }
+
+
+class TTLCache:
+    """带过期时间的LRU缓存
+
+    本进程内的修改通过 invalidate() 立即生效；条目在 ttl 秒后过期，
+    使多进程部署时其他进程的修改最终可见。
+    """
+
+    def __init__(self, max_entries=1024, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """读取未过期的缓存内容，未命中返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() < entry[0]:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def get_or_load(self, key, loader):
+        """读取缓存，未命中时调用loader()加载；loader返回None时不缓存"""
+        # 先记录失效代数再加载，加载期间发生失效时不写入旧数据
+        with self._lock:
+            generation = self._generation
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        value = loader()
+        if value is None:
+            return None
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, key=None):
+        """删除指定键（或全部）的缓存"""
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        """返回缓存命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl
+            }
+
+
+class _InFlightCall:
+    """一次进行中的计算"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """合并相同键的并发计算
+
+    同一时刻每个键只有一个调用方（leader）真正执行计算，
+    其余并发调用方等待并复用其结果或异常。结果会被多个请求共享，
+    因此应返回不可变的对象（如已序列化的JSON字符串）。
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        """执行fn()，相同key的并发调用只执行一次"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _InFlightCall()
+                self._calls[key] = call
+                self.leaders += 1
+                is_leader = True
+            else:
+                self.shared += 1
+                is_leader = False
+
+        if not is_leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def stats(self):
+        """返回合并统计"""
+        with self._lock:
+            return {
+                'leaders': self.leaders,
+                'shared': self.shared,
+                'in_flight': len(self._calls)
+            }
@@ -0,0 +1,125 @@
+import gzip
+import threading
+
+try:
+    import brotli
+except ImportError:  # brotli为可选依赖，未安装时只使用gzip
+    brotli = None
+
+
+class CompressedPayload(str):
+    """已序列化的JSON字符串，附带按编码预先压缩好的响应体
+
+    继承自str，可以像普通JSON字符串一样解析或直接作为响应内容；
+    放入缓存前压缩一次，之后每次命中缓存都直接复用压缩结果。
+    """
+
+    def __new__(cls, text, encoded=None):
+        payload = super().__new__(cls, text)
+        payload.encoded = encoded or {}
+        return payload
+
+
+class ResponseCompressor:
+    """按 Accept-Encoding 协商压缩响应
+
+    只压缩超过阈值的JSON/文本响应，阈值可按Flask端点名单独配置；
+    流式响应（如SSE）和已设置 Content-Encoding 的响应保持原样。
+    """
+
+    COMPRESSIBLE_MIMETYPES = ('application/json', 'text/plain', 'text/html', 'text/csv')
+
+    def __init__(self, min_size=1024, gzip_level=6, brotli_quality=5, endpoint_min_size=None):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.endpoint_min_size = dict(endpoint_min_size or {})
+        self._lock = threading.Lock()
+        self.compressed = 0
+        self.precompressed_hits = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @property
+    def encodings(self):
+        """按优先级排列的可用编码"""
+        return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+    @property
+    def precompress_min_size(self):
+        """缓存写入时预压缩的阈值，取所有端点阈值中的最小值"""
+        return min([self.min_size, *self.endpoint_min_size.values()])
+
+    def negotiate(self, accept_encodings):
+        """根据请求的 Accept-Encoding 选择编码，不支持压缩时返回None"""
+        for encoding in self.encodings:
+            if accept_encodings[encoding] > 0:
+                return encoding
+        return None
+
+    def compress(self, data, encoding):
+        """按指定编码压缩字节串"""
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality)
+        return gzip.compress(data, compresslevel=self.gzip_level, mtime=0)
+
+    def precompress(self, text):
+        """序列化结果写入缓存前按所有可用编码压缩一次，过小的内容不压缩"""
+        data = text.encode('utf-8')
+        if len(data) < self.precompress_min_size:
+            return CompressedPayload(text)
+        return CompressedPayload(text, {
+            encoding: self.compress(data, encoding) for encoding in self.encodings
+        })
+
+    def process(self, response, accept_encodings, endpoint=None, precompressed=None):
+        """压缩响应体并设置 Content-Encoding / Vary / ETag，返回同一个响应对象"""
+        if response.status_code != 200 or response.direct_passthrough or response.is_streamed:
+            return response
+        if 'Content-Encoding' in response.headers or response.mimetype not in self.COMPRESSIBLE_MIMETYPES:
+            return response
+
+        # 同一URL的响应内容随 Accept-Encoding 变化
+        response.vary.add('Accept-Encoding')
+        encoding = self.negotiate(accept_encodings)
+        if encoding is None:
+            return response
+
+        data = response.get_data()
+        if len(data) < self.endpoint_min_size.get(endpoint, self.min_size):
+            return response
+
+        body = (precompressed or {}).get(encoding)
+        if body is not None:
+            with self._lock:
+                self.precompressed_hits += 1
+        else:
+            body = self.compress(data, encoding)
+        if len(body) >= len(data):
+            return response
+
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        # 不同编码的响应体不同，ETag也必须不同
+        etag, weak = response.get_etag()
+        if etag and not etag.endswith(f'-{encoding}'):
+            response.set_etag(f'{etag}-{encoding}', weak)
+
+        with self._lock:
+            self.compressed += 1
+            self.bytes_in += len(data)
+            self.bytes_out += len(body)
+        return response
+
+    def stats(self):
+        """返回压缩统计"""
+        with self._lock:
+            return {
+                'encodings': list(self.encodings),
+                'compressed': self.compressed,
+                'precompressed_hits': self.precompressed_hits,
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'ratio': round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else 0,
+                'min_size': self.min_size
+            }
@@ -0,0 +1,269 @@
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from storage import upload_url
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow为可选依赖，未安装时只按文件头校验格式
+    Image = None
+    ImageOps = None
+
+
+# 文件头（magic bytes）与规范扩展名
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+
+def detect_image_type(header):
+    """根据文件头识别图片格式，返回规范扩展名，无法识别时返回None"""
+    for signature, extension in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return extension
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def normalize_image(path, extension):
+    """安装了Pillow时校验图片可完整解码，并按EXIF方向旋转JPEG后去除元数据"""
+    if Image is None:
+        return
+    with Image.open(path) as image:
+        image.verify()
+    if extension != 'jpg':
+        return
+    with Image.open(path) as image:
+        if not image.getexif():
+            return
+        normalized = ImageOps.exif_transpose(image)
+        normalized.save(path, format='JPEG', quality=90)
+
+
+def file_sha256(path, chunk_size=64 * 1024):
+    """分块计算文件内容的SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def generate_thumbnails(source_path, storage, key_base, sizes):
+    """生成各尺寸的WebP缩略图（最长边不超过该尺寸）并保存到存储后端，返回 {尺寸: 上传地址}
+
+    缩略图键为 <key_base>_<尺寸>.webp，已存在（相同内容此前上传过）时直接复用；
+    未安装Pillow时返回空字典；缩略图生成失败不影响原图归档。
+    """
+    if Image is None or not sizes:
+        return {}
+    thumbnails = {}
+    missing = []
+    for size in sorted(sizes):
+        key = f"{key_base}_{size}.webp"
+        if storage.exists(key):
+            thumbnails[str(size)] = upload_url(key)
+        else:
+            missing.append((size, key))
+    if not missing:
+        return thumbnails
+    try:
+        with Image.open(source_path) as image:
+            image.seek(0)
+            if image.mode not in ('RGB', 'RGBA'):
+                has_alpha = image.mode in ('LA', 'PA') or 'transparency' in image.info
+                image = image.convert('RGBA' if has_alpha else 'RGB')
+            for size, key in missing:
+                thumbnail = image.copy()
+                thumbnail.thumbnail((size, size))
+                temp_path = f"{source_path}_{size}.webp"
+                thumbnail.save(temp_path, format='WEBP', quality=80)
+                storage.save_file(key, temp_path)
+                thumbnails[str(size)] = upload_url(key)
+    except Exception as e:
+        print(f"生成缩略图失败 - 文件: {source_path}, 错误: {str(e)}")
+    return thumbnails
+
+
+def process_submission_images(staged_files, storage, max_file_size, thumbnail_sizes=(), category='task_submissions'):
+    """校验、规范化暂存的提交图片，按内容哈希保存到存储后端并生成缩略图（在工作进程中执行）
+
+    存储键为 <category>/<sha256>.<扩展名>，相同内容已存在时丢弃暂存文件直接复用。
+    staged_files 为暂存路径列表，返回
+    {'images': [上传地址], 'thumbnails': [{尺寸: 缩略图地址}],
+     'objects': [(sha256, 上传地址, 字节数, 是否复用)],
+     'rejected': [(暂存路径, 原因)], 'elapsed': 秒}，thumbnails/objects 与 images 一一对应。
+    """
+    started = time.perf_counter()
+    images = []
+    thumbnails = []
+    objects = []
+    rejected = []
+    for staged_path in staged_files:
+        try:
+            if os.path.getsize(staged_path) > max_file_size:
+                raise ValueError('文件大小超过限制')
+            with open(staged_path, 'rb') as f:
+                extension = detect_image_type(f.read(16))
+            if extension is None:
+                raise ValueError('不是支持的图片格式')
+
+            normalize_image(staged_path, extension)
+            sha256 = file_sha256(staged_path)
+            size = os.path.getsize(staged_path)
+            key_base = f"{category}/{sha256}"
+            key = f"{key_base}.{extension}"
+            image_thumbnails = generate_thumbnails(staged_path, storage, key_base, thumbnail_sizes)
+            reused = storage.exists(key)
+            if reused:
+                os.remove(staged_path)
+            else:
+                storage.save_file(key, staged_path)
+            images.append(upload_url(key))
+            thumbnails.append(image_thumbnails)
+            objects.append((sha256, upload_url(key), size, reused))
+        except Exception as e:
+            rejected.append((staged_path, str(e)))
+            try:
+                os.remove(staged_path)
+            except OSError:
+                pass
+    return {
+        'images': images,
+        'thumbnails': thumbnails,
+        'objects': objects,
+        'rejected': rejected,
+        'elapsed': time.perf_counter() - started
+    }
+
+
+class ImageWorkerPool:
+    """提交图片的后台处理池
+
+    使用有界的进程池处理图片，请求线程只负责暂存原始文件并提交任务。
+    未启用进程池（workers=0）、进程池不可用或积压任务达到 max_pending 时，
+    在调用方线程内直接处理，保证任何情况下提交都能完成。
+    """
+
+    def __init__(self, workers=2, max_pending=32):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.inline = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def _get_executor(self):
+        """首次使用时创建进程池"""
+        if self.workers <= 0:
+            return None
+        if self._executor is None:
+            # 优先使用fork，避免工作进程重新导入应用入口模块
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        return self._executor
+
+    def submit(self, fn, args, on_done):
+        """提交一个处理任务，完成后以结果调用on_done(result)，异常时以None调用"""
+        with self._lock:
+            self.submitted += 1
+            use_pool = self.pending < self.max_pending
+            if use_pool:
+                self.pending += 1
+
+        future = None
+        if use_pool:
+            try:
+                with self._lock:
+                    executor = self._get_executor()
+                if executor is not None:
+                    future = executor.submit(fn, *args)
+            except Exception as e:
+                print(f"图片处理进程池不可用，改为同步处理: {str(e)}")
+                with self._lock:
+                    self._executor = None
+            if future is None:
+                with self._lock:
+                    self.pending -= 1
+
+        if future is None:
+            with self._lock:
+                self.inline += 1
+            self._finish(self._run_inline(fn, args), on_done, from_pool=False)
+            return False
+
+        future.add_done_callback(lambda f: self._finish(self._result_of(f), on_done, from_pool=True))
+        return True
+
+    @staticmethod
+    def _run_inline(fn, args):
+        """在当前线程内执行处理函数"""
+        try:
+            return fn(*args)
+        except Exception as e:
+            print(f"图片处理失败: {str(e)}")
+            return None
+
+    @staticmethod
+    def _result_of(future):
+        """读取进程池任务的结果，异常时返回None"""
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"图片处理失败: {str(e)}")
+            return None
+
+    def _finish(self, result, on_done, from_pool):
+        """记录统计并调用完成回调"""
+        with self._lock:
+            if from_pool:
+                self.pending -= 1
+            if result is None:
+                self.failed += 1
+            else:
+                self.completed += 1
+                elapsed = result.get('elapsed', 0.0)
+                self.total_seconds += elapsed
+                self.max_seconds = max(self.max_seconds, elapsed)
+        try:
+            on_done(result)
+        except Exception as e:
+            print(f"图片处理完成回调失败: {str(e)}")
+            import traceback
+            traceback.print_exc()
+
+    def shutdown(self):
+        """等待已提交的任务及其完成回调执行完毕并关闭进程池（命令行任务退出前调用）"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self):
+        """返回处理池统计"""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'queue_depth': self.pending,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'inline': self.inline,
+                'avg_processing_ms': round(self.total_seconds / self.completed * 1000, 3) if self.completed else 0,
+                'max_processing_ms': round(self.max_seconds * 1000, 3)
+            }
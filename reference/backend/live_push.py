@@ -0,0 +1,125 @@
+import json
+import queue
+import threading
+
+
+def format_sse(data, event=None, event_id=None):
+    """按Server-Sent Events格式编码一条消息"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    lines.append(f"data: {payload}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class LeaderboardHub:
+    """排行榜实时推送中心
+
+    按频道（如 station:<站点ID>、task:<任务ID>）管理订阅者队列。
+    每次发布只编码一次消息，再分发给频道内所有订阅者；
+    队列已满的慢速订阅者会被断开，避免拖慢写请求。
+
+    本地调试可使用：
+        curl -N "http://localhost:5000/api/fan/leaderboard/stream?invite_code=XXXXXX"
+    或在测试中使用 app.test_client().get(url, buffered=False) 逐条读取响应。
+    """
+
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._channels = {}
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscribe(self, channel):
+        """订阅频道，返回接收消息的队列"""
+        subscriber = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, channel, subscriber):
+        """取消订阅"""
+        with self._lock:
+            subscribers = self._channels.get(channel)
+            if subscribers is None:
+                return
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._channels[channel]
+
+    def has_subscribers(self, channel):
+        """频道是否有订阅者，无人订阅时发布方可跳过计算"""
+        with self._lock:
+            return bool(self._channels.get(channel))
+
+    def publish(self, channel, event, data):
+        """向频道内所有订阅者推送一条消息"""
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+            if not subscribers:
+                return 0
+            self._sequence += 1
+            message = format_sse(data, event=event, event_id=self._sequence)
+            self.published += 1
+
+        delivered = 0
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+                delivered += 1
+            except queue.Full:
+                # 慢速订阅者：断开连接，客户端会自动重连
+                self.unsubscribe(channel, subscriber)
+                self._close(subscriber)
+                with self._lock:
+                    self.dropped += 1
+
+        with self._lock:
+            self.delivered += delivered
+        return delivered
+
+    @staticmethod
+    def _close(subscriber):
+        """清空队列并放入结束标记"""
+        try:
+            while True:
+                subscriber.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            subscriber.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def stream(self, channel, subscriber, heartbeat=15, retry_ms=3000):
+        """生成SSE响应内容，空闲时发送心跳注释保持连接"""
+        try:
+            yield f"retry: {retry_ms}\n\n"
+            while True:
+                try:
+                    message = subscriber.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+                if message is None:
+                    break
+                yield message
+        finally:
+            self.unsubscribe(channel, subscriber)
+
+    def stats(self):
+        """返回推送统计"""
+        with self._lock:
+            return {
+                'channels': len(self._channels),
+                'subscribers': sum(len(subscribers) for subscribers in self._channels.values()),
+                'published': self.published,
+                'delivered': self.delivered,
+                'dropped': self.dropped
+            }
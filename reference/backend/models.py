@@ -79,6 +79,8 @@ class InviteCode(db.Model):
     usage_limit = db.Column(db.String(20), default='unlimited')
     is_focus_enabled = db.Column(db.Boolean, default=True)
     last_focus_change = db.Column(db.DateTime)
+    focus_task_id = db.Column(db.String(36))  # 当前焦点任务，随任务焦点变更在同一事务中维护
+    focus_cooldown_until = db.Column(db.DateTime)  # 焦点变更冷却截止时间
     
     def to_dict(self):
         """将对象转换为字典"""
@@ -91,7 +93,9 @@ class InviteCode(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'usage_limit': self.usage_limit,
             'is_focus_enabled': self.is_focus_enabled,
-            'last_focus_change_timestamp': self.last_focus_change.isoformat() if self.last_focus_change else None
+            'last_focus_change_timestamp': self.last_focus_change.isoformat() if self.last_focus_change else None,
+            'focus_task_id': self.focus_task_id,
+            'focus_cooldown_until': self.focus_cooldown_until.isoformat() if self.focus_cooldown_until else None
         }
 
 class Task(db.Model):
@@ -112,6 +116,7 @@ class Task(db.Model):
     flame_mode_enabled = db.Column(db.Boolean, default=True)
     bonus_points = db.Column(db.Integer, default=0)
     completed_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # 增量同步游标
     
     # 存储复杂字段为JSON
     time_config = db.Column(db.JSON)
@@ -122,6 +127,10 @@ class Task(db.Model):
     participants = db.relationship('Participant', backref='task', lazy=True)
     invite_code = db.relationship('InviteCode', backref='tasks', lazy=True, foreign_keys=[invite_code_id])
     
+    __table_args__ = (
+        db.Index('ix_tasks_invite_code_updated', 'invite_code_id', 'updated_at'),
+    )
+    
     def to_dict(self):
         """将对象转换为字典"""
         try:
@@ -140,6 +149,7 @@ class Task(db.Model):
                 'flame_mode_enabled': self.flame_mode_enabled,
                 'bonus_points': self.bonus_points,
                 'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+                'updated_at': self.updated_at.isoformat() if self.updated_at else None,
                 'time_config': self.time_config,
                 'encouragement_image_url': self.encouragement_image_url,
                 'encouragement_message': self.encouragement_message,
@@ -169,10 +179,17 @@ class Participant(db.Model):
     submission_count = db.Column(db.Integer, default=0)
     points_earned = db.Column(db.Integer, default=0)
     total_points_for_task = db.Column(db.Integer, default=0)
+    last_scored_at = db.Column(db.DateTime)  # 达到当前积分的时间，同分时先达到者排名靠前
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # 增量同步游标
     
     # 关联
     submissions = db.relationship('Submission', backref='participant', lazy=True)
     
+    __table_args__ = (
+        db.Index('ix_participants_task_updated', 'task_id', 'updated_at'),
+        db.Index('ux_participants_task_name', 'task_id', 'name', unique=True),  # 同一任务下昵称唯一
+    )
+    
     def to_dict(self):
         """将对象转换为字典"""
         try:
@@ -185,6 +202,8 @@ class Participant(db.Model):
                 'submission_count': self.submission_count,
                 'points_earned': self.points_earned,
                 'total_points_for_task': self.total_points_for_task,
+                'last_scored_at': self.last_scored_at.isoformat() if self.last_scored_at else None,
+                'updated_at': self.updated_at.isoformat() if self.updated_at else None,
                 # 不返回submissions数据以避免性能问题和循环依赖
                 'submissions_count': len(self.submissions) if hasattr(self, '_sa_instance_state') and hasattr(self, 'submissions') else 0
             }
@@ -215,6 +234,8 @@ class Submission(db.Model):
     
     # 存储图片URL为JSON
     image_urls = db.Column(db.JSON)  # 存储图片URL列表
+    image_status = db.Column(db.String(20), default='ready')  # pending（后台处理中）, ready, failed
+    image_thumbnails = db.Column(db.JSON)  # 与image_urls一一对应的缩略图 {尺寸: 路径}
     
     def to_dict(self):
         """将对象转换为字典"""
@@ -228,7 +249,147 @@ class Submission(db.Model):
             'abnormal_reason': self.abnormal_reason,
             'marked_by': self.marked_by,
             'marked_at': self.marked_at.isoformat() if self.marked_at else None,
-            'image_urls': self.image_urls
+            'image_urls': self.image_urls,
+            'image_status': self.image_status,
+            'image_thumbnails': self.image_thumbnails
+        }
+
+class StationStanding(db.Model):
+    """站点排行榜汇总模型 - 按站点和粉丝昵称增量维护的积分汇总"""
+    __tablename__ = 'station_standings'
+    
+    station_id = db.Column(db.String(36), db.ForeignKey('stations.id'), primary_key=True)
+    nickname = db.Column(db.String(100), primary_key=True)  # 粉丝昵称，对应Participant.name
+    total_points = db.Column(db.Integer, default=0, nullable=False)
+    task_count = db.Column(db.Integer, default=0, nullable=False)  # 参与的任务数
+    focus_points = db.Column(db.Integer, default=0, nullable=False)  # 焦点任务积分
+    focus_task_count = db.Column(db.Integer, default=0, nullable=False)  # 参与的焦点任务数
+    has_focus_task_completed = db.Column(db.Boolean, default=False, nullable=False)
+    last_scored_at = db.Column(db.DateTime)  # 达到当前总积分的时间，同分时先达到者排名靠前
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_station_standings_overall', 'station_id', 'total_points'),
+        db.Index('ix_station_standings_focus', 'station_id', 'focus_points'),
+    )
+    
+    def to_dict(self):
+        """将对象转换为字典"""
+        return {
+            'station_id': self.station_id,
+            'nickname': self.nickname,
+            'total_points': self.total_points,
+            'task_count': self.task_count,
+            'focus_points': self.focus_points,
+            'focus_task_count': self.focus_task_count,
+            'has_focus_task_completed': self.has_focus_task_completed,
+            'last_scored_at': self.last_scored_at.isoformat() if self.last_scored_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class DailyRollup(db.Model):
+    """每日排行榜汇总模型 - 按站点、日期和粉丝昵称汇总积分与提交次数"""
+    __tablename__ = 'daily_rollups'
+    
+    station_id = db.Column(db.String(36), db.ForeignKey('stations.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)  # 提交日期（UTC）
+    nickname = db.Column(db.String(100), primary_key=True)  # 粉丝昵称，对应Participant.name
+    points = db.Column(db.Integer, default=0, nullable=False)
+    submission_count = db.Column(db.Integer, default=0, nullable=False)
+    last_scored_at = db.Column(db.DateTime)  # 当日最后一次积分变化的时间，同分时先达到者排名靠前
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        """将对象转换为字典"""
+        return {
+            'station_id': self.station_id,
+            'day': self.day.isoformat() if self.day else None,
+            'nickname': self.nickname,
+            'points': self.points,
+            'submission_count': self.submission_count,
+            'last_scored_at': self.last_scored_at.isoformat() if self.last_scored_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class TaskRankingSnapshot(db.Model):
+    """任务排行榜快照模型 - 任务结算时冻结的最终排名，写入后不再修改"""
+    __tablename__ = 'task_ranking_snapshots'
+    
+    task_id = db.Column(db.String(36), db.ForeignKey('tasks.id'), primary_key=True)
+    station_id = db.Column(db.String(36), db.ForeignKey('stations.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    participant_count = db.Column(db.Integer, default=0)
+    
+    # 按排名排序的 [昵称, 积分, 提交次数] 列表
+    entries = db.Column(db.JSON)
+    
+    def to_dict(self):
+        """将对象转换为字典"""
+        return {
+            'task_id': self.task_id,
+            'station_id': self.station_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'participant_count': self.participant_count,
+            'entries': self.entries
+        }
+
+class UploadObject(db.Model):
+    """上传对象模型 - 按内容哈希去重保存的文件，ref_count为引用该文件的次数"""
+    __tablename__ = 'upload_objects'
+    
+    sha256 = db.Column(db.String(64), primary_key=True)
+    path = db.Column(db.String(500), nullable=False)
+    size = db.Column(db.Integer, default=0, nullable=False)  # 字节数
+    ref_count = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_referenced_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        """将对象转换为字典"""
+        return {
+            'sha256': self.sha256,
+            'path': self.path,
+            'size': self.size,
+            'ref_count': self.ref_count,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'last_referenced_at': self.last_referenced_at.isoformat() if self.last_referenced_at else None
+        }
+
+class CacheVersion(db.Model):
+    """响应缓存版本号模型 - 每个作用域（站点ID等）一行，写操作提交后递增，所有进程共享"""
+    __tablename__ = 'cache_versions'
+
+    scope = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        """将版本号转换为字典"""
+        return {
+            'scope': self.scope,
+            'version': self.version,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class TaskTombstone(db.Model):
+    """任务离开邀请码的记录模型 - 任务被改到其他邀请码后，供原邀请码的增量同步通知粉丝端移除该任务"""
+    __tablename__ = 'task_tombstones'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    task_id = db.Column(db.String(36), db.ForeignKey('tasks.id'), nullable=False)
+    invite_code_id = db.Column(db.String(36), db.ForeignKey('invite_codes.id'), nullable=False)
+    removed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_task_tombstones_invite_code_removed', 'invite_code_id', 'removed_at'),
+    )
+
+    def to_dict(self):
+        """将记录转换为字典"""
+        return {
+            'task_id': self.task_id,
+            'invite_code_id': self.invite_code_id,
+            'removed_at': self.removed_at.isoformat() if self.removed_at else None
         }
 
 class GlobalSettings(db.Model):
@@ -0,0 +1,167 @@
+import os
+import uuid
+
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+from image_pipeline import detect_image_type
+
+# 识别图片格式需要的文件头长度
+HEADER_SIZE = 16
+
+
+class IngestResult:
+    """流式解析的结果：文本字段、暂存文件路径和被拒绝的文件"""
+
+    def __init__(self):
+        self.form = MultiDict()
+        self.staged_files = []
+        self.rejected = []
+        self.bytes_read = 0
+
+    def claim(self):
+        """取走暂存文件路径，之后由调用方负责这些文件"""
+        staged_files, self.staged_files = self.staged_files, []
+        return staged_files
+
+    def discard(self):
+        """删除已暂存的文件（请求未能完成时调用）"""
+        for path in self.staged_files:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.staged_files = []
+
+
+class _FilePart:
+    """正在接收的一个文件分段：先缓存文件头识别格式，之后的数据直接写入暂存文件"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.header = b''
+        self.size = 0
+        self.path = None
+        self.handle = None
+        self.error = None
+
+    def write(self, data, staging_dir, max_file_size):
+        if self.error:
+            return
+        self.size += len(data)
+        if self.size > max_file_size:
+            self.reject('文件大小超过限制')
+            return
+        if self.handle is None:
+            self.header += data
+            if len(self.header) < HEADER_SIZE:
+                return
+            self.open(staging_dir)
+            if self.error:
+                return
+            data, self.header = self.header, b''
+        self.handle.write(data)
+
+    def open(self, staging_dir):
+        """根据文件头确定格式并创建暂存文件，不是图片时拒绝"""
+        extension = detect_image_type(self.header)
+        if extension is None:
+            self.reject('不是支持的图片格式')
+            return
+        self.path = os.path.join(staging_dir, f"{uuid.uuid4().hex}.{extension}")
+        self.handle = open(self.path, 'wb')
+
+    def finish(self, staging_dir):
+        """分段结束，返回暂存路径；文件为空或被拒绝时返回None"""
+        if not self.error and self.handle is None:
+            if not self.header:
+                self.reject('文件为空')
+            else:
+                self.open(staging_dir)
+                if not self.error:
+                    self.handle.write(self.header)
+        if self.error:
+            return None
+        self.handle.close()
+        return self.path
+
+    def reject(self, reason):
+        self.error = reason
+        self.close(remove=True)
+
+    def close(self, remove=False):
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+        if remove and self.path:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+def ingest_multipart(stream, boundary, staging_dir, file_fields, max_file_size, max_request_size,
+                     max_files, max_field_size=64 * 1024, chunk_size=64 * 1024):
+    """边读取边解析 multipart/form-data 请求体，文件数据按块直接写入暂存目录
+
+    内存占用与请求体大小无关：文本字段合计不超过 max_field_size，
+    文件只缓存识别格式所需的文件头。只接收 file_fields 中各字段的文件，file_fields 为None时接收任意字段的文件；
+    超过单文件大小、不是图片或超出文件数量的文件在读取过程中即被丢弃并记录原因，
+    请求体超过 max_request_size 或文本字段过大时抛出 RequestEntityTooLarge。
+    """
+    os.makedirs(staging_dir, exist_ok=True)
+    result = IngestResult()
+    # 解码器缓冲区最多保留一个读取块和未解析完的分段头
+    decoder = MultipartDecoder(boundary, max_form_memory_size=chunk_size + max_field_size)
+    field_size = 0
+    current = None
+    buffer = None
+    accepted = 0
+
+    try:
+        while True:
+            event = decoder.next_event()
+            if isinstance(event, NeedData):
+                chunk = stream.read(chunk_size)
+                result.bytes_read += len(chunk)
+                if result.bytes_read > max_request_size:
+                    raise RequestEntityTooLarge()
+                decoder.receive_data(chunk or None)
+            elif isinstance(event, Epilogue):
+                break
+            elif isinstance(event, Field):
+                current = event
+                buffer = []
+            elif isinstance(event, File):
+                if (file_fields is not None and event.name not in file_fields) or not event.filename:
+                    current = None
+                elif accepted >= max_files:
+                    current = None
+                    result.rejected.append((event.filename, '超出图片数量限制'))
+                else:
+                    accepted += 1
+                    current = _FilePart(event.filename)
+            elif isinstance(event, Data):
+                if isinstance(current, Field):
+                    field_size += len(event.data)
+                    if field_size > max_field_size:
+                        raise RequestEntityTooLarge()
+                    buffer.append(event.data)
+                    if not event.more_data:
+                        result.form.add(current.name, b''.join(buffer).decode('utf-8', 'replace'))
+                elif isinstance(current, _FilePart):
+                    current.write(event.data, staging_dir, max_file_size)
+                    if not event.more_data:
+                        path = current.finish(staging_dir)
+                        if path:
+                            result.staged_files.append(path)
+                        else:
+                            result.rejected.append((current.filename, current.error))
+                        current = None
+    except BaseException:
+        if isinstance(current, _FilePart):
+            current.close(remove=True)
+        result.discard()
+        raise
+    return result
@@ -0,0 +1,193 @@
+import bisect
+import threading
+import time
+
+try:
+    from sortedcontainers import SortedList
+except ImportError:  # sortedcontainers为可选依赖，未安装时使用有序列表，更新需要O(n)的元素移动
+    SortedList = None
+
+
+class _SortedKeyList:
+    """未安装sortedcontainers时的有序列表，提供与 SortedList 相同的接口"""
+
+    def __init__(self, keys=()):
+        self._keys = sorted(keys)
+
+    def add(self, key):
+        bisect.insort(self._keys, key)
+
+    def remove(self, key):
+        del self._keys[bisect.bisect_left(self._keys, key)]
+
+    def bisect_left(self, key):
+        return bisect.bisect_left(self._keys, key)
+
+    def __getitem__(self, index):
+        return self._keys[index]
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class TaskRanking:
+    """单个任务的进程内有序排行榜
+
+    按 (-积分, 同分排序值, 昵称) 维护有序键集合，并保留昵称到成绩的映射。
+    安装了sortedcontainers时单个粉丝的更新和排名查询均为O(log n)，
+    否则排名查询为二分查找，更新需要移动列表元素。
+    排名与SQL的 RANK() 一致：同分同名次，并列后的名次顺延；
+    同分排序值（如达到该积分的时间）只决定并列者的展示顺序。
+    """
+
+    def __init__(self, task_id, rows, version=None):
+        self.task_id = task_id
+        self.version = version
+        self.built_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._entries = {}
+        for nickname, points, completed_tasks, tie_break in rows:
+            self._entries[nickname] = (points or 0, completed_tasks or 0, tie_break or 0)
+        self._keys = (SortedList or _SortedKeyList)(
+            self._key(nickname, points, tie_break)
+            for nickname, (points, _, tie_break) in self._entries.items()
+        )
+
+    @staticmethod
+    def _key(nickname, points, tie_break):
+        return (-points, tie_break, nickname)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._keys)
+
+    def _rank_for_points(self, points):
+        """同分者中第一个的位置即为名次（需持有锁）"""
+        return self._keys.bisect_left((-points,)) + 1
+
+    def _position_of(self, nickname):
+        """粉丝在展示顺序中的下标，未上榜返回None（需持有锁）"""
+        entry = self._entries.get(nickname)
+        if entry is None:
+            return None
+        return self._keys.bisect_left(self._key(nickname, entry[0], entry[2]))
+
+    def update(self, nickname, points, completed_tasks, tie_break=0):
+        """更新单个粉丝的成绩并保持有序"""
+        points = points or 0
+        tie_break = tie_break or 0
+        with self._lock:
+            previous = self._entries.get(nickname)
+            if previous is not None:
+                self._keys.remove(self._key(nickname, previous[0], previous[2]))
+            self._entries[nickname] = (points, completed_tasks or 0, tie_break)
+            self._keys.add(self._key(nickname, points, tie_break))
+
+    def rank_of(self, nickname):
+        """返回粉丝的 (排名, 积分, 提交次数)，未上榜返回None"""
+        with self._lock:
+            entry = self._entries.get(nickname)
+            if entry is None:
+                return None
+            return self._rank_for_points(entry[0]), entry[0], entry[1]
+
+    def position_of(self, nickname):
+        """返回粉丝在展示顺序中的下标，未上榜返回None"""
+        with self._lock:
+            return self._position_of(nickname)
+
+    def _slice(self, start, end):
+        """[start, end) 区间内的 (排名, 昵称, 积分, 提交次数) 列表（需持有锁）"""
+        start = max(0, start)
+        result = []
+        rank = None
+        previous_points = None
+        for offset, (negative_points, _, nickname) in enumerate(self._keys[start:end]):
+            points = -negative_points
+            if rank is None:
+                rank = self._rank_for_points(points)
+            elif points != previous_points:
+                rank = start + offset + 1
+            previous_points = points
+            completed_tasks = self._entries[nickname][1]
+            result.append((rank, nickname, points, completed_tasks))
+        return result
+
+    def slice(self, start, end):
+        """返回 [start, end) 区间内的 (排名, 昵称, 积分, 提交次数) 列表"""
+        with self._lock:
+            return self._slice(start, end)
+
+    def top(self, n=None):
+        """返回前n名，n为空时返回全部"""
+        with self._lock:
+            return self._slice(0, len(self._keys) if n is None else n)
+
+    def around_window(self, nickname, radius):
+        """返回粉丝前后各radius名的 [start, end) 区间；未上榜时为榜尾区间"""
+        with self._lock:
+            index = self._position_of(nickname)
+            if index is None:
+                total = len(self._keys)
+                return max(0, total - radius), total
+            return max(0, index - radius), index + radius + 1
+
+    def around(self, nickname, radius):
+        """返回粉丝前后各radius名的窗口；未上榜时返回榜尾窗口"""
+        return self.slice(*self.around_window(nickname, radius))
+
+
+class RankingEngine:
+    """任务排行榜排名引擎
+
+    每个任务的排行榜首次访问时从数据库重建，提交时增量更新。
+    结构保存在进程内：读取时传入共享的数据版本号（如数据库中的站点版本号），
+    版本号与排行榜构建时不一致说明有其他进程写入过，排行榜会被重建；
+    未提供版本号时，超过 max_age 秒的排行榜会被重建。
+    """
+
+    def __init__(self, max_age=60):
+        self.max_age = max_age
+        self._boards = {}
+        self._lock = threading.Lock()
+
+    def get(self, task_id, loader, version=None):
+        """获取任务排行榜，缺失、过期或版本号不一致时调用loader()加载 (昵称, 积分, 提交次数, 同分排序值) 行
+
+        version 应在调用loader()之前读取，加载期间发生的写入只会导致下次读取时再重建一次。
+        """
+        with self._lock:
+            board = self._boards.get(task_id)
+        if (board is not None and time.monotonic() - board.built_at < self.max_age
+                and (version is None or board.version == version)):
+            return board
+
+        board = TaskRanking(task_id, loader(), version)
+        with self._lock:
+            self._boards[task_id] = board
+        return board
+
+    def record(self, task_id, nickname, points, completed_tasks, tie_break=0, version=None):
+        """提交后增量更新已加载的排行榜
+
+        version 为本次写入递增后的版本号：排行榜构建于前一个版本时增量更新并前进到该版本，
+        否则说明期间还有其他写入，丢弃排行榜等待重建。
+        """
+        with self._lock:
+            board = self._boards.get(task_id)
+            if board is None:
+                return
+            if version is not None and board.version is not None and board.version + 1 != version:
+                self._boards.pop(task_id, None)
+                return
+            board.update(nickname, points, completed_tasks, tie_break)
+            if version is not None:
+                board.version = version
+
+    def invalidate(self, task_id=None):
+        """丢弃指定任务（或全部）的排行榜，下次访问时重建"""
+        with self._lock:
+            if task_id is None:
+                self._boards.clear()
+            else:
+                self._boards.pop(task_id, None)
@@ -0,0 +1,227 @@
+import hashlib
+import mimetypes
+import os
+import shutil
+import uuid
+
+from flask import abort, redirect, send_file
+from werkzeug.security import safe_join
+
+# 上传文件对外的URL前缀，数据库中保存的地址为 uploads/<键>，与存储后端无关
+UPLOAD_URL_PREFIX = 'uploads'
+
+
+def upload_url(key):
+    """由存储键生成保存在数据库中的上传地址"""
+    return f"{UPLOAD_URL_PREFIX}/{key}"
+
+
+def validate_key(key):
+    """存储键形如 <分类>/<文件名>，拒绝空段和路径穿越"""
+    parts = key.split('/')
+    if len(parts) < 2 or any(part in ('', '.', '..') or '\\' in part for part in parts):
+        raise ValueError(f'无效的存储键: {key}')
+    return key
+
+
+class LocalStorage:
+    """本地文件系统存储
+
+    按文件名哈希前缀分目录保存：键 task_submissions/<文件名> 对应
+    <root>/task_submissions/ab/cd/<文件名>，避免单个目录中文件过多。
+    """
+
+    backend = 'local'
+
+    def __init__(self, root, shard_depth=2, shard_width=2):
+        self.root = root
+        self.shard_depth = shard_depth
+        self.shard_width = shard_width
+
+    def local_path(self, key):
+        """返回键对应的分片目录中的文件路径"""
+        directory, name = validate_key(key).rsplit('/', 1)
+        digest = hashlib.sha256(name.encode('utf-8')).hexdigest()
+        shards = [digest[i * self.shard_width:(i + 1) * self.shard_width] for i in range(self.shard_depth)]
+        return os.path.join(self.root, *directory.split('/'), *shards, name)
+
+    def exists(self, key):
+        """键对应的文件是否存在"""
+        return os.path.isfile(self.local_path(key))
+
+    def save_file(self, key, source_path, keep_source=False):
+        """将本地文件保存到键对应的位置，默认移动源文件"""
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if keep_source:
+            # 先复制到临时文件再改名，读取方不会看到写了一半的文件
+            temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            shutil.copyfile(source_path, temp_path)
+            os.replace(temp_path, path)
+        else:
+            os.replace(source_path, path)
+
+    def save_stream(self, key, stream):
+        """将文件流写入键对应的位置"""
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'wb') as f:
+            shutil.copyfileobj(stream, f)
+        os.replace(temp_path, path)
+
+    def delete(self, key):
+        """删除键对应的文件"""
+        try:
+            os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+    def send(self, key):
+        """返回文件内容的响应，不存在时返回404"""
+        try:
+            path = self.local_path(key)
+        except ValueError:
+            abort(404)
+        if not os.path.isfile(path):
+            abort(404)
+        return send_file(os.path.abspath(path))
+
+    def stats(self):
+        """返回存储配置"""
+        return {
+            'backend': self.backend,
+            'root': self.root,
+            'shard_depth': self.shard_depth,
+            'shard_width': self.shard_width
+        }
+
+
+class S3Storage:
+    """S3兼容对象存储（AWS S3、MinIO等）
+
+    依赖可选的boto3；endpoint_url 指向本地MinIO等兼容服务即可在开发环境测试。
+    读取时重定向到预签名URL，文件内容不经过应用进程。
+    """
+
+    backend = 's3'
+
+    def __init__(self, bucket, prefix='', endpoint_url=None, region_name=None, presign_expires=3600):
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.endpoint_url = endpoint_url
+        self.region_name = region_name
+        self.presign_expires = presign_expires
+        self._client = None
+
+    def __getstate__(self):
+        # 客户端不能跨进程传递，由图片处理进程按需重新创建
+        state = self.__dict__.copy()
+        state['_client'] = None
+        return state
+
+    @property
+    def client(self):
+        """首次使用时创建boto3客户端"""
+        if self._client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise RuntimeError('使用S3存储需要安装boto3')
+            self._client = boto3.client(
+                's3',
+                endpoint_url=self.endpoint_url,
+                region_name=self.region_name
+            )
+        return self._client
+
+    def object_key(self, key):
+        """存储键对应的对象键"""
+        validate_key(key)
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def local_path(self, key):
+        """对象存储中的文件没有本地路径"""
+        return None
+
+    def exists(self, key):
+        """对象是否存在"""
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def _extra_args(self, key):
+        """上传时附带的对象元数据"""
+        content_type = mimetypes.guess_type(key)[0]
+        return {'ContentType': content_type} if content_type else {}
+
+    def save_file(self, key, source_path, keep_source=False):
+        """上传本地文件，默认上传成功后删除源文件"""
+        self.client.upload_file(source_path, self.bucket, self.object_key(key), ExtraArgs=self._extra_args(key))
+        if not keep_source:
+            os.remove(source_path)
+
+    def save_stream(self, key, stream):
+        """上传文件流"""
+        self.client.upload_fileobj(stream, self.bucket, self.object_key(key), ExtraArgs=self._extra_args(key))
+
+    def delete(self, key):
+        """删除对象"""
+        self.client.delete_object(Bucket=self.bucket, Key=self.object_key(key))
+
+    def send(self, key):
+        """重定向到对象的预签名URL"""
+        try:
+            object_key = self.object_key(key)
+        except ValueError:
+            abort(404)
+        url = self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket, 'Key': object_key},
+            ExpiresIn=self.presign_expires
+        )
+        return redirect(url)
+
+    def stats(self):
+        """返回存储配置"""
+        return {
+            'backend': self.backend,
+            'bucket': self.bucket,
+            'prefix': self.prefix,
+            'endpoint_url': self.endpoint_url
+        }
+
+
+def migrate_local_uploads(upload_root, storage, skip_dirs=('staging',), keep_local=False, dry_run=False):
+    """将上传目录中未按当前存储布局保存的文件迁移到存储后端，返回 (迁移数, 跳过数)
+
+    文件的存储键为 <一级目录>/<文件名>，因此旧的平铺目录和已分片的目录都能识别；
+    数据库中的上传地址（uploads/<键>）保持不变。
+    """
+    migrated = 0
+    skipped = 0
+    if not os.path.isdir(upload_root):
+        return migrated, skipped
+    for category in sorted(os.listdir(upload_root)):
+        category_dir = os.path.join(upload_root, category)
+        if category in skip_dirs or not os.path.isdir(category_dir):
+            continue
+        for directory, _, filenames in os.walk(category_dir):
+            for filename in filenames:
+                if filename.endswith('.tmp'):
+                    continue
+                source_path = os.path.join(directory, filename)
+                key = f"{category}/{filename}"
+                target_path = storage.local_path(key)
+                if target_path and os.path.abspath(target_path) == os.path.abspath(source_path):
+                    skipped += 1
+                    continue
+                if not dry_run:
+                    storage.save_file(key, source_path, keep_source=keep_local)
+                migrated += 1
+    return migrated, skipped
@@ -0,0 +1,142 @@
+"""后端测试公共夹具
+
+app_db 在导入时读取环境变量、创建数据库并初始化上传目录，
+因此在导入前指定临时数据库路径，并切换到临时工作目录（上传目录为相对路径 uploads）。
+图片处理池设为同步模式（IMAGE_WORKERS=0），提交接口返回时图片已处理完成。
+"""
+import io
+import os
+import shutil
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# 最小的PNG文件头，足以通过按文件头的格式校验
+PNG_BYTES = b'\x89PNG\r\n\x1a\n' + b'\0' * 100
+INVITE_CODE = 'TESTCODE'
+
+
+@pytest.fixture(scope='session')
+def backend(tmp_path_factory):
+    """导入后端应用模块"""
+    workdir = tmp_path_factory.mktemp('backend')
+    previous_cwd = os.getcwd()
+    os.environ['DATABASE_PATH'] = str(workdir / 'test.db')
+    os.environ['IMAGE_WORKERS'] = '0'
+    os.chdir(workdir)
+    import app_db
+    app_db.app.config['TESTING'] = True
+    app_db.limiter.enabled = False
+    yield app_db
+    os.chdir(previous_cwd)
+
+
+@pytest.fixture
+def app_db(backend):
+    """每个测试使用空数据库、空上传目录和空的进程内缓存"""
+    with backend.app.app_context():
+        backend.db.session.remove()
+        backend.db.drop_all()
+        backend.db.create_all()
+    shutil.rmtree(backend.app.config['UPLOAD_FOLDER'], ignore_errors=True)
+    os.makedirs(backend.app.config['UPLOAD_FOLDER'], exist_ok=True)
+    backend.ranking_engine.invalidate()
+    backend.invite_code_cache.invalidate()
+    backend.settings_cache.invalidate()
+    yield backend
+    with backend.app.app_context():
+        backend.db.session.remove()
+
+
+@pytest.fixture
+def client(app_db):
+    return app_db.app.test_client()
+
+
+@pytest.fixture
+def station(app_db):
+    """创建站子管理员、站点和邀请码，返回ID和管理员请求头"""
+    from models import db, User, Station, InviteCode
+
+    with app_db.app.app_context():
+        user = User(email='admin@example.com', password_hash='x', role='station_admin', username='admin')
+        db.session.add(user)
+        db.session.commit()
+        station = Station(name='测试站', owner_id=user.id)
+        db.session.add(station)
+        db.session.commit()
+        invite_code = InviteCode(code=INVITE_CODE, station_id=station.id)
+        db.session.add(invite_code)
+        db.session.commit()
+        ids = {'user_id': user.id, 'station_id': station.id, 'invite_code_id': invite_code.id}
+
+    import jwt
+    token = jwt.encode({
+        'user_id': ids['user_id'],
+        'role': 'station_admin',
+        'exp': (datetime.now(timezone.utc) + timedelta(hours=1)).timestamp()
+    }, app_db.app.config['SECRET_KEY'], algorithm='HS256')
+    ids['invite_code'] = INVITE_CODE
+    ids['headers'] = {'Authorization': f'Bearer {token}'}
+    return ids
+
+
+@pytest.fixture
+def create_task(client, station):
+    """通过站子端接口创建任务，返回任务ID"""
+    def create(title='任务', points=10, is_focus_task=False):
+        response = client.post('/api/station/tasks', json={
+            'title': title,
+            'description': '描述',
+            'points': points,
+            'due_date': None,
+            'station_id': station['station_id'],
+            'invite_code_id': station['invite_code_id'],
+            'is_focus_task': is_focus_task
+        }, headers=station['headers'])
+        assert response.status_code == 201, response.get_json()
+        return response.get_json()['id']
+    return create
+
+
+@pytest.fixture
+def submit(client, station):
+    """通过粉丝端接口提交任务，返回响应"""
+    def submit(task_id, nickname, images=None):
+        if images is None:
+            images = [(io.BytesIO(PNG_BYTES), 'proof.png')]
+        return client.post(f'/api/fan/tasks/{task_id}/submit', data={
+            'nickname': nickname,
+            'invite_code': station['invite_code'],
+            'images': images
+        }, content_type='multipart/form-data')
+    return submit
+
+
+@pytest.fixture
+def clock(app_db, monkeypatch):
+    """固定 app_db 中的当前时间，修改 clock.now 即可构造跨天的数据"""
+    class Clock:
+        now = datetime(2026, 3, 1, 12, 0)
+
+    class FrozenDatetimeType(type):
+        # 数据库返回的普通datetime仍应通过 isinstance(value, datetime) 检查
+        def __instancecheck__(cls, instance):
+            return isinstance(instance, datetime)
+
+    class FrozenDatetime(datetime, metaclass=FrozenDatetimeType):
+        @classmethod
+        def utcnow(cls):
+            return Clock.now
+
+        @classmethod
+        def now(cls, tz=None):
+            return Clock.now if tz is None else Clock.now.replace(tzinfo=timezone.utc).astimezone(tz)
+
+    monkeypatch.setattr(app_db, 'datetime', FrozenDatetime)
+    return Clock
@@ -0,0 +1,126 @@
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import distinct, func
+
+from models import db, DailyRollup, Participant, Submission, Task
+
+DAY1 = datetime(2026, 3, 1, 9, 0)
+
+
+def baseline_range_scan(station_id, start_day, end_day):
+    """原来日榜的查询方式：直接扫描日期范围内的提交，按粉丝汇总 {昵称: (积分, 提交次数)}"""
+    start = datetime.combine(start_day, datetime.min.time()).replace(tzinfo=timezone.utc)
+    end = datetime.combine(end_day + timedelta(days=1), datetime.min.time()).replace(tzinfo=timezone.utc)
+    rows = db.session.query(
+        Participant.name,
+        func.sum(Submission.points_earned),
+        func.count(distinct(Submission.id))
+    ).join(
+        Submission, Submission.participant_id == Participant.id
+    ).join(
+        Task, Task.id == Participant.task_id
+    ).filter(
+        Submission.submitted_at >= start,
+        Submission.submitted_at < end,
+        Task.station_id == station_id
+    ).group_by(
+        Participant.name
+    ).all()
+    return {name: (points, count) for name, points, count in rows}
+
+
+def baseline_custom_range(station_id, start_day, end_day):
+    """原来 custom_range 的查询：范围内有提交的参与记录，按粉丝汇总其全部积分（每条提交各计一次）"""
+    rows = db.session.query(
+        Participant.name,
+        func.sum(Participant.points_earned),
+        func.count(distinct(Participant.id))
+    ).join(
+        Submission, Submission.participant_id == Participant.id
+    ).join(
+        Task, Task.id == Participant.task_id
+    ).filter(
+        Task.station_id == station_id,
+        Submission.submitted_at >= datetime.combine(start_day, datetime.min.time()),
+        Submission.submitted_at < datetime.combine(end_day + timedelta(days=1), datetime.min.time())
+    ).group_by(
+        Participant.name
+    ).all()
+    return {name: points for name, points, _ in rows}
+
+
+def custom_range(client, station, start_day, end_day):
+    response = client.get(
+        f"/api/station/rankings?type=custom_range&invite_code={station['invite_code']}"
+        f"&startDate={start_day.isoformat()}&endDate={end_day.isoformat()}",
+        headers=station['headers']
+    )
+    assert response.status_code == 200
+    return response.get_json()['data']
+
+
+def build_history(client, station, create_task, submit, clock):
+    """三天内的提交：焦点任务积分翻倍，任务默认开启火焰模式（重复提交也计分），第一天的一条提交在第三天被标记为异常"""
+    clock.now = DAY1
+    task_a = create_task('任务A', points=10)
+    focus = create_task('焦点任务', points=5, is_focus_task=True)
+    abnormal_id = submit(task_a, '小明').get_json()['submission_id']
+    submit(task_a, '小红')
+    clock.now = DAY1 + timedelta(days=1, hours=3)
+    submit(focus, '小明')
+    submit(task_a, '小明')
+    submit(focus, '小刚')
+    clock.now = DAY1 + timedelta(days=2, hours=1)
+    submit(focus, '小红')
+    response = client.post(f'/api/station/submissions/{abnormal_id}/mark-abnormal',
+                           json={'reason': '无效'}, headers=station['headers'])
+    assert response.status_code == 200
+
+
+def test_daily_board_matches_submission_scan(app_db, client, station, create_task, submit, clock):
+    build_history(client, station, create_task, submit, clock)
+
+    for offset in range(3):
+        clock.now = DAY1 + timedelta(days=offset, hours=20)
+        day = clock.now.date()
+        board = client.get(f"/api/fan/leaderboard?invite_code={station['invite_code']}&type=daily").get_json()
+        with app_db.app.app_context():
+            expected = baseline_range_scan(station['station_id'], day, day)
+        assert {row['nickname']: (row['points'], row['completed_tasks']) for row in board} == expected
+        assert [row['points'] for row in board] == sorted((points for points, _ in expected.values()), reverse=True)
+
+
+def test_custom_range_sums_points_earned_inside_range(app_db, client, station, create_task, submit, clock):
+    build_history(client, station, create_task, submit, clock)
+    first, last = date(2026, 3, 1), date(2026, 3, 3)
+
+    for start_day, end_day in [(first, last), (first, first), (first + timedelta(days=1), last)]:
+        rows = custom_range(client, station, start_day, end_day)
+        with app_db.app.app_context():
+            expected = baseline_range_scan(station['station_id'], start_day, end_day)
+        # score 为范围内提交获得的积分，completed_tasks 为范围内的提交次数
+        assert {row['nickname']: (row['score'], row['completed_tasks']) for row in rows} == expected
+
+    # 语义变化：原来的查询按范围内的每条提交各计一次参与记录的全部积分，范围外获得的积分也会计入。
+    # 小明在任务A上第一天的提交被标记异常、第二天的提交得10分，焦点任务第二天得10分
+    second = first + timedelta(days=1)
+    with app_db.app.app_context():
+        assert baseline_custom_range(station['station_id'], first, first)['小明'] == 10
+        assert baseline_custom_range(station['station_id'], first, second)['小明'] == 30
+    assert {row['nickname']: row['score'] for row in custom_range(client, station, first, first)}['小明'] == 0
+    assert {row['nickname']: row['score'] for row in custom_range(client, station, first, second)}['小明'] == 20
+
+
+def test_rebuild_matches_incremental_rollups(app_db, client, station, create_task, submit, clock):
+    build_history(client, station, create_task, submit, clock)
+
+    def rollup_rows():
+        with app_db.app.app_context():
+            return sorted((row.day, row.nickname, row.points, row.submission_count)
+                          for row in DailyRollup.query.filter_by(station_id=station['station_id']))
+
+    incremental = rollup_rows()
+    with app_db.app.app_context():
+        app_db.rebuild_daily_rollups(station['station_id'])
+        db.session.commit()
+    assert rollup_rows() == incremental
@@ -0,0 +1,39 @@
+def get_json(client, url):
+    response = client.get(url)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def assert_matches_separate_endpoints(client, code, nickname):
+    """启动数据应与原来依次调用的各接口结果一致"""
+    bootstrap = get_json(client, f'/api/fan/bootstrap?invite_code={code}&nickname={nickname}')
+    assert bootstrap['tasks'] == get_json(client, f'/api/fan/tasks?invite_code={code}')
+    assert bootstrap['focus_status'] == get_json(client, f'/api/station/invite-codes/{code}/focus-status')
+    assert bootstrap['encouragement'] == get_json(client, f'/api/fan/global-encouragement-settings?invite_code={code}')
+
+    for task in bootstrap['tasks']:
+        detail = get_json(client, f"/api/fan/tasks/{task['id']}?invite_code={code}&nickname={nickname}")
+        participation = bootstrap['participation'].get(task['id'])
+        assert detail['has_participated'] == (participation is not None)
+        assert detail['submission_count'] == (participation['submission_count'] if participation else 0)
+    return bootstrap
+
+
+def test_bootstrap_matches_separate_endpoints(client, station, create_task, submit, clock):
+    code = station['invite_code']
+    assert_matches_separate_endpoints(client, code, '小明')
+
+    focus_id = create_task('焦点任务', is_focus_task=True)
+    plain_id = create_task('普通任务')
+    create_task('没人提交的任务')
+    for task_id, nickname in [(focus_id, '小明'), (focus_id, '小明'), (plain_id, '小红')]:
+        assert submit(task_id, nickname).status_code == 200
+    bootstrap = assert_matches_separate_endpoints(client, code, '小明')
+    assert bootstrap['focus_status']['focus_task']['id'] == focus_id
+    assert set(bootstrap['participation']) == {focus_id}
+
+    # 焦点任务结算后从列表和焦点状态中同时消失
+    response = client.post(f'/api/station/tasks/{focus_id}/settle', headers=station['headers'])
+    assert response.status_code == 200
+    bootstrap = assert_matches_separate_endpoints(client, code, '小红')
+    assert focus_id not in [task['id'] for task in bootstrap['tasks']]
@@ -0,0 +1,95 @@
+from models import db, InviteCode
+
+
+def sync(client, code, cursor, nickname=None):
+    url = f'/api/fan/tasks?invite_code={code}&since={cursor}'
+    if nickname:
+        url += f'&nickname={nickname}'
+    response = client.get(url)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def add_invite_code(app_db, station, code):
+    with app_db.app.app_context():
+        invite_code = InviteCode(code=code, station_id=station['station_id'])
+        db.session.add(invite_code)
+        db.session.commit()
+        return invite_code.id
+
+
+def test_task_moved_to_other_invite_code_is_reported_as_removed(app_db, client, station, create_task):
+    other_code_id = add_invite_code(app_db, station, 'OTHERCODE')
+    task_id = create_task('迁移的任务')
+    kept_id = create_task('留下的任务')
+    cursor = sync(client, station['invite_code'], '0')['cursor']
+    other_cursor = sync(client, 'OTHERCODE', '0')['cursor']
+
+    response = client.put(f'/api/station/tasks/{task_id}', json={'invite_code_id': other_code_id},
+                          headers=station['headers'])
+    assert response.status_code == 200
+
+    delta = sync(client, station['invite_code'], cursor)
+    assert delta['full'] is False
+    assert {'id': task_id, 'status': 'removed'} in delta['tasks']
+    assert {'id': kept_id, 'status': 'removed'} not in delta['tasks']
+    assert [task['id'] for task in sync(client, 'OTHERCODE', other_cursor)['tasks']] == [task_id]
+
+    # 移回原邀请码后按普通任务返回，不再报告移除
+    cursor = delta['cursor']
+    client.put(f'/api/station/tasks/{task_id}', json={'invite_code_id': station['invite_code_id']},
+               headers=station['headers'])
+    tasks = sync(client, station['invite_code'], cursor)['tasks']
+    assert [task['status'] for task in tasks if task['id'] == task_id] == ['active']
+
+
+def apply_delta(tasks, participation, delta):
+    """按粉丝端的规则合并增量：按任务ID覆盖，status不为active的任务移除，移到其他邀请码的任务同时删除参与记录"""
+    participation.update(delta['participation'])
+    for task in delta['tasks']:
+        tasks.pop(task['id'], None)
+        if task['status'] == 'active':
+            tasks[task['id']] = task
+        elif task['status'] == 'removed':
+            participation.pop(task['id'], None)
+    return delta['cursor']
+
+
+def test_merged_deltas_match_full_sync(app_db, client, station, create_task, submit, monkeypatch):
+    # 关闭游标回退，使每次增量只包含上一次同步之后的变化
+    monkeypatch.setitem(app_db.app.config, 'SYNC_CURSOR_OVERLAP', 0)
+    code = station['invite_code']
+    other_code_id = add_invite_code(app_db, station, 'OTHERCODE')
+    focus_id = create_task('焦点任务', is_focus_task=True)
+    plain_id = create_task('普通任务')
+
+    full = sync(client, code, '0', nickname='小明')
+    tasks = {task['id']: task for task in full['tasks']}
+    participation = dict(full['participation'])
+    cursor = full['cursor']
+
+    submission_ids = []
+    changes = [
+        lambda: submission_ids.append(submit(focus_id, '小明').get_json()['submission_id']),
+        lambda: submit(plain_id, '小红'),
+        lambda: create_task('新任务'),
+        lambda: client.put(f'/api/station/tasks/{plain_id}', json={'title': '改名的任务'}, headers=station['headers']),
+        lambda: client.put(f'/api/station/tasks/{focus_id}', json={'is_focus_task': False}, headers=station['headers']),
+        lambda: submit(plain_id, '小明'),
+        lambda: client.post(f'/api/station/submissions/{submission_ids[0]}/mark-abnormal',
+                            json={'reason': '重复'}, headers=station['headers']),
+        lambda: client.put(f'/api/station/tasks/{plain_id}', json={'invite_code_id': other_code_id},
+                           headers=station['headers']),
+        lambda: client.post(f'/api/station/tasks/{focus_id}/settle', headers=station['headers']),
+        lambda: client.put(f'/api/station/tasks/{plain_id}', json={'invite_code_id': station['invite_code_id']},
+                           headers=station['headers']),
+    ]
+    for change in changes:
+        change()
+        cursor = apply_delta(tasks, participation, sync(client, code, cursor, nickname='小明'))
+
+        # 合并后的结果与全量同步和普通任务列表一致
+        full = sync(client, code, '0', nickname='小明')
+        assert tasks == {task['id']: task for task in full['tasks']}
+        assert participation == full['participation']
+        assert sorted(tasks) == sorted(task['id'] for task in client.get(f'/api/fan/tasks?invite_code={code}').get_json())
@@ -0,0 +1,62 @@
+from sqlalchemy import func
+
+from models import db, InviteCode, Participant, Task
+
+
+def baseline_fan_tasks(code):
+    """原来的粉丝端任务列表：逐个任务查询总提交次数，返回 {任务ID: 任务字典}"""
+    invite_code = InviteCode.query.filter_by(code=code, status='active').first()
+    tasks = {}
+    for task in Task.query.filter_by(invite_code_id=invite_code.id, status='active').all():
+        submission_count = db.session.query(func.sum(Participant.submission_count)).filter(
+            Participant.task_id == task.id
+        ).scalar() or 0
+        tasks[task.id] = {
+            'id': task.id,
+            'title': task.title,
+            'description': task.description,
+            'points': task.points,
+            'due_date': task.due_date.isoformat() if task.due_date else None,
+            'is_focus_task': task.is_focus_task,
+            'flame_mode_enabled': task.flame_mode_enabled,
+            'created_at': task.created_at.isoformat() if task.created_at else None,
+            'bonus_points': task.bonus_points,
+            'submission_count': submission_count
+        }
+    return tasks
+
+
+def assert_matches_baseline(app_db, client, code):
+    response = client.get(f'/api/fan/tasks?invite_code={code}')
+    assert response.status_code == 200
+    tasks = response.get_json()
+    with app_db.app.app_context():
+        expected = baseline_fan_tasks(code)
+    assert {task['id']: {key: task[key] for key in expected.get(task['id'], task)} for task in tasks} == expected
+    assert [task['created_at'] for task in tasks] == sorted(task['created_at'] for task in tasks)
+
+
+def test_fan_task_list_matches_baseline_query(app_db, client, station, create_task, submit):
+    code = station['invite_code']
+    focus_id = create_task('焦点任务', is_focus_task=True)
+    plain_id = create_task('普通任务')
+    settled_id = create_task('待结算任务')
+    create_task('没人提交的任务')
+    assert_matches_baseline(app_db, client, code)
+
+    for task_id, nickname in [(focus_id, '小明'), (focus_id, '小明'), (focus_id, '小红'), (plain_id, '小红'),
+                              (settled_id, '小刚')]:
+        assert submit(task_id, nickname).status_code == 200
+    assert_matches_baseline(app_db, client, code)
+
+    # 列表缓存后，新提交、扣分、编辑和结算都要反映到下一次请求中
+    submission_id = submit(plain_id, '小李').get_json()['submission_id']
+    assert_matches_baseline(app_db, client, code)
+    client.post(f'/api/station/submissions/{submission_id}/mark-abnormal', json={'reason': '重复'},
+                headers=station['headers'])
+    assert_matches_baseline(app_db, client, code)
+    client.put(f'/api/station/tasks/{plain_id}', json={'title': '改名的任务', 'points': 20},
+               headers=station['headers'])
+    assert_matches_baseline(app_db, client, code)
+    client.post(f'/api/station/tasks/{settled_id}/settle', headers=station['headers'])
+    assert_matches_baseline(app_db, client, code)
@@ -0,0 +1,28 @@
+from models import InviteCode
+
+
+def focus_status(client, station):
+    response = client.get(f"/api/station/invite-codes/{station['invite_code']}/focus-status")
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_settling_focus_task_clears_focus_pointer(app_db, client, station, create_task, submit):
+    task_id = create_task('焦点任务', is_focus_task=True)
+    assert submit(task_id, '小明').status_code == 200
+    status = focus_status(client, station)
+    assert status['has_focus_task'] is True
+    assert status['focus_task']['id'] == task_id
+
+    response = client.post(f'/api/station/tasks/{task_id}/settle', headers=station['headers'])
+    assert response.status_code == 200
+    assert response.get_json()['task']['status'] == 'completed'
+
+    with app_db.app.app_context():
+        assert InviteCode.query.get(station['invite_code_id']).focus_task_id is None
+    status = focus_status(client, station)
+    assert status['has_focus_task'] is False
+    assert status.get('focus_task') is None
+
+    # 结算后可以设置新的焦点任务
+    assert create_task('新焦点任务', is_focus_task=True)
@@ -0,0 +1,48 @@
+from models import InviteCode
+
+
+def baseline_resolve(code):
+    """原来每个粉丝端请求执行的邀请码查询"""
+    invite_code = InviteCode.query.filter_by(code=code, status='active').first()
+    return invite_code.id if invite_code else None
+
+
+def assert_matches_baseline(app_db, codes):
+    with app_db.app.app_context():
+        for code in codes:
+            resolved = app_db.resolve_invite_code(code)
+            assert (resolved.id if resolved else None) == baseline_resolve(code), code
+
+
+def test_resolved_invite_codes_match_baseline_query(app_db, client, station):
+    codes = [station['invite_code'], 'NEWCODE1', 'MISSING1']
+    assert_matches_baseline(app_db, codes)
+
+    # 新建邀请码后立即可用
+    response = client.post('/api/station/invite-codes', json={
+        'station_id': station['station_id'], 'description': '新邀请码', 'custom_code': 'NEWCODE1'
+    }, headers=station['headers'])
+    assert response.status_code == 201
+    new_code_id = response.get_json()['id']
+    assert_matches_baseline(app_db, codes)
+    assert client.get('/api/fan/tasks?invite_code=NEWCODE1').status_code == 200
+
+    # 停用后粉丝端立即被拒绝，重新启用后恢复
+    response = client.put(f'/api/station/invite-codes/{new_code_id}', json={'status': 'inactive'},
+                          headers=station['headers'])
+    assert response.status_code == 200
+    assert_matches_baseline(app_db, codes)
+    assert client.get('/api/fan/tasks?invite_code=NEWCODE1').status_code == 404
+
+    client.put(f'/api/station/invite-codes/{new_code_id}', json={'status': 'active'}, headers=station['headers'])
+    assert_matches_baseline(app_db, codes)
+    assert client.get('/api/fan/tasks?invite_code=NEWCODE1').status_code == 200
+
+
+def test_repeated_fan_requests_hit_invite_code_cache(app_db, client, station):
+    before = app_db.invite_code_cache.stats()
+    for _ in range(5):
+        assert client.get(f"/api/fan/tasks?invite_code={station['invite_code']}").status_code == 200
+    after = client.get('/api/station/metrics', headers=station['headers']).get_json()['invite_code_cache']
+    assert after['misses'] - before['misses'] == 1
+    assert after['hits'] - before['hits'] >= 4
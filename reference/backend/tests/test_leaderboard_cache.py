@@ -0,0 +1,157 @@
+from datetime import datetime
+
+from models import db, CacheVersion, InviteCode, Participant, Station, StationStanding, Task
+
+
+def bump_from_other_worker(app_db, station_id, nickname, points):
+    """模拟另一个进程的写入：直接修改数据库并递增共享版本号，不经过本进程的缓存"""
+    with app_db.app.app_context():
+        StationStanding.query.filter_by(station_id=station_id, nickname=nickname).update({'total_points': points})
+        version = db.session.get(CacheVersion, station_id)
+        version.version += 1
+        version.updated_at = datetime.utcnow()
+        db.session.commit()
+
+
+def test_writes_from_other_workers_invalidate_cache_and_etag(app_db, client, station, create_task, submit):
+    task_id = create_task(points=10)
+    assert submit(task_id, '小明').status_code == 200
+    url = f"/api/fan/leaderboard?invite_code={station['invite_code']}&type=overall"
+
+    first = client.get(url)
+    etag = first.headers['ETag']
+    assert first.get_json()[0]['points'] == 10
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    bump_from_other_worker(app_db, station['station_id'], '小明', 99)
+
+    refreshed = client.get(url, headers={'If-None-Match': etag})
+    assert refreshed.status_code == 200
+    assert refreshed.headers['ETag'] != etag
+    assert refreshed.get_json()[0]['points'] == 99
+
+
+
+def test_task_board_reflects_writes_from_other_workers(app_db, client, station, create_task, submit):
+    task_id = create_task(points=10)
+    assert submit(task_id, '小明').status_code == 200
+    url = f"/api/fan/leaderboard/{task_id}?invite_code={station['invite_code']}"
+    first = client.get(url)
+    assert [row['nickname'] for row in first.get_json()] == ['小明']
+
+    # 另一个进程保存了新的参与记录并递增站点版本号，本进程的排名引擎中仍是旧的排行榜
+    with app_db.app.app_context():
+        db.session.add(Participant(task_id=task_id, name='小红', points_earned=50, submission_count=1,
+                                   last_scored_at=datetime.utcnow()))
+        version = db.session.get(CacheVersion, station['station_id'])
+        version.version += 1
+        version.updated_at = datetime.utcnow()
+        db.session.commit()
+
+    refreshed = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+    assert refreshed.status_code == 200
+    assert [(row['nickname'], row['points']) for row in refreshed.get_json()] == [('小红', 50), ('小明', 10)]
+
+def test_fan_specific_requests_share_one_cache_entry(app_db, client, station, create_task, submit):
+    task_id = create_task(points=10)
+    for nickname in ('小明', '小红', '小刚'):
+        assert submit(task_id, nickname).status_code == 200
+    code = station['invite_code']
+
+    client.get(f'/api/fan/leaderboard?invite_code={code}&type=overall&fan_nickname=小明')
+    entries = app_db.leaderboard_cache.stats()['entries']
+    response = client.get(f'/api/fan/leaderboard?invite_code={code}&type=overall&fan_nickname=小红')
+    assert app_db.leaderboard_cache.stats()['entries'] == entries
+    assert response.get_json()['user_info']['nickname'] == '小红'
+    assert len(response.get_json()['leaderboard']) == 3
+
+    compact = client.get(f'/api/fan/leaderboard?invite_code={code}&type=overall&format=compact&fan_nickname=无名').get_json()
+    assert compact['nickname'] and compact['user_info'] == {'nickname': '无名', 'points': 0, 'completed_tasks': 0, 'rank': 4}
+
+    task_board = client.get(f'/api/fan/leaderboard/{task_id}?invite_code={code}&fan_nickname=小刚').get_json()
+    assert task_board['user_info']['nickname'] == '小刚'
+    entries = app_db.leaderboard_cache.stats()['entries']
+    around = client.get(f'/api/fan/leaderboard/{task_id}?invite_code={code}&around=小红&radius=1').get_json()
+    assert [row['nickname'] for row in around] == [row['nickname'] for row in task_board['leaderboard']]
+    assert app_db.leaderboard_cache.stats()['entries'] == entries
+
+
+def test_etag_is_the_same_on_every_worker(app_db, client, station, create_task, submit, monkeypatch):
+    from cache import VersionedResponseCache
+
+    task_id = create_task(points=10)
+    assert submit(task_id, '小明').status_code == 200
+    url = f"/api/fan/leaderboard/{task_id}?invite_code={station['invite_code']}"
+    first = client.get(url)
+    encouragement_url = f"/api/fan/encouragement?task_id={task_id}&invite_code={station['invite_code']}"
+    encouragement = client.get(encouragement_url)
+
+    # 另一个进程：稍后启动、进程内缓存为空，版本号从数据库读取
+    other_worker_cache = VersionedResponseCache(
+        load_version=app_db.load_scope_version,
+        bump_version=app_db.bump_scope_version
+    )
+    other_worker_cache.started_at += 3600
+    monkeypatch.setattr(app_db, 'leaderboard_cache', other_worker_cache)
+    revalidated = client.get(url, headers={
+        'If-None-Match': first.headers['ETag'],
+        'If-Modified-Since': first.headers['Last-Modified']
+    })
+    assert revalidated.status_code == 304
+    rebuilt = client.get(url)
+    assert rebuilt.headers['ETag'] == first.headers['ETag']
+    assert rebuilt.headers['Last-Modified'] == first.headers['Last-Modified']
+
+    bump_from_other_worker(app_db, station['station_id'], '小明', 10)
+    assert client.get(url, headers={'If-None-Match': first.headers['ETag']}).status_code == 200
+
+    # 从未写入过的作用域（任务级、全局设置）在各进程上的修改时间也相同
+    assert encouragement.headers['Last-Modified'] == client.get(encouragement_url).headers['Last-Modified']
+
+
+def test_encouragement_cache_survives_submissions(app_db, client, station, create_task, submit):
+    task_id = create_task()
+    url = f"/api/fan/encouragement?task_id={task_id}&invite_code={station['invite_code']}"
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    # 粉丝提交只递增站点版本号，鼓励内容的缓存和ETag不受影响
+    assert submit(task_id, '小明').status_code == 200
+    hits = app_db.leaderboard_cache.hits
+    assert client.get(url).get_json() == first.get_json()
+    assert app_db.leaderboard_cache.hits == hits + 1
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    # 编辑任务后重新生成
+    response = client.put(f'/api/station/tasks/{task_id}', json={'title': '新标题'}, headers=station['headers'])
+    assert response.status_code == 200
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_encouragement_rejects_task_of_other_station(app_db, client, station, create_task):
+    task_id = create_task()
+    with app_db.app.app_context():
+        other = Station(name='其他站', owner_id=station['user_id'])
+        db.session.add(other)
+        db.session.commit()
+        db.session.add(InviteCode(code='OTHERCODE', station_id=other.id))
+        db.session.commit()
+    response = client.get(f"/api/fan/encouragement?task_id={task_id}&invite_code=OTHERCODE")
+    assert response.status_code == 403
+
+
+def test_failed_version_bump_does_not_fail_saved_task_writes(app_db, client, station, create_task, monkeypatch):
+    task_id = create_task()
+
+    def broken_bump(scope):
+        raise RuntimeError('database is locked')
+    monkeypatch.setattr(app_db, 'bump_scope_version', broken_bump)
+
+    response = client.put(f'/api/station/tasks/{task_id}', json={'title': '新标题'}, headers=station['headers'])
+    assert response.status_code == 200
+    response = client.post(f'/api/station/tasks/{task_id}/settle', headers=station['headers'])
+    assert response.status_code == 200
+    with app_db.app.app_context():
+        task = db.session.get(Task, task_id)
+        assert (task.title, task.status) == ('新标题', 'completed')
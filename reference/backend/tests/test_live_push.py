@@ -0,0 +1,56 @@
+import json
+
+from models import Submission
+
+
+def read_event(chunks):
+    """读取下一条非心跳的SSE消息，返回 (事件名, 数据)"""
+    for chunk in chunks:
+        text = chunk.decode('utf-8') if isinstance(chunk, bytes) else chunk
+        if text.startswith(':') or text.startswith('retry:'):
+            continue
+        fields = dict(line.split(': ', 1) for line in text.strip().split('\n'))
+        return fields.get('event'), json.loads(fields['data'])
+    return None, None
+
+
+def test_stream_receives_rank_delta(app_db, client, station, create_task, submit, monkeypatch):
+    monkeypatch.setitem(app_db.app.config, 'LIVE_PUSH_HEARTBEAT', 1)
+    task_id = create_task(points=10)
+    assert submit(task_id, '小红').status_code == 200
+
+    response = client.get(f"/api/fan/leaderboard/stream?invite_code={station['invite_code']}", buffered=False)
+    try:
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        assert app_db.leaderboard_hub.has_subscribers(f"station:{station['station_id']}")
+
+        assert submit(task_id, '小明').status_code == 200
+        event, data = read_event(iter(response.response))
+        assert event == 'rank'
+        assert data['nickname'] == '小明'
+        assert data['points'] == 10
+        assert data['points_delta'] == 10
+        assert data['rank'] == 1
+        assert data['has_focus_task_completed'] is False
+    finally:
+        response.close()
+    assert not app_db.leaderboard_hub.has_subscribers(f"station:{station['station_id']}")
+
+
+def test_stream_rejects_unknown_invite_code(client, station):
+    assert client.get('/api/fan/leaderboard/stream?invite_code=NOPE').status_code == 403
+
+
+def test_post_commit_failure_does_not_fail_saved_submission(app_db, client, station, create_task, submit, monkeypatch):
+    task_id = create_task(points=10)
+
+    def broken_publish(*args, **kwargs):
+        raise RuntimeError('database is locked')
+    monkeypatch.setattr(app_db, 'publish_rank_delta', broken_publish)
+
+    response = submit(task_id, '小明')
+    assert response.status_code == 200
+    assert response.get_json()['points'] == 10
+    with app_db.app.app_context():
+        assert Submission.query.count() == 1
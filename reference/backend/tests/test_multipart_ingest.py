@@ -0,0 +1,98 @@
+import io
+import os
+
+import pytest
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from conftest import PNG_BYTES
+from multipart_ingest import ingest_multipart
+
+BOUNDARY = b'----test-boundary'
+
+
+def encode(fields=(), files=()):
+    """编码 multipart/form-data 请求体，files 为 (字段名, 文件名, 内容)"""
+    parts = []
+    for name, value in fields:
+        parts.append(
+            b'--' + BOUNDARY + b'\r\n'
+            + f'Content-Disposition: form-data; name="{name}"\r\n\r\n'.encode('utf-8')
+            + value.encode('utf-8') + b'\r\n'
+        )
+    for name, filename, content in files:
+        parts.append(
+            b'--' + BOUNDARY + b'\r\n'
+            + f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'.encode('utf-8')
+            + b'Content-Type: application/octet-stream\r\n\r\n'
+            + content + b'\r\n'
+        )
+    return b''.join(parts) + b'--' + BOUNDARY + b'--\r\n'
+
+
+def ingest(body, staging_dir, **limits):
+    options = {'file_fields': ('images',), 'max_file_size': 1024, 'max_request_size': 64 * 1024, 'max_files': 3,
+               'chunk_size': 64}
+    options.update(limits)
+    return ingest_multipart(io.BytesIO(body), BOUNDARY, str(staging_dir), **options)
+
+
+def test_stages_images_and_collects_fields(tmp_path):
+    body = encode([('nickname', '小明'), ('comment', '好')],
+                  [('images', 'a.png', PNG_BYTES), ('other', 'b.png', PNG_BYTES)])
+    result = ingest(body, tmp_path)
+    assert result.form.to_dict() == {'nickname': '小明', 'comment': '好'}
+    assert len(result.staged_files) == 1 and result.staged_files[0].endswith('.png')
+    with open(result.staged_files[0], 'rb') as f:
+        assert f.read() == PNG_BYTES
+    assert result.rejected == []
+    assert result.bytes_read == len(body)
+
+
+def test_any_field_accepted_without_field_list(tmp_path):
+    body = encode(files=[('file', 'a.png', PNG_BYTES), ('image', 'b.png', PNG_BYTES)])
+    assert ingest(body, tmp_path, file_fields=('images',)).staged_files == []
+    assert len(ingest(body, tmp_path, file_fields=None).staged_files) == 2
+
+
+def test_rejects_oversize_empty_and_non_image_files(tmp_path):
+    body = encode(files=[
+        ('images', 'big.png', PNG_BYTES + b'\0' * 2048),
+        ('images', 'note.txt', b'just some text here'),
+        ('images', 'empty.png', b''),
+        ('images', 'ok.png', PNG_BYTES)
+    ])
+    result = ingest(body, tmp_path, max_files=4)
+    assert result.rejected == [
+        ('big.png', '文件大小超过限制'),
+        ('note.txt', '不是支持的图片格式'),
+        ('empty.png', '文件为空')
+    ]
+    assert os.listdir(tmp_path) == [os.path.basename(result.staged_files[0])]
+
+
+def test_files_beyond_limit_are_rejected(tmp_path):
+    body = encode(files=[('images', f'{i}.png', PNG_BYTES) for i in range(4)])
+    result = ingest(body, tmp_path, max_files=2)
+    assert len(result.staged_files) == 2
+    assert result.rejected == [('2.png', '超出图片数量限制'), ('3.png', '超出图片数量限制')]
+
+
+def test_request_size_limit_discards_staged_files(tmp_path):
+    body = encode(files=[('images', f'{i}.png', PNG_BYTES) for i in range(3)])
+    with pytest.raises(RequestEntityTooLarge):
+        ingest(body, tmp_path, max_request_size=len(body) - 1)
+    assert os.listdir(tmp_path) == []
+
+
+def test_field_size_limit(tmp_path):
+    body = encode([('comment', 'x' * 200)])
+    with pytest.raises(RequestEntityTooLarge):
+        ingest(body, tmp_path, max_field_size=100)
+    assert ingest(body, tmp_path, max_field_size=200).form['comment'] == 'x' * 200
+
+
+def test_truncated_body_raises_and_cleans_up(tmp_path):
+    body = encode(files=[('images', 'a.png', PNG_BYTES), ('images', 'b.png', PNG_BYTES)])
+    with pytest.raises(ValueError):
+        ingest(body[:-60], tmp_path)
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,66 @@
+import pytest
+
+import ranking
+from ranking import RankingEngine, TaskRanking
+
+
+@pytest.fixture(params=['sortedcontainers', 'list'])
+def make_ranking(request, monkeypatch):
+    """分别使用SortedList和有序列表两种实现"""
+    if request.param == 'list':
+        monkeypatch.setattr(ranking, 'SortedList', None)
+    elif ranking.SortedList is None:
+        pytest.skip('未安装sortedcontainers')
+    return lambda rows: TaskRanking('task', rows)
+
+
+def test_ties_share_rank(make_ranking):
+    board = make_ranking([('a', 30, 1, 0), ('b', 20, 1, 1), ('c', 20, 1, 2), ('d', 10, 1, 0)])
+    assert board.top() == [(1, 'a', 30, 1), (2, 'b', 20, 1), (2, 'c', 20, 1), (4, 'd', 10, 1)]
+    assert board.rank_of('c') == (2, 20, 1)
+    assert board.rank_of('missing') is None
+
+
+def test_update_moves_entry(make_ranking):
+    board = make_ranking([('a', 30, 1, 0), ('b', 20, 1, 0), ('c', 10, 1, 0)])
+    board.update('c', 40, 2, 5)
+    board.update('e', 15, 1, 0)
+    assert [nickname for _, nickname, _, _ in board.top()] == ['c', 'a', 'b', 'e']
+    assert board.rank_of('c') == (1, 40, 2)
+    assert len(board) == 4
+
+
+def test_top_and_around_windows(make_ranking):
+    board = make_ranking([(f'fan{i:02d}', 100 - i, 1, 0) for i in range(20)])
+    assert [nickname for _, nickname, _, _ in board.top(3)] == ['fan00', 'fan01', 'fan02']
+    assert board.around_window('fan10', 2) == (8, 13)
+    assert [rank for rank, _, _, _ in board.around('fan10', 2)] == [9, 10, 11, 12, 13]
+    assert board.around_window('missing', 3) == (17, 20)
+    assert board.slice(18, 50) == [(19, 'fan18', 82, 1), (20, 'fan19', 81, 1)]
+
+
+def test_engine_rebuilds_when_shared_version_changes():
+    engine = RankingEngine(max_age=3600)
+    rows = [('a', 10, 1, 0)]
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return list(rows)
+
+    assert engine.get('task', loader, version=1).top() == [(1, 'a', 10, 1)]
+    # 本进程的写入：从上一个版本前进，增量更新而不重新加载
+    rows.append(('b', 20, 1, 0))
+    engine.record('task', 'b', 20, 1, 0, version=2)
+    assert engine.get('task', loader, version=2).rank_of('b') == (1, 20, 1)
+    assert len(loads) == 1
+
+    # 其他进程的写入使版本号跳过了本进程的记录，排行榜被丢弃并重新加载
+    rows.append(('c', 30, 1, 0))
+    engine.record('task', 'a', 10, 1, 0, version=4)
+    assert engine.get('task', loader, version=4).rank_of('c') == (1, 30, 1)
+    assert len(loads) == 2
+
+    rows.append(('d', 40, 1, 0))
+    assert engine.get('task', loader, version=5).rank_of('d') == (1, 40, 1)
+    assert len(loads) == 3
@@ -0,0 +1,69 @@
+from models import StationStanding
+
+
+def overall_board(client, station):
+    response = client.get(f"/api/fan/leaderboard?invite_code={station['invite_code']}&type=overall")
+    assert response.status_code == 200
+    return {row['nickname']: row for row in response.get_json()}
+
+
+def standing_rows(app_db, station_id):
+    with app_db.app.app_context():
+        return sorted(
+            (row.nickname, row.total_points, row.task_count, row.focus_points,
+             row.focus_task_count, bool(row.has_focus_task_completed))
+            for row in StationStanding.query.filter_by(station_id=station_id)
+        )
+
+
+def test_focus_completed_matches_task_board_after_abnormal_mark(app_db, client, station, create_task, submit):
+    focus_task = create_task('焦点任务', points=10, is_focus_task=True)
+    response = submit(focus_task, '小明')
+    assert response.status_code == 200
+    submission_id = response.get_json()['submission_id']
+    assert overall_board(client, station)['小明']['has_focus_task_completed'] is True
+
+    response = client.post(f'/api/station/submissions/{submission_id}/mark-abnormal',
+                           json={'reason': '重复截图'}, headers=station['headers'])
+    assert response.status_code == 200
+
+    # 与原来的判定一致：在焦点任务上提交过即算完成，标记异常只扣除积分；
+    # 总榜与任务排行榜给出相同的结果
+    row = overall_board(client, station)['小明']
+    assert row['points'] == 0
+    assert row['has_focus_task_completed'] is True
+    task_board = client.get(f"/api/fan/leaderboard/{focus_task}?invite_code={station['invite_code']}").get_json()
+    assert task_board[0]['has_focus_task_completed'] is True
+
+    # 增量维护的结果与从参与记录重建的结果一致
+    incremental = standing_rows(app_db, station['station_id'])
+    with app_db.app.app_context():
+        app_db.rebuild_station_standings(station['station_id'])
+        app_db.db.session.commit()
+    assert standing_rows(app_db, station['station_id']) == incremental
+
+
+def test_other_valid_focus_submission_keeps_focus_completed(app_db, client, station, create_task, submit):
+    focus_task = create_task('焦点任务', is_focus_task=True)
+    first_submission = submit(focus_task, '小红').get_json()['submission_id']
+    assert submit(focus_task, '小红').status_code == 200
+
+    response = client.post(f'/api/station/submissions/{first_submission}/mark-abnormal',
+                           json={'reason': '无效'}, headers=station['headers'])
+    assert response.status_code == 200
+    assert overall_board(client, station)['小红']['has_focus_task_completed'] is True
+
+
+def test_compact_overall_board_returns_booleans(app_db, client, station, create_task, submit):
+    focus_task = create_task('焦点任务', points=20, is_focus_task=True)
+    other_task = create_task('普通任务', points=10)
+    assert submit(focus_task, '小明').status_code == 200
+    assert submit(other_task, '小红').status_code == 200
+
+    response = client.get(f"/api/fan/leaderboard?invite_code={station['invite_code']}&type=overall&format=compact")
+    assert response.status_code == 200
+    payload = response.get_json()
+    assert payload['nickname'] == ['小明', '小红']
+    assert payload['has_focus_task_completed'] == [True, False]
+    assert all(type(value) is bool for value in payload['has_focus_task_completed'])
+    assert [row['has_focus_task_completed'] for row in overall_board(client, station).values()] == [True, False]
@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+from conftest import PNG_BYTES
+from storage import LocalStorage, migrate_local_uploads
+
+
+def write_file(path, content=PNG_BYTES):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+@pytest.fixture
+def upload_root(tmp_path):
+    """旧的平铺上传目录：一个提交图片、一个鼓励图片、暂存目录和写了一半的临时文件"""
+    root = tmp_path / 'uploads'
+    write_file(str(root / 'task_submissions' / 'a.png'))
+    write_file(str(root / 'encouragement' / 'b.png'), b'encouragement')
+    write_file(str(root / 'staging' / 'pending.png'))
+    write_file(str(root / 'task_submissions' / 'c.png.1234.tmp'))
+    return str(root)
+
+
+def test_migrates_flat_files_to_sharded_paths(upload_root):
+    storage = LocalStorage(upload_root)
+    assert migrate_local_uploads(upload_root, storage) == (2, 0)
+
+    target = storage.local_path('task_submissions/a.png')
+    assert target != os.path.join(upload_root, 'task_submissions', 'a.png')
+    assert os.path.isfile(target)
+    assert not os.path.exists(os.path.join(upload_root, 'task_submissions', 'a.png'))
+    with open(storage.local_path('encouragement/b.png'), 'rb') as f:
+        assert f.read() == b'encouragement'
+
+    # 暂存目录和临时文件不迁移，再次运行时已迁移的文件只计为跳过
+    assert os.path.isfile(os.path.join(upload_root, 'staging', 'pending.png'))
+    assert os.path.isfile(os.path.join(upload_root, 'task_submissions', 'c.png.1234.tmp'))
+    assert migrate_local_uploads(upload_root, storage) == (0, 2)
+
+
+def test_dry_run_and_keep_local(upload_root):
+    storage = LocalStorage(upload_root)
+    flat_path = os.path.join(upload_root, 'task_submissions', 'a.png')
+
+    assert migrate_local_uploads(upload_root, storage, dry_run=True) == (2, 0)
+    assert os.path.isfile(flat_path)
+    assert not storage.exists('task_submissions/a.png')
+
+    migrate_local_uploads(upload_root, storage, keep_local=True)
+    assert os.path.isfile(flat_path)
+    assert storage.exists('task_submissions/a.png')
+
+
+def test_migrated_files_are_still_served(app_db, client):
+    upload_root = app_db.app.config['UPLOAD_FOLDER']
+    write_file(os.path.join(upload_root, 'task_submissions', 'old.png'))
+
+    runner = app_db.app.test_cli_runner()
+    result = runner.invoke(args=['migrate-uploads'])
+    assert result.exit_code == 0, result.output
+    assert not os.path.exists(os.path.join(upload_root, 'task_submissions', 'old.png'))
+
+    response = client.get('/uploads/task_submissions/old.png')
+    assert response.status_code == 200
+    assert response.data == PNG_BYTES
+    response.close()
+    assert client.get('/uploads/task_submissions/missing.png').status_code == 404
@@ -0,0 +1,118 @@
+import io
+import os
+
+from conftest import PNG_BYTES
+from image_pipeline import ImageWorkerPool
+from models import db, Participant, Submission, UploadObject
+
+
+def load_submission(app_db, submission_id):
+    with app_db.app.app_context():
+        submission = db.session.get(Submission, submission_id)
+        return submission.image_status, submission.image_urls
+
+
+def stage_file(app_db, name, content=PNG_BYTES):
+    staging = app_db.app.config['IMAGE_STAGING_FOLDER']
+    os.makedirs(staging, exist_ok=True)
+    path = os.path.join(staging, name).replace('\\', '/')
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+
+def add_pending_submission(app_db, task_id, image_urls):
+    with app_db.app.app_context():
+        participant = Participant(task_id=task_id, name='小明', submission_count=1)
+        db.session.add(participant)
+        db.session.flush()
+        submission = Submission(participant_id=participant.id, image_urls=image_urls, image_status='pending')
+        db.session.add(submission)
+        db.session.commit()
+        return submission.id
+
+
+def test_submit_archives_images_by_content_hash(app_db, client, station, create_task, submit):
+    task_id = create_task()
+    first = submit(task_id, '小明').get_json()
+    second = submit(task_id, '小红', images=[(io.BytesIO(PNG_BYTES), 'copy.png')]).get_json()
+
+    status, urls = load_submission(app_db, first['submission_id'])
+    assert status == 'ready'
+    assert load_submission(app_db, second['submission_id']) == (status, urls)
+    assert len(urls) == 1 and '/staging/' not in urls[0]
+
+    # 相同内容只保存一份，按引用计数记录
+    with app_db.app.app_context():
+        objects = UploadObject.query.all()
+        assert [(row.path, row.ref_count) for row in objects] == [(urls[0], 2)]
+    assert os.listdir(app_db.app.config['IMAGE_STAGING_FOLDER']) == []
+
+
+def test_requeue_processes_pending_submissions_after_restart(app_db, create_task):
+    task_id = create_task()
+    staged = stage_file(app_db, 'left-over.png')
+    pending_id = add_pending_submission(app_db, task_id, [staged])
+    lost_id = add_pending_submission(app_db, create_task('另一个任务'), ['uploads/staging/missing.png'])
+
+    with app_db.app.app_context():
+        assert app_db.requeue_pending_submission_images() == 1
+
+    status, urls = load_submission(app_db, pending_id)
+    assert status == 'ready'
+    assert urls[0].startswith('uploads/task_submissions/')
+    assert not os.path.exists(staged)
+    assert load_submission(app_db, lost_id)[0] == 'failed'
+
+
+def test_finalize_failure_marks_submission_failed(app_db, station, create_task, submit, monkeypatch):
+    task_id = create_task()
+
+    def broken_record(objects):
+        raise RuntimeError('database is locked')
+    monkeypatch.setattr(app_db, 'record_upload_objects', broken_record)
+
+    response = submit(task_id, '小明')
+    assert response.status_code == 200
+    assert load_submission(app_db, response.get_json()['submission_id'])[0] == 'failed'
+
+
+def test_duplicate_result_is_ignored(app_db, station, create_task, submit):
+    task_id = create_task()
+    submission_id = submit(task_id, '小明').get_json()['submission_id']
+    ready = load_submission(app_db, submission_id)
+
+    with app_db.app.app_context():
+        app_db.finalize_submission_images(submission_id, None)
+    assert load_submission(app_db, submission_id) == ready
+
+
+def test_submit_accepts_legacy_file_field_names(app_db, client, station, create_task):
+    task_id = create_task()
+    for field in ('file', 'image'):
+        response = client.post(f'/api/fan/tasks/{task_id}/submit', data={
+            'nickname': f'粉丝{field}',
+            'invite_code': station['invite_code'],
+            field: (io.BytesIO(PNG_BYTES), 'proof.png')
+        }, content_type='multipart/form-data')
+        assert response.status_code == 200, response.get_json()
+        assert load_submission(app_db, response.get_json()['submission_id'])[0] == 'ready'
+
+
+def test_startup_requeue_runs_in_one_worker_only(app_db):
+    with app_db.app.app_context():
+        assert app_db.claim_startup_lease('image_requeue', 300) is True
+        # 同时启动的其他进程取不到租约，不会重复处理同一批提交
+        assert app_db.claim_startup_lease('image_requeue', 300) is False
+        assert app_db.claim_startup_lease('image_requeue', 0) is True
+
+
+def test_requeue_command_waits_for_process_pool(app_db, create_task, monkeypatch):
+    staged = stage_file(app_db, 'left-over.png')
+    submission_id = add_pending_submission(app_db, create_task(), [staged])
+    monkeypatch.setattr(app_db, 'image_workers', ImageWorkerPool(workers=1))
+
+    result = app_db.app.test_cli_runner().invoke(args=['requeue-images'])
+    assert result.exit_code == 0, result.output
+    assert app_db.image_workers.stats()['inline'] == 0
+    assert load_submission(app_db, submission_id)[0] == 'ready'
@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from models import db, Participant, Task
+
+
+def baseline_task_rows(task_id):
+    """原来的任务排行榜查询：按积分降序读取全部参与者，返回 [(昵称, 积分, 提交次数)]"""
+    rows = db.session.query(
+        Participant.name,
+        Participant.points_earned,
+        Participant.submission_count
+    ).filter(
+        Participant.task_id == task_id
+    ).order_by(
+        Participant.points_earned.desc()
+    ).all()
+    return [tuple(row) for row in rows]
+
+
+def baseline_overall_rows(station_id):
+    """原来的总榜查询：按粉丝汇总站点下所有任务的积分，返回 {昵称: (积分, 参与任务数)}"""
+    rows = db.session.query(
+        Participant.name,
+        func.sum(Participant.points_earned),
+        func.count(Participant.id)
+    ).join(
+        Task, Task.id == Participant.task_id
+    ).filter(
+        Task.station_id == station_id
+    ).group_by(
+        Participant.name
+    ).all()
+    return {name: (points, task_count) for name, points, task_count in rows}
+
+
+def expected_ranks(points):
+    """与 RANK() 一致的名次：同分同名次，并列后的名次顺延"""
+    return [1 + sum(1 for other in points if other > value) for value in points]
+
+
+def build_task(create_task, submit, clock):
+    """火焰模式下每次提交得10分：小红30分，小明和小刚同为20分（小明先达到），小李10分"""
+    clock.now = datetime(2026, 3, 1, 9, 0)
+    task_id = create_task('任务', points=10)
+    for nickname in ['小红', '小明', '小刚', '小李', '小红', '小明', '小刚', '小红']:
+        clock.now += timedelta(minutes=1)
+        assert submit(task_id, nickname).status_code == 200
+    return task_id
+
+
+def fan_task_board(client, station, task_id, query=''):
+    response = client.get(f"/api/fan/leaderboard/{task_id}?invite_code={station['invite_code']}{query}")
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def station_task_ranking(client, station, task_id):
+    response = client.get(f'/api/station/tasks/{task_id}/ranking', headers=station['headers'])
+    assert response.status_code == 200
+    return [(row['rank'], row['nickname'], row['score'], row['completed_tasks']) for row in response.get_json()['data']]
+
+
+def test_task_board_ranks_match_baseline_with_ties(app_db, client, station, create_task, submit, clock):
+    task_id = build_task(create_task, submit, clock)
+    board = fan_task_board(client, station, task_id)
+    with app_db.app.app_context():
+        baseline = baseline_task_rows(task_id)
+
+    # 成员和积分与原来的查询一致；名次同分同名次，同分者按先达到该积分的顺序排列
+    assert sorted((row['nickname'], row['points'], row['completed_tasks']) for row in board) == sorted(baseline)
+    assert [row['points'] for row in board] == [points for _, points, _ in baseline]
+    assert [row['rank'] for row in board] == expected_ranks([row['points'] for row in board]) == [1, 2, 2, 4]
+    assert [row['nickname'] for row in board] == ['小红', '小明', '小刚', '小李']
+    assert station_task_ranking(client, station, task_id) == [
+        (row['rank'], row['nickname'], row['points'], row['completed_tasks']) for row in board
+    ]
+
+    # 分页和查询自己的名次与完整排行榜一致
+    page = fan_task_board(client, station, task_id, '&limit=2&offset=2')
+    assert page == board[2:4]
+    user_info = fan_task_board(client, station, task_id, '&fan_nickname=小刚')['user_info']
+    assert user_info['rank'] == 2 and user_info['points'] == 20
+
+
+def test_overall_board_ranks_match_baseline(app_db, client, station, create_task, submit, clock):
+    build_task(create_task, submit, clock)
+    other_task = create_task('另一个任务', points=10)
+    clock.now += timedelta(minutes=1)
+    submit(other_task, '小李')
+    submit(other_task, '小王')
+
+    response = client.get(f"/api/fan/leaderboard?invite_code={station['invite_code']}&type=overall")
+    board = response.get_json()
+    with app_db.app.app_context():
+        baseline = baseline_overall_rows(station['station_id'])
+    assert {row['nickname']: (row['points'], row['completed_tasks']) for row in board} == baseline
+    assert [row['rank'] for row in board] == expected_ranks([row['points'] for row in board])
+    assert [row['points'] for row in board] == sorted((points for points, _ in baseline.values()), reverse=True)
+
+
+def test_settled_ranking_is_frozen_snapshot(app_db, client, station, create_task, submit, clock):
+    task_id = build_task(create_task, submit, clock)
+    submission_id = submit(task_id, '小李').get_json()['submission_id']
+    live_board = fan_task_board(client, station, task_id)
+    live_ranking = station_task_ranking(client, station, task_id)
+
+    response = client.post(f'/api/station/tasks/{task_id}/settle', headers=station['headers'])
+    assert response.status_code == 200
+    assert fan_task_board(client, station, task_id) == live_board
+    assert station_task_ranking(client, station, task_id) == live_ranking
+
+    # 结算后的扣分会改变参与记录（原来的查询结果随之变化），但结算排名保持不变
+    response = client.post(f'/api/station/submissions/{submission_id}/mark-abnormal',
+                           json={'reason': '结算后复核'}, headers=station['headers'])
+    assert response.status_code == 200
+    with app_db.app.app_context():
+        assert dict((name, points) for name, points, _ in baseline_task_rows(task_id))['小李'] == 10
+    app_db.ranking_engine.invalidate()
+    assert fan_task_board(client, station, task_id) == live_board
+    assert station_task_ranking(client, station, task_id) == live_ranking